@@ -2,31 +2,86 @@ import os
 import time
 import sqlite3
 import logging
-from datetime import datetime
-from opcua import Client
+import threading
+from datetime import timezone
+from urllib.parse import urlparse
+from opcua import Client, ua
 from dotenv import load_dotenv
+from db_writer import WriteBehindWriter
+import signal_store
+import rollups
+import chunk_store
+from partitions import PartitionedStore
+from spool import Spool
+import metrics
 
 
 load_dotenv()
 
-OPCUA_URL = os.getenv("OPCUA_URL")
+# one collector thread per OPC UA server (comma separated, e.g. one Server2 per line), all
+# feeding the single DB writer; OPCUA_URL still works for a single server
+OPCUA_URLS = [url.strip() for url in os.getenv("OPCUA_URLS", os.getenv("OPCUA_URL", "")).split(",") if url.strip()]
 DB_FILE = os.getenv("DB_FILE","machine_data.db")
 UPDATE_INTERVAL = int(os.getenv("UPDATE_INTERVAL", 5))
-BATCH_SIZE = int(os.getenv("BATCH_SIZE", 10))  # for DB inserts
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", 500))  # rows per DB flush
+FLUSH_MAX_LATENCY = float(os.getenv("FLUSH_MAX_LATENCY", 1.0))  # flush at least this often (seconds)
+WRITE_QUEUE_BATCHES = int(os.getenv("WRITE_QUEUE_BATCHES", 1000))  # collected batches buffered ahead of the writer
+
+# "single" keeps every sample in DB_FILE; "partitioned" writes samples into one file per
+# PARTITION_SPAN (day/hour) under PARTITION_DIR and keeps only the newest RETENTION_PARTITIONS
+STORAGE_LAYOUT = os.getenv("STORAGE_LAYOUT", "single")
+PARTITION_DIR = os.getenv("PARTITION_DIR", "partitions")
+PARTITION_SPAN = os.getenv("PARTITION_SPAN", "day")
+RETENTION_PARTITIONS = int(os.getenv("RETENTION_PARTITIONS", 0))  # 0 = keep everything
+
+# long-term archive: closed CHUNK_SPAN (hour/day) windows are exported into compressed chunk
+# files under CHUNK_DIR every CHUNK_EXPORT_INTERVAL_SEC (see chunk_store.py; empty CHUNK_DIR disables)
+CHUNK_DIR = os.getenv("CHUNK_DIR", "")
+CHUNK_SPAN = os.getenv("CHUNK_SPAN", "hour")
+CHUNK_EXPORT_INTERVAL_SEC = float(os.getenv("CHUNK_EXPORT_INTERVAL_SEC", 300))
+
+# "poll" reads every Value each UPDATE_INTERVAL, "subscription" receives only data changes
+INGEST_MODE = os.getenv("INGEST_MODE", "poll")
+PUBLISHING_INTERVAL_MS = float(os.getenv("PUBLISHING_INTERVAL_MS", 1000))
+SAMPLING_INTERVAL_MS = float(os.getenv("SAMPLING_INTERVAL_MS", -1))  # -1 = same as publishing interval
+QUEUE_SIZE = int(os.getenv("QUEUE_SIZE", 10))  # per monitored item, keeps changes between publishes
+SUBSCRIPTION_CHECK_SEC = float(os.getenv("SUBSCRIPTION_CHECK_SEC", 5))  # how often a subscribed server is checked
+
+# store-and-forward: batches are spooled to disk before the DB writer sees them (empty SPOOL_DIR disables)
+SPOOL_DIR = os.getenv("SPOOL_DIR", "spool")
+SPOOL_SEGMENT_BYTES = int(os.getenv("SPOOL_SEGMENT_BYTES", 16 * 1024 * 1024))
+SPOOL_MAX_BYTES = int(os.getenv("SPOOL_MAX_BYTES", 1024 * 1024 * 1024))
+SPOOL_FSYNC = os.getenv("SPOOL_FSYNC", "false").lower() == "true"
+REPLAY_BATCH_ROWS = int(os.getenv("REPLAY_BATCH_ROWS", 20000))  # rows per transaction while catching up
+RECONNECT_MAX_DELAY = float(os.getenv("RECONNECT_MAX_DELAY", 30))
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9111))  # Prometheus text at /metrics on localhost, 0 disables
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+SERVER_START_TIME = ua.NodeId(ua.ObjectIds.Server_ServerStatus_StartTime)
+
+BROWSE_SECONDS = metrics.REGISTRY.histogram("client2_browse_seconds", "Browsing the address space into the node cache")
+READ_SECONDS = metrics.REGISTRY.histogram("client2_read_seconds", "One batched Read of every Value (poll mode)")
+ROWS_COLLECTED = metrics.REGISTRY.counter(
+    "client2_rows_collected_total", "Rows handed to the DB writer", ("endpoint",))
+RECONNECTS = metrics.REGISTRY.counter(
+    "client2_endpoint_reconnects_total", "Connections to an OPC UA server that failed or were lost", ("endpoint",))
+INSERT_SECONDS = metrics.REGISTRY.histogram("client2_sqlite_insert_seconds", "Sample and rollup statements of one flush")
+COMMIT_SECONDS = metrics.REGISTRY.histogram("client2_sqlite_commit_seconds", "Commit of one flush")
+CHUNK_SAMPLES_EXPORTED = metrics.REGISTRY.counter(
+    "client2_chunk_samples_exported_total", "Samples archived into CHUNK_DIR chunk files")
 
 
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(message)s"
+    format="%(asctime)s | %(levelname)s | %(threadName)s | %(message)s"
 )
 
-def parse_timestamp(ts_str: str) -> datetime:
-    """Parse timestamp string into datetime, fallback to current time."""
-    try:
-        return datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S")
-    except ValueError:
-        logging.warning(f"Invalid timestamp '{ts_str}', using current time")
-        return datetime.now()
+def source_timestamp(data_value) -> int:
+    """UTC epoch milliseconds of a DataValue's SourceTimestamp (the Modbus read time), fallback to current time."""
+    if data_value.SourceTimestamp is None:
+        logging.warning("Value without SourceTimestamp, using current time")
+        return int(time.time() * 1000)
+    return int(data_value.SourceTimestamp.replace(tzinfo=timezone.utc).timestamp() * 1000)
     
 def normalize_unit(unit: str) -> str:
     try:
@@ -36,116 +91,388 @@ def normalize_unit(unit: str) -> str:
 
 
 def init_db(db_file: str):
-    """Initialize SQLite DB and create table if not exists."""
-    # ADD TIMEOUT HERE
-    conn = sqlite3.connect(db_file, timeout=30.0)
-    cursor = conn.cursor()
-    
-    # ENABLE WAL MODE FOR CONCURRENT ACCESS
-    cursor.execute("PRAGMA journal_mode=WAL")
-    cursor.execute("PRAGMA busy_timeout=30000")  # 30 seconds in milliseconds
-    
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS machine_signals (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            machine TEXT,
-            signal TEXT,
-            value REAL,
-            unit TEXT,
-            timestamp DATETIME
-        )
-    """)
-    conn.commit()
-    return conn, cursor
+    """Initialize SQLite DB (WAL, busy timeout) and create the signals/samples schema if not exists."""
+    conn = signal_store.connect(db_file)
+    signal_store.create_schema(conn)
+    rollups.create_schema(conn)
+    return conn, conn.cursor()
 
-def extract_signal_data(signal_node):
-    """Extract Value, Unit, Timestamp from a signal node."""
-    try:
-        children = {c.get_browse_name().Name: c for c in signal_node.get_children()}
-        required = ["Value", "Unit", "Timestamp"]
-        if not all(k in children for k in required):
-            return None
+class SignalNodeCache:
+    """Machine/signal -> Value NodeId map, browsed once and reused every cycle.
 
-        value = float(children["Value"].get_value())
-        unit = str(children["Unit"].get_value())
-        timestamp = parse_timestamp(str(children["Timestamp"].get_value()))
-        return value, unit, timestamp
+    Each cycle is a single Read service call for all Value attributes plus the server's
+    StartTime. The cache outlives connections: after a reconnect or a server restart (its
+    StartTime changed) it is kept if the server's NodesetVersion still matches the browsed
+    one, since Server2's NodeIds are derived from the config. Otherwise, or when a read
+    reports BadNodeIdUnknown, the address space is browsed again.
+    """
 
-    except Exception as e:
-        logging.warning(f"Failed to read signal '{signal_node}': {e}")
-        return None
+    def __init__(self, client=None):
+        self.client = client
+        self.signals = []        # (machine, signal, unit) in the same order as value_nodeids
+        self.value_nodeids = []
+        self.version_nodeid = None
+        self.version = None
+        self.server_start = None
+        self.stale = True
 
-def fetch_machine_data(client):
-    """Fetch all machine signals from OPC UA server."""
-    data_batch = []
-    objects = client.get_objects_node()
-    machines = objects.get_children()
-
-    for machine_node in machines:
-        machine_name = machine_node.get_browse_name().Name
-        signals = machine_node.get_children()
-
-        for signal_node in signals:
-            signal_name = signal_node.get_browse_name().Name
-            signal_data = extract_signal_data(signal_node)
-            if signal_data:
-                value, unit, timestamp = signal_data
-                data_batch.append((machine_name, signal_name, value, unit, timestamp))
-            else:
-                logging.debug(f"Skipping signal {machine_name}/{signal_name}")
+    def attach(self, client):
+        """Use a new connection; the cache stays valid if the server's model is unchanged."""
+        self.client = client
+        self.server_start = None  # a new connection is checked here, not as a restart in read()
+        if not self.stale and not self._model_unchanged():
+            self.stale = True
+
+    def _model_unchanged(self):
+        if self.version_nodeid is None:
+            return False
+        result = self.client.uaclient.get_attributes([self.version_nodeid], ua.AttributeIds.Value)[0]
+        if not result.StatusCode.is_good() or result.Value.Value != self.version:
+            logging.info("OPC UA address space changed, re-browsing")
+            return False
+        logging.info(f"OPC UA address space unchanged ({self.version}), reusing {len(self.signals)} cached nodes")
+        return True
+
+    def browse(self):
+        """Resolve every Machine/Signal/Value node and read all units in one request."""
+        with BROWSE_SECONDS.time():
+            self._browse()
+
+    def _browse(self):
+        signals, value_nodeids, unit_nodeids = [], [], []
+        version_nodeid = None
+        objects = self.client.get_objects_node()
+
+        for machine_ref in objects.get_children_descriptions():
+            if machine_ref.NodeId.NamespaceIndex == 0:  # skip the standard Server object
+                continue
+            if machine_ref.NodeClass != ua.NodeClass.Object:
+                if machine_ref.BrowseName.Name == "NodesetVersion":
+                    version_nodeid = machine_ref.NodeId
+                continue
+            machine_name = machine_ref.BrowseName.Name
+            for signal_ref in self.client.get_node(machine_ref.NodeId).get_children_descriptions():
+                children = {c.BrowseName.Name: c.NodeId for c in
+                            self.client.get_node(signal_ref.NodeId).get_children_descriptions()}
+                if "Value" not in children or "Unit" not in children:
+                    logging.debug(f"Skipping signal {machine_name}/{signal_ref.BrowseName.Name}")
+                    continue
+                signals.append((machine_name, signal_ref.BrowseName.Name))
+                value_nodeids.append(children["Value"])
+                unit_nodeids.append(children["Unit"])
+
+        extra = [version_nodeid] if version_nodeid is not None else []
+        results = self.client.uaclient.get_attributes(unit_nodeids + extra, ua.AttributeIds.Value) \
+            if unit_nodeids or extra else []
+        units = results[:len(unit_nodeids)]
+        self.signals = [(machine, signal, str(unit.Value.Value)) for (machine, signal), unit in zip(signals, units)]
+        self.value_nodeids = value_nodeids
+        self.version_nodeid = version_nodeid
+        self.version = results[-1].Value.Value if extra else None
+        self.stale = False
+        logging.info(f"Browsed address space: {len(self.signals)} signals")
+
+    def server_restarted(self):
+        """Read the server's StartTime; True if it changed since the last check (raises if the server is gone)."""
+        server_start = self.client.uaclient.get_attributes([SERVER_START_TIME], ua.AttributeIds.Value)[0].Value.Value
+        restarted = self.server_start is not None and server_start != self.server_start
+        self.server_start = server_start
+        return restarted
+
+    def read(self):
+        """One batched Read of StartTime + every Value; returns [(machine, signal, value, unit, timestamp)]."""
+        if self.stale:
+            self.browse()
+
+        with READ_SECONDS.time():
+            results = self.client.uaclient.get_attributes([SERVER_START_TIME] + self.value_nodeids,
+                                                          ua.AttributeIds.Value)
+        server_start = results[0].Value.Value
+        if self.server_start is not None and server_start != self.server_start:
+            logging.info("OPC UA server restarted")
+            self.server_start = server_start
+            if not self._model_unchanged():
+                self.browse()
+                return self.read()
+        self.server_start = server_start
+
+        data_batch = []
+        for (machine_name, signal_name, unit), data_value in zip(self.signals, results[1:]):
+            if data_value.StatusCode.value == ua.StatusCodes.BadNodeIdUnknown:
+                self.stale = True
+                continue
+            if not data_value.StatusCode.is_good() or data_value.Value.Value is None:
+                logging.debug(f"Skipping signal {machine_name}/{signal_name}: {data_value.StatusCode}")
+                continue
+            data_batch.append((machine_name, signal_name, float(data_value.Value.Value), unit,
+                               source_timestamp(data_value)))
+
+        if self.stale:
+            logging.info("Read reported BadNodeIdUnknown, re-browsing address space next cycle")
+        return data_batch
+
+
+class DataChangeCollector:
+    """Subscription handler turning data-change notifications into DB rows.
+
+    The subscription thread appends rows; the main loop drains them once per publishing interval.
+    """
+
+    def __init__(self, node_cache):
+        self.node_cache = node_cache
+        self._rows = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, client):
+        """Create one subscription with a monitored item on every cached Value node."""
+        params = ua.CreateSubscriptionParameters()
+        params.RequestedPublishingInterval = PUBLISHING_INTERVAL_MS
+        params.RequestedLifetimeCount = 10000
+        params.RequestedMaxKeepAliveCount = 3000
+        params.MaxNotificationsPerPublish = 0  # no limit: one publish carries every change
+        params.PublishingEnabled = True
+        params.Priority = 0
+        subscription = client.create_subscription(params, self)
+
+        items = []
+        for client_handle, nodeid in enumerate(self.node_cache.value_nodeids, start=1):
+            item = ua.MonitoredItemCreateRequest()
+            item.ItemToMonitor = ua.ReadValueId()
+            item.ItemToMonitor.NodeId = nodeid
+            item.ItemToMonitor.AttributeId = ua.AttributeIds.Value
+            item.MonitoringMode = ua.MonitoringMode.Reporting
+            item.RequestedParameters = ua.MonitoringParameters()
+            item.RequestedParameters.ClientHandle = client_handle  # index + 1 into node_cache.signals
+            item.RequestedParameters.SamplingInterval = SAMPLING_INTERVAL_MS
+            item.RequestedParameters.QueueSize = QUEUE_SIZE
+            item.RequestedParameters.DiscardOldest = True
+            items.append(item)
 
-    return data_batch
+        results = subscription.create_monitored_items(items) if items else []
+        failed = [r for r in results if isinstance(r, ua.StatusCode)]
+        if failed:
+            logging.warning(f"{len(failed)} monitored items could not be created")
+        logging.info(f"Subscribed to {len(items) - len(failed)} signals "
+                     f"(publishing {PUBLISHING_INTERVAL_MS} ms, sampling {SAMPLING_INTERVAL_MS} ms, queue {QUEUE_SIZE})")
+        return subscription
 
-def insert_batch(cursor, conn, data_batch, max_retries=5):
-    """Insert batch data into SQLite DB with retry logic."""
+    def datachange_notification(self, node, val, data):
+        machine_name, signal_name, unit = self.node_cache.signals[data.subscription_data.client_handle - 1]
+        data_value = data.monitored_item.Value
+        if not data_value.StatusCode.is_good() or val is None:
+            return
+        row = (machine_name, signal_name, float(val), unit, source_timestamp(data_value))
+        with self._lock:
+            self._rows.append(row)
+
+    def status_change_notification(self, status):
+        logging.warning(f"Subscription status changed: {status}")
+
+    def drain(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+        return rows
+
+
+def fetch_machine_data(node_cache):
+    """Fetch all machine signals from OPC UA server."""
+    return node_cache.read()
+
+def insert_batch(cursor, conn, data_batch, rollup_accumulator=None, partitions=None, max_retries=5):
+    """Insert batch data (and the rollup buckets it closes) into SQLite DB with retry logic."""
     if not data_batch:
         return
-    
+
+    closed = rollup_accumulator.add(data_batch, cursor) if rollup_accumulator else {}
     for attempt in range(max_retries):
         try:
-            cursor.executemany("""
-                INSERT INTO machine_signals
-                (machine, signal, value, unit, timestamp)
-                VALUES (?, ?, ?, ?, ?)
-            """, data_batch)
-            conn.commit()
-            return  # Success
+            with INSERT_SECONDS.time():
+                if partitions:
+                    partitions.insert_samples(cursor, data_batch)
+                else:
+                    signal_store.insert_samples(cursor, data_batch)
+                rollups.write_closed(cursor, closed)
+            with COMMIT_SECONDS.time():
+                conn.commit()
         except sqlite3.OperationalError as e:
+            conn.rollback()
             if "locked" in str(e).lower() and attempt < max_retries - 1:
                 wait_time = 0.1 * (attempt + 1)  # Exponential backoff
                 logging.warning(f"Database locked, retrying in {wait_time}s... (attempt {attempt + 1}/{max_retries})")
                 time.sleep(wait_time)
             else:
                 logging.error(f"Failed to insert batch after {max_retries} attempts: {e}")
+                if rollup_accumulator:
+                    rollup_accumulator.rollback()
                 raise
+        else:
+            if partitions:
+                partitions.enforce_retention(conn)
+            return  # Success
 
-def main():
-    # Initialize DB
-    conn, cursor = init_db(DB_FILE)
+def flush_open_rollups(cursor, conn, rollup_accumulator):
+    """Store the still-open rollup buckets; after a restart they are loaded and continued."""
+    rollups.write_closed(cursor, rollup_accumulator.drain())
+    conn.commit()
 
-    try:
-        with Client(OPCUA_URL) as client:
-            logging.info(f"Connected to OPC UA server at {OPCUA_URL}")
+def export_chunks(stop):
+    """Archive closed windows into CHUNK_DIR now and every CHUNK_EXPORT_INTERVAL_SEC until stop is set."""
+    partition_dir = PARTITION_DIR if STORAGE_LAYOUT == "partitioned" else None
+    while True:
+        metrics.PROFILER.check()
+        try:
+            summary = chunk_store.export(DB_FILE, CHUNK_DIR, CHUNK_SPAN, partition_dir=partition_dir)
+        except Exception as e:
+            logging.error(f"Chunk export failed: {e}")
+        else:
+            if summary["windows"]:
+                CHUNK_SAMPLES_EXPORTED.inc(amount=summary["samples"])
+                logging.info(f"Archived {summary['samples']} samples of {summary['windows']} windows "
+                             f"into {CHUNK_DIR} ({summary['bytes']} bytes)")
+        if stop.wait(CHUNK_EXPORT_INTERVAL_SEC):
+            return
 
-            while True:
-                data_batch = fetch_machine_data(client)
+class EndpointCollector:
+    """Collects one OPC UA server into the shared writer on its own thread, reconnecting with backoff.
+
+    state is "connecting", "connected" or "backoff"; with last_error and last_data (monotonic
+    time of the last non-empty batch) it tells which of several servers is down or silent.
+    The node cache outlives reconnects (see SignalNodeCache). Rows carry only machine and
+    signal names, so machine names must be unique across the servers of one collector.
+    """
+
+    def __init__(self, url, writer, stop):
+        self.url = url
+        self.writer = writer
+        self.stop = stop
+        self.node_cache = SignalNodeCache()
+        self.state = "connecting"
+        self.last_error = None
+        self.last_data = None
+        self.thread = threading.Thread(target=metrics.PROFILER.wrap(self.run), name=f"collect-{urlparse(url).netloc or url}", daemon=True)
+
+    def run(self):
+        reconnect_delay = 1.0
+        while not self.stop.is_set():
+            started = time.monotonic()
+            self.state = "connecting"
+            try:
+                self.collect()
+            except Exception as e:
+                # with the spool, nothing collected so far is lost; reconnect and carry on
+                self.state = "backoff"
+                self.last_error = str(e)
+                RECONNECTS.inc(self.url)
+                if time.monotonic() - started > RECONNECT_MAX_DELAY:
+                    reconnect_delay = 1.0  # the connection was up for a while, start backing off afresh
+                logging.error(f"Unexpected error: {e}, reconnecting in {reconnect_delay:.0f}s")
+                self.stop.wait(reconnect_delay)
+                reconnect_delay = min(reconnect_delay * 2, RECONNECT_MAX_DELAY)
+
+    def collect(self):
+        """Collect until the connection fails or stop is set."""
+        with Client(self.url) as client:
+            logging.info(f"Connected to OPC UA server at {self.url}")
+            self.state = "connected"
+            self.last_error = None
+            node_cache = self.node_cache
+            node_cache.attach(client)
+
+            if INGEST_MODE == "subscription":
+                if node_cache.stale:
+                    node_cache.browse()
+                collector = DataChangeCollector(node_cache)
+                collector.subscribe(client)
+                next_check = time.monotonic() + SUBSCRIPTION_CHECK_SEC
+
+            while not self.stop.is_set():
+                metrics.PROFILER.check()
+                if INGEST_MODE == "subscription":
+                    data_batch = collector.drain()
+                    # notifications just stop when the server goes away; a cheap read notices it
+                    if time.monotonic() >= next_check:
+                        if node_cache.server_restarted():
+                            raise ConnectionError("OPC UA server restarted, subscription lost")
+                        next_check = time.monotonic() + SUBSCRIPTION_CHECK_SEC
+                else:
+                    data_batch = fetch_machine_data(node_cache)
                 if data_batch:
-                    insert_batch(cursor, conn, data_batch)
-                    logging.info(f"Stored {len(data_batch)} signals to DB")
+                    self.last_data = time.monotonic()
+                    self.writer.enqueue(data_batch)
+                    ROWS_COLLECTED.inc(self.url, amount=len(data_batch))
+                    stats = self.writer.stats()
+                    logging.info(f"Collected {len(data_batch)} signals (queue depth {stats['queue_depth']}, "
+                                 f"dropped {stats['rows_dropped']}, blocked {stats['blocked']})")
                 else:
                     logging.info("No signals fetched")
 
-                time.sleep(UPDATE_INTERVAL)
+                self.stop.wait(PUBLISHING_INTERVAL_MS / 1000 if INGEST_MODE == "subscription" else UPDATE_INTERVAL)
+
+def main():
+    if not OPCUA_URLS:
+        raise SystemExit("Set OPCUA_URLS (or OPCUA_URL) to the OPC UA server(s) to collect from")
+
+    # DB writes happen on a dedicated writer thread behind a bounded queue;
+    # it also keeps the 1 min / 1 h rollups current as buckets close
+    rollup_accumulator = rollups.RollupAccumulator()
+    partitions = None
+    if STORAGE_LAYOUT == "partitioned":
+        partitions = PartitionedStore(PARTITION_DIR, PARTITION_SPAN, RETENTION_PARTITIONS)
+    writer = WriteBehindWriter(
+        lambda: init_db(DB_FILE),
+        lambda cursor, conn, rows: insert_batch(cursor, conn, rows, rollup_accumulator, partitions),
+        batch_size=BATCH_SIZE,
+        max_latency=FLUSH_MAX_LATENCY,
+        max_queued_batches=WRITE_QUEUE_BATCHES,
+        finalize=lambda cursor, conn: flush_open_rollups(cursor, conn, rollup_accumulator),
+        spool=Spool(SPOOL_DIR, SPOOL_SEGMENT_BYTES, SPOOL_MAX_BYTES, SPOOL_FSYNC) if SPOOL_DIR else None,
+        replay_batch_rows=REPLAY_BATCH_ROWS,
+    )
+    writer.start()
+    for name, help_text in (("queue_depth", "Batches waiting for the DB writer"),
+                            ("rows_written", "Rows committed to SQLite"),
+                            ("rows_dropped", "Rows dropped because the writer queue was full"),
+                            ("rows_failed", "Rows lost to failed flushes"),
+                            ("blocked", "Enqueues that had to wait for queue space"),
+                            ("last_flush_ms", "Duration of the latest flush in milliseconds")):
+        metrics.REGISTRY.gauge(f"client2_writer_{name}", help_text, lambda name=name: writer.stats()[name])
+    metrics.serve(METRICS_PORT, METRICS_HOST)
+    metrics.setup_profiling("client2")
+
+    # one thread per server; the python-opcua client is synchronous, and the threads spend
+    # nearly all their time waiting on the network or the interval
+    stop = threading.Event()
+    collectors = [EndpointCollector(url, writer, stop) for url in OPCUA_URLS]
+    metrics.REGISTRY.gauge("client2_endpoint_up", "1 while connected to the OPC UA server",
+                           lambda: {(c.url,): c.state == "connected" for c in collectors}, ("endpoint",))
+    metrics.REGISTRY.gauge("client2_endpoint_last_data_age_seconds", "Seconds since the server last delivered rows",
+                           lambda: {(c.url,): time.monotonic() - c.last_data
+                                    for c in collectors if c.last_data is not None}, ("endpoint",))
+    for collector in collectors:
+        collector.thread.start()
+    exporter = None
+    if CHUNK_DIR:
+        exporter = threading.Thread(target=metrics.PROFILER.wrap(export_chunks), args=(stop,), name="chunk-export", daemon=True)
+        exporter.start()
+
+    try:
+        while True:
+            stop.wait(60)
+            down = [f"{c.url} ({c.state}: {c.last_error})" for c in collectors if c.state != "connected"]
+            if down:
+                logging.warning(f"{len(down)}/{len(collectors)} OPC UA servers not connected: {', '.join(down)}")
 
     except KeyboardInterrupt:
         logging.info("Stopping client...")
 
-    except Exception as e:
-        logging.error(f"Unexpected error: {e}")
-
     finally:
-        conn.close()
-        logging.info("Database connection closed")
+        stop.set()
+        for collector in collectors:
+            collector.thread.join(timeout=10)
+        if exporter:
+            exporter.join(timeout=10)  # chunk files are renamed into place, never left half written
+        writer.stop()
+        logging.info(f"DB writer stopped: {writer.stats()}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
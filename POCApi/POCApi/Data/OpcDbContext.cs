@@ -24,6 +24,7 @@ namespace POCApi.Data
                  .ToTable("machine_signals", t => t.ExcludeFromMigrations());
 
             modelBuilder.Entity<MachineSignalcs>().ToTable("machine_signals");
+            modelBuilder.Entity<MachineSignalcs>().Property(e => e.TsMs).HasColumnName("ts_ms");
             modelBuilder.Entity<Machines>().ToTable("Machines");// exact table name
             modelBuilder.Entity<SignalConfigs>().ToTable("SignalConfigs");
 
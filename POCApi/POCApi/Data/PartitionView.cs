@@ -0,0 +1,127 @@
+using System.Data.Common;
+using System.Globalization;
+using System.Text.RegularExpressions;
+using Microsoft.EntityFrameworkCore.Diagnostics;
+
+namespace POCApi.Data
+{
+    // With Client2's STORAGE_LAYOUT=partitioned the samples are written to
+    // partitions/samples_<yyyyMMdd[HH]>.db, not to the main database, so its machine_signals
+    // view misses them. SQLite views cannot reference attached files: every connection attaches
+    // the newest partitions and shadows machine_signals with a TEMP view and insert trigger.
+    // Same SQL as partitions.attach_view / signal_store.py in the collector.
+    public static class PartitionView
+    {
+        private const int MaxAttached = 10; // SQLite's default attach limit
+        private static readonly Regex FilePattern = new(@"^samples_(\d{8}|\d{10})\.db$");
+
+        private const string ViewSelect = @"
+            SELECT (sa.signal_id << 42) | sa.ts_ms AS id,
+                   s.machine AS machine,
+                   s.signal AS signal,
+                   sa.value AS value,
+                   s.unit AS unit,
+                   strftime('%Y-%m-%d %H:%M:%S', sa.ts_ms / 1000, 'unixepoch', 'localtime') AS timestamp,
+                   sa.ts_ms AS ts_ms
+            FROM ({0}) sa
+            JOIN signals s ON s.id = sa.signal_id";
+
+        private const string InsertTrigger = @"
+            CREATE TEMP TRIGGER IF NOT EXISTS machine_signals_insert
+            INSTEAD OF INSERT ON machine_signals
+            BEGIN
+                INSERT OR IGNORE INTO signals (machine, signal, unit) VALUES (NEW.machine, NEW.signal, NEW.unit);
+                INSERT OR REPLACE INTO samples (signal_id, ts_ms, value)
+                    SELECT id, CAST(round((julianday(NEW.timestamp, 'utc') - 2440587.5) * 86400000) AS INTEGER), NEW.value
+                    FROM signals WHERE machine = NEW.machine AND signal = NEW.signal;
+            END;";
+
+        // Idempotent: pooled connections come back with their attachments, which are kept
+        // (or detached once retention deleted the file).
+        public static void Apply(DbConnection connection, string? partitionDir)
+        {
+            if (string.IsNullOrEmpty(partitionDir))
+                return;
+            if (!Path.IsPathRooted(partitionDir))
+                partitionDir = Path.Combine(Path.GetDirectoryName(Path.GetFullPath(connection.DataSource)) ?? "", partitionDir);
+            if (!Directory.Exists(partitionDir))
+                return;
+
+            var partitions = new List<(DateTime Start, string Key, string FilePath)>();
+            foreach (var file in Directory.GetFiles(partitionDir))
+            {
+                var match = FilePattern.Match(Path.GetFileName(file));
+                if (!match.Success)
+                    continue;
+                var key = match.Groups[1].Value;
+                var start = DateTime.ParseExact(key, key.Length == 8 ? "yyyyMMdd" : "yyyyMMddHH", CultureInfo.InvariantCulture);
+                partitions.Add((start, key, file));
+            }
+            // by time, not by name: after a span change daily and hourly keys are mixed
+            var wanted = partitions
+                .OrderBy(p => p.Start).ThenByDescending(p => p.Key.Length)
+                .TakeLast(MaxAttached)
+                .ToDictionary(p => "v_" + p.Key, p => p.FilePath);
+
+            Execute(connection, "DROP VIEW IF EXISTS temp.machine_signals");
+            var attached = new HashSet<string>();
+            using (var list = connection.CreateCommand())
+            {
+                list.CommandText = "PRAGMA database_list";
+                using var reader = list.ExecuteReader();
+                while (reader.Read())
+                    attached.Add(reader.GetString(1));
+            }
+            foreach (var alias in attached.Where(a => a.StartsWith("v_") && !wanted.ContainsKey(a)))
+                Execute(connection, $"DETACH DATABASE {alias}");
+
+            var sources = new List<string> { "SELECT signal_id, ts_ms, value FROM main.samples" };
+            foreach (var (alias, filePath) in wanted)
+            {
+                if (!attached.Contains(alias))
+                {
+                    using var attach = connection.CreateCommand();
+                    attach.CommandText = $"ATTACH DATABASE $path AS {alias}";
+                    var path = attach.CreateParameter();
+                    path.ParameterName = "$path";
+                    path.Value = filePath;
+                    attach.Parameters.Add(path);
+                    attach.ExecuteNonQuery();
+                }
+                sources.Add($"SELECT signal_id, ts_ms, value FROM {alias}.samples");
+            }
+            Execute(connection, "CREATE TEMP VIEW machine_signals AS" + string.Format(ViewSelect, string.Join(" UNION ALL ", sources)));
+            Execute(connection, InsertTrigger);
+        }
+
+        private static void Execute(DbConnection connection, string sql)
+        {
+            using var command = connection.CreateCommand();
+            command.CommandText = sql;
+            command.ExecuteNonQuery();
+        }
+    }
+
+    // applies PartitionView whenever EF Core opens its connection
+    public class PartitionViewInterceptor : DbConnectionInterceptor
+    {
+        private readonly string? _partitionDir;
+
+        public PartitionViewInterceptor(string? partitionDir)
+        {
+            _partitionDir = partitionDir;
+        }
+
+        public override void ConnectionOpened(DbConnection connection, ConnectionEndEventData eventData)
+        {
+            PartitionView.Apply(connection, _partitionDir);
+        }
+
+        public override Task ConnectionOpenedAsync(DbConnection connection, ConnectionEndEventData eventData,
+            CancellationToken cancellationToken = default)
+        {
+            PartitionView.Apply(connection, _partitionDir);
+            return Task.CompletedTask;
+        }
+    }
+}
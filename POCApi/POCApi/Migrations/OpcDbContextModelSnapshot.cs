@@ -19,7 +19,7 @@ namespace POCApi.Migrations
 
             modelBuilder.Entity("POCApi.Models.MachineSignalcs", b =>
                 {
-                    b.Property<int>("Id")
+                    b.Property<long>("Id")
                         .ValueGeneratedOnAdd()
                         .HasColumnType("INTEGER");
 
@@ -34,6 +34,10 @@ namespace POCApi.Migrations
                     b.Property<DateTime>("Timestamp")
                         .HasColumnType("TEXT");
 
+                    b.Property<long>("TsMs")
+                        .HasColumnType("INTEGER")
+                        .HasColumnName("ts_ms");
+
                     b.Property<string>("Unit")
                         .IsRequired()
                         .HasColumnType("TEXT");
@@ -2,11 +2,12 @@
 {
     public class MachineSignalcs
     {
-        public int Id { get; set; }
+        public long Id { get; set; }
         public string Machine { get; set; }
         public string Signal { get; set; }
         public double Value { get; set; }
         public string Unit { get; set; }
         public DateTime Timestamp { get; set; }
+        public long TsMs { get; set; } // UTC epoch ms; indexed, unlike the rendered Timestamp
     }
 }
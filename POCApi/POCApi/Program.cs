@@ -13,9 +13,13 @@ builder.Services.AddControllers();
 // Learn more about configuring OpenAPI at https://aka.ms/aspnet/openapi
 builder.Services.AddOpenApi();
 
+// Client2's partition directory (STORAGE_LAYOUT=partitioned); empty for the single-file layout
+var partitionDir = builder.Configuration["Storage:PartitionDir"];
+
 builder.Services.AddDbContext<OpcDbContext>(options =>
     options.UseSqlite(
-        builder.Configuration.GetConnectionString("DefaultConnection")));
+        builder.Configuration.GetConnectionString("DefaultConnection"))
+        .AddInterceptors(new PartitionViewInterceptor(partitionDir)));
 
 builder.Services.AddScoped<IDbConnection>(sp =>
 {
@@ -27,6 +31,7 @@ builder.Services.AddScoped<IDbConnection>(sp =>
     // ✅ FIX: Enable WAL mode and set timeout
     connection.Execute("PRAGMA journal_mode=WAL;");
     connection.Execute("PRAGMA busy_timeout=30000;");
+    PartitionView.Apply(connection, partitionDir);
 
     return connection;
 });
@@ -43,14 +43,18 @@ namespace POCApi.Services
        DateTime from,
        DateTime to)
         {
+            // filter on ts_ms, which the (signal_id, ts_ms) key serves; Timestamp is rendered per row.
+            // Timestamp has whole seconds, so 'to' keeps including the rest of its second
+            var fromMs = new DateTimeOffset(from).ToUnixTimeMilliseconds();
+            var toMs = new DateTimeOffset(to).ToUnixTimeMilliseconds() + 1000;
             try { 
             return await _db.Machinedata
                 .Where(x =>
                     x.Machine == machine &&
                     x.Signal == signal &&
-                    x.Timestamp >= from &&
-                    x.Timestamp <= to)
-                .OrderBy(x => x.Timestamp)
+                    x.TsMs >= fromMs &&
+                    x.TsMs < toMs)
+                .OrderBy(x => x.TsMs)
                 .Select(x => new SignalDataDto
                 {
                     Timestamp = x.Timestamp,
@@ -68,10 +72,10 @@ namespace POCApi.Services
 
         public async Task<List<SignalAverageDto>>GetAverageByMachineAsync(string machine, int days)
         {
-            var formdate = DateTime.UtcNow.AddDays(-days);
+            var formdate = DateTimeOffset.UtcNow.AddDays(-days).ToUnixTimeMilliseconds();
 
             return await _db.Machinedata
-                      .Where(x => x.Machine == machine && x.Timestamp >= formdate)
+                      .Where(x => x.Machine == machine && x.TsMs >= formdate)
                       .GroupBy(x => x.Signal)
                       .Select(g => new SignalAverageDto
                       {
@@ -1,116 +1,236 @@
 import os
-import time
 import json
+import time
+import asyncio
 import datetime
-from collections import defaultdict
-from opcua import Server
-from pymodbus.client.sync import ModbusTcpClient
+import itertools
+from opcua import Server, ua
 from dotenv import load_dotenv
+from read_planner import describe_plan, slave_timeouts
+from modbus_async import ModbusPoller
+from circuit_breaker import CLOSED
+from scan_scheduler import ScanScheduler
+from block_publisher import BlockPublisher, STATUS_NAMES
+from poll_worker import PollWorkerPool, shard_config
+from history_rings import HistoryRings, ring_depth
+import nodeset
+import metrics
 
 load_dotenv()
 
 
 OPCUA_URL = os.getenv("OPCUA_URL")
 NAMESPACE = os.getenv("NAMESPACE")
-UPDATE_INTERVAL_SEC = float(os.getenv("UPDATE_INTERVAL_SEC", 2))
+UPDATE_INTERVAL_SEC = float(os.getenv("UPDATE_INTERVAL_SEC", 2))  # default scan rate for signals without scan_rate_ms
+STATS_INTERVAL_SEC = float(os.getenv("STATS_INTERVAL_SEC", 10))
 
+# default endpoint; machines/signals in machines_config.json can name their own with "endpoint": "host:port"
 MODBUS_IP = os.getenv("MODBUS_IP")
-MODBUS_PORT = int(os.getenv("MODBUS_PORT"))
+MODBUS_PORT = int(os.getenv("MODBUS_PORT", 502))
+MODBUS_MAX_IN_FLIGHT = int(os.getenv("MODBUS_MAX_IN_FLIGHT", 4))  # pipelined requests per connection
+MODBUS_TIMEOUT_SEC = float(os.getenv("MODBUS_TIMEOUT_SEC", 3))  # per-slave override: "timeout_ms" on machine/signal
+# a slave failing MODBUS_BREAKER_FAILURES reads in a row is skipped, then probed once after a
+# backoff that doubles on every failed probe (capped), so it cannot stall the others' cycles
+MODBUS_BREAKER_FAILURES = int(os.getenv("MODBUS_BREAKER_FAILURES", 3))
+MODBUS_BREAKER_BACKOFF_SEC = float(os.getenv("MODBUS_BREAKER_BACKOFF_SEC", 1))
+MODBUS_BREAKER_MAX_BACKOFF_SEC = float(os.getenv("MODBUS_BREAKER_MAX_BACKOFF_SEC", 60))
 NUM_REGISTERS = int(os.getenv("NUM_REGISTERS", 6))
-
-with open("machines_config.json", "r") as f:
-    MACHINES_CONFIG = json.load(f)
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9110))  # Prometheus text at /metrics on localhost, 0 disables
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+NODESET_CACHE_DIR = os.getenv("NODESET_CACHE_DIR", "nodeset_cache")  # generated UANodeSet XML per config hash
+# POLL_WORKERS > 0 polls and decodes in that many processes, split by slave or gateway (POLL_SHARD_BY),
+# which hand their updates over through shared-memory rings drained every POLL_APPLY_INTERVAL_SEC
+POLL_WORKERS = int(os.getenv("POLL_WORKERS", 0))
+POLL_SHARD_BY = os.getenv("POLL_SHARD_BY", "slave")
+POLL_APPLY_INTERVAL_SEC = float(os.getenv("POLL_APPLY_INTERVAL_SEC", 0.02))
+POLL_RING_CAPACITY = int(os.getenv("POLL_RING_CAPACITY", 65536))  # samples buffered per worker
+# HistoryRead of the last HISTORY_DEPTH updates per Value node from in-memory rings (0 disables),
+# with the depth lowered if all rings together would exceed HISTORY_MAX_MB
+HISTORY_DEPTH = int(os.getenv("HISTORY_DEPTH", 600))
+HISTORY_MAX_MB = float(os.getenv("HISTORY_MAX_MB", 64))
+
+with open("machines_config.json", "rb") as f:
+    CONFIG_BYTES = f.read()
+MACHINES_CONFIG = json.loads(CONFIG_BYTES)
+
+#signals are grouped into scan classes by scan_rate_ms; on each tick the due signals are
+#compiled into the fewest contiguous block reads per slave (gap aware, max 125 registers per request)
+scheduler = ScanScheduler(MACHINES_CONFIG, UPDATE_INTERVAL_SEC * 1000, f"{MODBUS_IP}:{MODBUS_PORT}" if MODBUS_IP else None)
+read_plan = scheduler.plan_for(frozenset(scheduler.classes))
+for line in describe_plan(read_plan) + scheduler.describe():
+    print(line)
+
+#every signal has a fixed index; updates travel as (index, status, value, time), also between processes
+signal_keys = [(machine_name, signal_name)
+               for machine_name, machine_cfg in MACHINES_CONFIG.items() for signal_name in machine_cfg["signals"]]
+signal_index = {key: index for index, key in enumerate(signal_keys)}
+
+pool = None
+if POLL_WORKERS > 0:
+    shards = shard_config(MACHINES_CONFIG, POLL_WORKERS, POLL_SHARD_BY, scheduler.default_endpoint)
+    pool = PollWorkerPool(shards, signal_index, {
+        "default_rate_ms": UPDATE_INTERVAL_SEC * 1000, "default_endpoint": scheduler.default_endpoint,
+        "max_in_flight": MODBUS_MAX_IN_FLIGHT, "timeout": MODBUS_TIMEOUT_SEC,
+        "failure_threshold": MODBUS_BREAKER_FAILURES, "base_backoff": MODBUS_BREAKER_BACKOFF_SEC,
+        "max_backoff": MODBUS_BREAKER_MAX_BACKOFF_SEC, "stats_interval": STATS_INTERVAL_SEC,
+    }, POLL_RING_CAPACITY)
+    pool.start()  # forks, so before the OPC UA server and metrics threads exist
+    for shard, shard_cfg in enumerate(shards):
+        count = sum(len(machine_cfg["signals"]) for machine_cfg in shard_cfg.values())
+        print(f"Poll worker {shard} (pid {pool.processes[shard].pid}): {count} signals")
 
 
 server = Server()
 server.set_endpoint(OPCUA_URL)
 ns_idx = server.register_namespace(NAMESPACE)
-objects_node = server.get_objects_node()
 
-Machines = {}       # OPC UA machine nodes
-Machine_vars = {}   # OPC UA variable nodes
+#Machine/Signal objects with Value and Unit variables, built in bulk with string NodeIds
+#("ns=<idx>;s=Machine.Signal.Value") that stay the same across restarts; the unit is constant,
+#written once here, and the read time travels as the Value's SourceTimestamp
+started = time.perf_counter()
+model_hash, nodeset_current = nodeset.load_nodeset(server, ns_idx, NAMESPACE, MACHINES_CONFIG, CONFIG_BYTES,
+                                                   NODESET_CACHE_DIR, history=HISTORY_DEPTH > 0)
+print(f"Address space {model_hash} built in {time.perf_counter() - started:.2f}s "
+      f"({'nodeset cache current' if nodeset_current else 'nodeset cache rewritten'})")
+value_nodeids = [nodeset.signal_nodeid(ns_idx, machine_name, signal_name) for machine_name, signal_name in signal_keys]
+STATUS_CODES = [ua.StatusCode(getattr(ua.StatusCodes, name)) for name in STATUS_NAMES]
+EPOCH = datetime.datetime(1970, 1, 1)  # opcua wants naive UTC timestamps
+
+history = None
+if HISTORY_DEPTH > 0:
+    depth = ring_depth(len(signal_keys), HISTORY_DEPTH, int(HISTORY_MAX_MB * 1024 * 1024))
+    history = HistoryRings(value_nodeids, depth, STATUS_CODES)
+    history.attach(server.iserver.history_manager)
+    print(f"History: last {depth} updates per Value node, {history.nbytes / (1024 * 1024):.1f} MB"
+          f"{' (depth capped by HISTORY_MAX_MB)' if depth < HISTORY_DEPTH else ''}")
+
+#per-stage timings; Modbus request latency per slave is recorded by modbus_async, decoding and
+#deadband filtering by block_publisher (inside the workers when POLL_WORKERS > 0, not exported then)
+OPCUA_WRITE_SECONDS = metrics.REGISTRY.histogram(
+    "server2_opcua_write_seconds", "Writing one batch of changed values into the address space")
+CYCLE_SECONDS = metrics.REGISTRY.histogram("server2_cycle_seconds", "One scan tick: all due blocks read and applied")
+VALUES_PUBLISHED = metrics.REGISTRY.counter("server2_values_published_total", "Values written to the address space")
+if pool is None:
+    metrics.REGISTRY.gauge("server2_scan_cycles", "Scan ticks that polled something", lambda: scheduler.cycles)
+    metrics.REGISTRY.gauge("server2_scan_overruns", "Scan ticks that ran past their deadline",
+                           lambda: scheduler.overruns)
+    metrics.REGISTRY.gauge("server2_scan_missed_ticks", "Ticks folded into a later one after overruns",
+                           lambda: scheduler.missed_ticks)
+    metrics.REGISTRY.gauge("server2_scan_max_lateness_seconds", "Worst deadline overrun so far",
+                           lambda: scheduler.max_lateness_ms / 1000)
+else:
+    for name, help_text in (("pushed", "Updates pushed by the poll workers"),
+                            ("pending", "Updates waiting in the rings"),
+                            ("dropped", "Updates dropped because a ring was full")):
+        metrics.REGISTRY.gauge(f"server2_worker_ring_{name}", help_text, lambda name=name: pool.stats()[name])
+if metrics.serve(METRICS_PORT, METRICS_HOST):
+    print(f"Metrics at http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+metrics.setup_profiling("server2")
 
-#These cretes nodes dynamically
-for machine_name, machine_cfg in MACHINES_CONFIG.items():
-    machine_node = objects_node.add_object(ns_idx, machine_name)
-    Machines[machine_name] = machine_node
-    Machine_vars[machine_name] = {}
+server.start()
+print("OPC UA Server started at", OPCUA_URL)
 
-    for signal_name, signal_info in machine_cfg["signals"].items():
-        signal_node = machine_node.add_object(ns_idx, signal_name)
-        value_node = signal_node.add_variable(ns_idx, "Value", 0.0)
-        unit_node = signal_node.add_variable(ns_idx, "Unit", signal_info.get("unit", ""))
-        timestamp_node = signal_node.add_variable(ns_idx, "Timestamp", "")
 
-        value_node.set_writable()
+#only values beyond their deadband (and quality changes) get here, one batch per block or drained ring
+def write_values(indices, values, statuses, source_times):
+    server_time = datetime.datetime.utcnow()
+    started = time.perf_counter()
+    last_time = source = None
+    for index, value, status, source_time in zip(indices, values, statuses, source_times):
+        if source_time != last_time:  # a block's values share one timestamp
+            last_time, source = source_time, EPOCH + datetime.timedelta(seconds=source_time)
+        datavalue = ua.DataValue(ua.Variant(value, ua.VariantType.Double), STATUS_CODES[status])
+        datavalue.SourceTimestamp = source
+        datavalue.ServerTimestamp = server_time
+        # straight into the address space, skipping the internal session write path of Node.set_value
+        server.set_attribute_value(value_nodeids[index], datavalue)
+    OPCUA_WRITE_SECONDS.observe(time.perf_counter() - started)
+    VALUES_PUBLISHED.inc(amount=len(indices))
 
-        Machine_vars[machine_name][signal_name] = {
-            "Value": value_node,
-            "Unit": unit_node,
-            "Timestamp": timestamp_node
-        }
 
-server.start()
-print("OPC UA Server started at", OPCUA_URL)
+def publish_block(indices, values, status, source_time):
+    write_values(indices, values, itertools.repeat(status), itertools.repeat(source_time))
+    if history is not None:
+        history.record(indices, values, status, source_time)
 
-#modbus clinet to get teh dagta from modbus
-modbus_client = ModbusTcpClient(MODBUS_IP, port=MODBUS_PORT)
-if modbus_client.connect():
-    print(f"Connected to Modbus server at {MODBUS_IP}:{MODBUS_PORT}")
-else:
-    print("Failed to connect to Modbus server")
-    exit(1)
-
-#these is basically doen to optimoze like can have multiple salve to grouo them and make a call in one go 
-slave_register_map = defaultdict(list)
-for machine_name, machine_cfg in MACHINES_CONFIG.items():
-    for signal_name, signal_info in machine_cfg["signals"].items():
-        slave_id = signal_info["slave_id"]
-        register = signal_info["register"]
-        slave_register_map[slave_id].append((machine_name, signal_name, register))
-
-#these basically reads the updates the data on the registers 
-def update_variables_from_modbus():
-    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")     
-
-    for slave_id, signals_list in slave_register_map.items():
-        # Determine start register and count for bulk read
-        registers_to_read = [reg for _, _, reg in signals_list]
-        start_reg = min(registers_to_read)
-        count = max(registers_to_read) - start_reg + 1
-
-        result = modbus_client.read_holding_registers(
-            address=start_reg,
-            count=count,
-            unit=slave_id
-        )
-
-        if result.isError():
-            print(f"Failed to read Slave {slave_id}")
-            continue
 
-        registers = result.registers
+#these basically reads all due slaves on all endpoints concurrently and updates the data on the registers
+async def update_variables_from_modbus(poller, plan):
+    metrics.PROFILER.check()
+    with CYCLE_SECONDS.time():
+        await poller.poll(plan, publisher.on_block, publisher.on_error)
 
-        for machine_name, signal_name, reg in signals_list:
-            idx = reg - start_reg
-            value = registers[idx] / 100  # scaling if needed
 
-            Machine_vars[machine_name][signal_name]["Value"].set_value(value)
-            Machine_vars[machine_name][signal_name]["Unit"].set_value(
-                MACHINES_CONFIG[machine_name]["signals"][signal_name].get("unit", "")
-            )
-            Machine_vars[machine_name][signal_name]["Timestamp"].set_value(now)
-
-    # Optional: print for debugging
-    print(f"Updated OPC UA variables at {now}")
+#sharded mode: the workers poll, decode and filter; this process only writes their updates
+async def apply_worker_updates():
+    while True:
+        await asyncio.sleep(POLL_APPLY_INTERVAL_SEC)
+        metrics.PROFILER.check()
+        for batch in pool.drain():
+            write_values(batch["index"].tolist(), batch["value"].tolist(), batch["status"].tolist(),
+                         batch["time"].tolist())
+            if history is not None:
+                history.record(batch["index"], batch["value"], batch["status"], batch["time"])
+        dead = pool.dead()
+        if dead:
+            for shard, exitcode in dead:
+                print(f"Poll worker {shard} exited with code {exitcode}")
+            raise SystemExit(1)
+
+
+async def print_stats():
+    while True:
+        await asyncio.sleep(STATS_INTERVAL_SEC)
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if pool is not None:
+            print(f"{now} poll workers: {pool.stats()}")  # each worker prints its own scheduler stats
+            continue
+        print(f"{now} scheduler: {scheduler.cycles} cycles, {scheduler.overruns} overruns, "
+              f"{scheduler.missed_ticks} missed ticks, max late {scheduler.max_lateness_ms:.1f} ms")
+        unhealthy = sorted(f"{endpoint}/{slave_id}" for (endpoint, slave_id), breaker in poller.breakers.items()
+                           if breaker.state != CLOSED)
+        if unhealthy:
+            print(f"{now} unhealthy slaves: {', '.join(unhealthy)}")
+
+
+poller = ModbusPoller(max_in_flight=MODBUS_MAX_IN_FLIGHT, timeout=MODBUS_TIMEOUT_SEC,
+                      slave_timeouts=slave_timeouts(MACHINES_CONFIG, scheduler.default_endpoint),
+                      failure_threshold=MODBUS_BREAKER_FAILURES, base_backoff=MODBUS_BREAKER_BACKOFF_SEC,
+                      max_backoff=MODBUS_BREAKER_MAX_BACKOFF_SEC)
+publisher = BlockPublisher(MACHINES_CONFIG, signal_index, poller, publish_block)
+
+
+async def run():
+    if pool is not None:
+        stats_task = asyncio.create_task(print_stats())
+        try:
+            await apply_worker_updates()
+        finally:
+            stats_task.cancel()
+        return
+
+    failed = await poller.connect_all(read_plan)
+    for endpoint in sorted(poller.connections):
+        if endpoint in failed:
+            print(f"Failed to connect to Modbus server at {endpoint}: {failed[endpoint]}")
+        else:
+            print(f"Connected to Modbus server at {endpoint}")
+    if len(failed) == len(poller.connections):
+        raise SystemExit(1)
+
+    stats_task = asyncio.create_task(print_stats())
+    try:
+        await scheduler.run(lambda plan: update_variables_from_modbus(poller, plan))
+    finally:
+        stats_task.cancel()
+        await poller.close()
 
 
 try:
-    while True:
-        update_variables_from_modbus()
-        time.sleep(UPDATE_INTERVAL_SEC)
+    asyncio.run(run())
 except KeyboardInterrupt:
     print("Stopping server...")
 finally:
     server.stop()
-    modbus_client.close()
+    if pool is not None:
+        pool.stop()
@@ -0,0 +1,343 @@
+# End-to-end benchmark: simulator -> Server2 -> Client2 -> SQLite.
+#
+# For each scale (number of machines) a scaled machines_config.json is generated in a
+# scratch directory and the three processes are started against it on free local ports.
+# Marked values are injected as large spikes through the simulator's /api/units/<id>/spike
+# endpoint; each marker is timed from the POST until its row is visible in `samples`.
+# The sample's ts_ms (the Modbus read time) splits that latency into the Modbus read delay
+# and the OPC UA -> Client2 -> SQLite part. Sustained throughput is the growth of `samples`
+# over the measured window. Results are written as one JSON report per run:
+#
+#   python bench_e2e.py --machines 10 100 1000 --duration 30 --output bench_report.json
+#   python bench_e2e.py --compare bench_before.json bench_after.json
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import datetime
+import platform
+import tempfile
+import subprocess
+import urllib.request
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SIMULATOR = os.path.join(ROOT, "modbus", "modbus_server.py")
+
+# the simulator's 8 signals per unit, high word at register 2 * index
+SIMULATED_SIGNALS = ["Voltage", "Current", "Temperature", "Frequency", "Vibration", "FlowRate", "RPM", "Torque"]
+SIGNAL_UNITS = ["V", "A", "°C", "Hz", "mm/s", "L/min", "rpm", "Nm"]
+MAX_UNITS = 247
+
+# a spike this large puts the raw register at >= 30000 (value >= 300 at the legacy x0.01
+# scale) while simulated values stay below 655; anything above MARKER_THRESHOLD is a marker
+MARKER_MAGNITUDE = 30000
+MARKER_THRESHOLD = 150.0
+
+MARKER_QUERY = """
+SELECT MIN(sa.ts_ms) FROM samples sa JOIN signals s ON s.id = sa.signal_id
+WHERE s.machine = ? AND s.signal = ? AND sa.value > ? AND sa.ts_ms >= ?
+"""
+
+
+def generate_config(machines, signals_per_machine=len(SIMULATED_SIGNALS)):
+    """machines_config.json for `machines` machines spread round-robin over simulator units 1..247."""
+    config = {}
+    for i in range(machines):
+        slave_id = i % MAX_UNITS + 1
+        config[f"Machine_{i + 1}"] = {"signals": {
+            SIMULATED_SIGNALS[idx]: {"register": 2 * idx, "unit": SIGNAL_UNITS[idx], "slave_id": slave_id}
+            for idx in range(signals_per_machine)
+        }}
+    return config
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout, process):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args[1]} exited with code {process.returncode} during startup")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"port {port} did not open within {timeout} s")
+
+
+def post_json(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(), method="POST",
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=5) as response:
+        return json.load(response)
+
+
+def count_samples(conn):
+    return conn.execute("SELECT COUNT(*) FROM samples").fetchone()[0]
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        "count": int(values.size),
+        "p50": round(float(np.percentile(values, 50)), 2),
+        "p90": round(float(np.percentile(values, 90)), 2),
+        "p99": round(float(np.percentile(values, 99)), 2),
+        "max": round(float(values.max()), 2),
+    }
+
+
+class Stack:
+    """Simulator, Server2 and Client2 running against one scratch directory; logs go to <workdir>/*.log."""
+
+    def __init__(self, workdir, machines, args):
+        self.workdir = workdir
+        self.machines = machines
+        self.args = args
+        self.modbus_port = free_port()
+        self.api_port = free_port()
+        self.opcua_port = free_port()
+        self.api = f"http://127.0.0.1:{self.api_port}"
+        self.db_file = os.path.join(workdir, "machine_data.db")
+        self.processes = []
+
+    def _start(self, name, argv, env=None):
+        log = open(os.path.join(self.workdir, f"{name}.log"), "w")
+        process = subprocess.Popen([sys.executable, *argv], cwd=self.workdir, stdout=log, stderr=subprocess.STDOUT,
+                                   env={**os.environ, "PYTHONUNBUFFERED": "1", **(env or {})})
+        self.processes.append((process, log))
+        return process
+
+    def __enter__(self):
+        try:
+            self._start_all()
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
+        return self
+
+    def _start_all(self):
+        with open(os.path.join(self.workdir, "machines_config.json"), "w") as f:
+            json.dump(generate_config(self.machines), f, indent=2)
+
+        simulator = self._start("simulator", [
+            SIMULATOR, "--modbus-host", "127.0.0.1", "--modbus-port", str(self.modbus_port),
+            "--api-port", str(self.api_port), "--simulate-units", str(min(self.machines, MAX_UNITS)),
+            "--server-mode", self.args.simulator_mode, "--print-interval", "0",
+        ])
+        wait_for_port(self.modbus_port, self.args.startup_timeout, simulator)
+        wait_for_port(self.api_port, self.args.startup_timeout, simulator)
+
+        opcua_url = f"opc.tcp://127.0.0.1:{self.opcua_port}/bench/"
+        server = self._start("server2", [os.path.join(ROOT, "Server2.py")], {
+            "OPCUA_URL": opcua_url,
+            "NAMESPACE": "http://bench.local",
+            "MODBUS_IP": "127.0.0.1",
+            "MODBUS_PORT": str(self.modbus_port),
+            "UPDATE_INTERVAL_SEC": str(self.args.scan_interval_ms / 1000),
+            "STATS_INTERVAL_SEC": "3600",
+        })
+        wait_for_port(self.opcua_port, self.args.startup_timeout, server)
+
+        self._start("client2", [os.path.join(ROOT, "Client2.py")], {
+            "OPCUA_URL": opcua_url,
+            "DB_FILE": self.db_file,
+            "STORAGE_LAYOUT": "single",
+            "SPOOL_DIR": os.path.join(self.workdir, "spool"),
+            "INGEST_MODE": self.args.ingest_mode,
+            "PUBLISHING_INTERVAL_MS": str(self.args.publishing_interval_ms),
+            "UPDATE_INTERVAL": "1",
+            "FLUSH_MAX_LATENCY": str(self.args.flush_max_latency),
+        })
+        self.conn = self._wait_for_samples()
+
+    def _wait_for_samples(self):
+        deadline = time.monotonic() + self.args.startup_timeout
+        while time.monotonic() < deadline:
+            for process, _ in self.processes:
+                if process.poll() is not None:
+                    raise RuntimeError(f"{process.args[1]} exited with code {process.returncode} during startup")
+            if os.path.exists(self.db_file):
+                try:
+                    conn = sqlite3.connect(self.db_file, timeout=30.0)
+                    if count_samples(conn) > 0:
+                        return conn
+                    conn.close()
+                except sqlite3.OperationalError:
+                    pass  # schema not created yet
+            time.sleep(0.5)
+        raise TimeoutError(f"no samples reached {self.db_file} within {self.args.startup_timeout} s")
+
+    def __exit__(self, *exc):
+        if getattr(self, "conn", None):
+            self.conn.close()
+        for process, _ in reversed(self.processes):
+            process.terminate()
+        for process, log in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            log.close()
+
+
+def measure(stack, args):
+    """Inject markers for args.duration seconds and collect their latencies and the sample throughput."""
+    targets = [(f"Machine_{i + 1}", i % MAX_UNITS + 1, idx)
+               for i in range(min(stack.machines, MAX_UNITS)) for idx in range(len(SIMULATED_SIGNALS))]
+    pending = []   # (inject_ms, machine, signal)
+    results = []   # (end_to_end_ms, modbus_read_ms, opcua_to_db_ms)
+    next_target = 0
+    next_marker = time.monotonic()
+
+    start_count, started = count_samples(stack.conn), time.monotonic()
+    end = started + args.duration
+    while time.monotonic() < end or (pending and time.monotonic() < end + args.marker_timeout):
+        now = time.monotonic()
+        if now >= next_marker and now < end:
+            machine, unit_id, idx = targets[next_target % len(targets)]
+            next_target += 1
+            inject_ms = time.time() * 1000
+            post_json(f"{stack.api}/api/units/{unit_id}/spike", {
+                "idx": idx, "magnitude": MARKER_MAGNITUDE, "duration_ms": args.marker_duration_ms, "kind": "bench",
+            })
+            pending.append((inject_ms, machine, SIMULATED_SIGNALS[idx]))
+            next_marker += args.marker_interval
+
+        still_pending = []
+        for inject_ms, machine, signal in pending:
+            read_ms = stack.conn.execute(MARKER_QUERY, (machine, signal, MARKER_THRESHOLD, int(inject_ms))).fetchone()[0]
+            if read_ms is None:
+                still_pending.append((inject_ms, machine, signal))
+                continue
+            seen_ms = time.time() * 1000
+            results.append((seen_ms - inject_ms, read_ms - inject_ms, seen_ms - read_ms))
+        pending = [p for p in still_pending if time.time() * 1000 - p[0] < args.marker_timeout * 1000]
+        time.sleep(args.poll_interval_ms / 1000)
+
+    elapsed = min(time.monotonic(), end) - started
+    rows = count_samples(stack.conn) - start_count
+    return {
+        "markers_sent": next_target,
+        "markers_received": len(results),
+        "markers_lost": next_target - len(results),
+        "latency_ms": {
+            "end_to_end": percentiles([r[0] for r in results]),
+            "modbus_read": percentiles([r[1] for r in results]),
+            "opcua_to_db": percentiles([r[2] for r in results]),
+        },
+        "samples_written": rows,
+        "samples_per_sec": round(rows / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def run_scale(machines, args):
+    workdir = tempfile.mkdtemp(prefix=f"bench_{machines}_", dir=args.workdir)
+    print(f"[{machines} machines] starting stack in {workdir}")
+    started = time.monotonic()
+    with Stack(workdir, machines, args) as stack:
+        startup_sec = time.monotonic() - started
+        print(f"[{machines} machines] up after {startup_sec:.1f} s, warming up {args.warmup} s")
+        time.sleep(args.warmup)
+        result = measure(stack, args)
+    result.update({
+        "machines": machines,
+        "signals": machines * len(SIMULATED_SIGNALS),
+        "startup_sec": round(startup_sec, 1),
+        "offered_samples_per_sec": round(machines * len(SIMULATED_SIGNALS) * 1000 / args.scan_interval_ms, 1),
+        "workdir": workdir,
+    })
+    e2e = result["latency_ms"]["end_to_end"] or {}
+    print(f"[{machines} machines] p50 {e2e.get('p50')} ms, p99 {e2e.get('p99')} ms, "
+          f"{result['samples_per_sec']} samples/s, lost {result['markers_lost']}/{result['markers_sent']} markers")
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before_file, after_file):
+    """Print per-scale deltas of the headline numbers between two reports."""
+    with open(before_file) as f:
+        before = {r["machines"]: r for r in json.load(f)["results"] if "error" not in r}
+    with open(after_file) as f:
+        after = {r["machines"]: r for r in json.load(f)["results"] if "error" not in r}
+
+    def headline(result):
+        e2e = result["latency_ms"]["end_to_end"] or {}
+        return {"p50 ms": e2e.get("p50"), "p99 ms": e2e.get("p99"), "samples/s": result["samples_per_sec"]}
+
+    for machines in sorted(before.keys() & after.keys()):
+        old, new = headline(before[machines]), headline(after[machines])
+        parts = []
+        for name in old:
+            if old[name] and new[name] is not None:
+                parts.append(f"{name} {old[name]} -> {new[name]} ({(new[name] - old[name]) / old[name] * 100:+.1f}%)")
+            else:
+                parts.append(f"{name} {old[name]} -> {new[name]}")
+        print(f"{machines:>5} machines: " + ", ".join(parts))
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument("--machines", type=int, nargs="+", default=[10, 100, 1000])
+    p.add_argument("--duration", type=float, default=30, help="measured seconds per scale")
+    p.add_argument("--warmup", type=float, default=5, help="seconds between the first sample and measuring")
+    p.add_argument("--marker-interval", type=float, default=0.5, help="seconds between injected markers")
+    p.add_argument("--marker-duration-ms", type=int, default=1000, help="how long each marker spike lasts")
+    p.add_argument("--marker-timeout", type=float, default=30, help="a marker not seen after this many seconds is lost")
+    p.add_argument("--poll-interval-ms", type=float, default=10, help="SQLite polling interval while waiting for markers")
+    p.add_argument("--scan-interval-ms", type=float, default=100, help="Server2 default scan rate")
+    p.add_argument("--ingest-mode", choices=("poll", "subscription"), default="subscription")
+    p.add_argument("--publishing-interval-ms", type=float, default=100)
+    p.add_argument("--flush-max-latency", type=float, default=0.1, help="Client2 FLUSH_MAX_LATENCY")
+    p.add_argument("--simulator-mode", choices=("sync", "async"), default="async")
+    p.add_argument("--startup-timeout", type=float, default=300)
+    p.add_argument("--workdir", default=None, help="parent directory for the per-scale scratch directories")
+    p.add_argument("--output", default=None, help="report file (default bench_e2e_<timestamp>.json)")
+    p.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two reports and exit")
+    args = p.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = {
+        "started": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {name: value for name, value in vars(args).items() if name not in ("output", "compare", "workdir")},
+        "results": [],
+    }
+    output = args.output or f"bench_e2e_{datetime.datetime.now():%Y%m%d_%H%M%S}.json"
+    for machines in args.machines:
+        try:
+            report["results"].append(run_scale(machines, args))
+        except (RuntimeError, TimeoutError, OSError) as e:
+            print(f"[{machines} machines] failed: {e}")
+            report["results"].append({"machines": machines, "error": str(e)})
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
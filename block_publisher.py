@@ -0,0 +1,79 @@
+import time
+
+import metrics
+from change_filter import ChangeFilter
+from circuit_breaker import OPEN
+from modbus_async import CircuitOpenError
+
+# quality of a published value; STATUS_NAMES are the matching OPC UA StatusCodes
+GOOD, UNCERTAIN, BAD = 0, 1, 2
+STATUS_NAMES = ("Good", "UncertainLastUsableValue", "BadNoCommunication")
+
+DECODE_SECONDS = metrics.REGISTRY.histogram("server2_decode_seconds", "Decoding one read block")
+VALUES_FILTERED = metrics.REGISTRY.counter(
+    "server2_values_filtered_total", "Values dropped by the change filter (unchanged or inside the deadband)")
+
+
+class BlockPublisher:
+    """Turns the poller's block callbacks into the updates worth writing to the address space.
+
+    Each block is decoded in one vectorised pass and values inside their deadband are dropped
+    (ChangeFilter). Quality is tracked per signal: Uncertain (last value kept) while a slave's
+    reads fail, Bad once its breaker has opened, and Good again, force-published, on the next
+    successful read; a quality update is emitted only when it changes.
+
+    emit(indices, values, status, source_time) receives one batch per block: positions in
+    signal_index, floats, GOOD/UNCERTAIN/BAD and a POSIX timestamp.
+    """
+
+    def __init__(self, machines_config, signal_index, poller, emit):
+        self.change_filter = ChangeFilter(machines_config)
+        self.signal_index = signal_index  # (machine, signal) -> index
+        self.poller = poller
+        self.emit = emit
+        self.signal_quality = {}          # (machine, signal) -> status, only for signals currently not GOOD
+        self.unhealthy_slaves = set()     # (endpoint, slave_id) whose breaker opened, for transition-only logging
+
+    def on_block(self, block, registers, read_time):
+        if (block.endpoint, block.slave_id) in self.unhealthy_slaves:
+            self.unhealthy_slaves.discard((block.endpoint, block.slave_id))
+            print(f"Slave {block.slave_id} at {block.endpoint} is responding again")
+        with DECODE_SECONDS.time():
+            values = block.decoder.decode(registers).tolist()
+
+        indices, published = [], []
+        for (machine_name, signal_name, _), value in zip(block.signals, values):
+            key = (machine_name, signal_name)
+            recovered = self.signal_quality.pop(key, None) is not None
+            if self.change_filter.should_publish(key, value, force=recovered):
+                indices.append(self.signal_index[key])
+                published.append(value)
+        VALUES_FILTERED.inc(amount=len(values) - len(published))
+        if indices:
+            self.emit(indices, published, GOOD, read_time.timestamp())
+
+    def on_error(self, block, error):
+        key = (block.endpoint, block.slave_id)
+        if isinstance(error, CircuitOpenError) or key in self.unhealthy_slaves:  # skipped or failed probe
+            self._publish_quality(block, BAD)
+            return
+        print(f"Failed to read Slave {block.slave_id} at {block.endpoint} "
+              f"{block.register_type} {block.start}..{block.start + block.count - 1}: {error}")
+        if self.poller.breaker(*key).state == OPEN:
+            self.unhealthy_slaves.add(key)
+            print(f"Slave {block.slave_id} at {block.endpoint} marked unhealthy, skipping it until a probe succeeds")
+            self._publish_quality(block, BAD)
+        else:
+            self._publish_quality(block, UNCERTAIN)
+
+    def _publish_quality(self, block, status):
+        indices, values = [], []
+        for machine_name, signal_name, _ in block.signals:
+            key = (machine_name, signal_name)
+            if self.signal_quality.get(key) == status:
+                continue
+            self.signal_quality[key] = status
+            indices.append(self.signal_index[key])
+            values.append(self.change_filter.last_published.get(key, 0.0))
+        if indices:
+            self.emit(indices, values, status, time.time())
@@ -0,0 +1,49 @@
+DEADBAND_TYPES = ("absolute", "percent")
+
+
+class ChangeFilter:
+    """Keeps the last published value per signal and decides whether a new reading is worth publishing.
+
+    Per-signal config (machines_config.json):
+        "deadband": 0.5                  -> publish when |new - last| > 0.5
+        "deadband_type": "percent"       -> deadband is % of "eu_range" [low, high] if given,
+                                            otherwise % of the last published value
+    With no deadband a signal is published whenever its value changes at all.
+    """
+
+    def __init__(self, machines_config):
+        self.last_published = {}
+        self.deadbands = {}
+        for machine_name, machine_cfg in machines_config.items():
+            for signal_name, signal_info in machine_cfg["signals"].items():
+                deadband = float(signal_info.get("deadband", 0))
+                if deadband <= 0:
+                    continue
+                deadband_type = signal_info.get("deadband_type", "absolute")
+                if deadband_type not in DEADBAND_TYPES:
+                    raise ValueError(f"{machine_name}/{signal_name}: deadband_type must be one of {DEADBAND_TYPES}")
+                eu_range = signal_info.get("eu_range")
+                if deadband_type == "percent" and eu_range:
+                    # percent of a fixed engineering range is just an absolute deadband
+                    deadband, deadband_type = deadband / 100 * (eu_range[1] - eu_range[0]), "absolute"
+                self.deadbands[(machine_name, signal_name)] = (deadband_type, deadband)
+
+    def should_publish(self, key, value, force=False):
+        """True (and remembers value) if value differs from the last published one by more than the deadband.
+
+        force publishes regardless, e.g. to replace a Bad quality value once the device is back.
+        """
+        last = self.last_published.get(key)
+        if last is not None and not force:
+            deadband = self.deadbands.get(key)
+            if deadband is None:
+                if value == last:
+                    return False
+            else:
+                deadband_type, amount = deadband
+                limit = amount if deadband_type == "absolute" else abs(last) * amount / 100
+                if abs(value - last) <= limit:
+                    return False
+        self.last_published[key] = value
+        return True
+
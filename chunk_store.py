@@ -0,0 +1,400 @@
+# Compressed columnar archive of signal history.
+#
+# Samples are grouped into one chunk per signal and time window (CHUNK_SPAN, hour or day,
+# UTC), and all chunks of a window go into one immutable file, e.g. chunks/chunks_2026011708.tsc:
+#
+#   magic | chunk payloads ... | index (one CHUNK record per chunk, by signal id) | footer
+#
+# A chunk stores timestamps delta-of-delta encoded and packed into the narrowest integer
+# type that holds them. Values with at most MAX_DECIMALS decimal places (counters,
+# setpoints, rounded readings) are stored the same way as deltas of value * 10**digits;
+# other values are XORed with their predecessor (Gorilla-style), as float32 when that is
+# lossless, with the bytes shuffled so the zero bits line up. Both columns are then zlib
+# compressed; decoding is exact. Each index record carries the chunk's
+# count/min/max/sum and first/last timestamp, so reads mmap the file, select chunks from
+# the index alone and aggregate whole chunks inside the range without decompressing them.
+#
+# The archive is filled from Client2's SQLite database (single or partitioned layout) by
+# the exporter, which only writes closed windows that have no file yet, so it can run
+# repeatedly (Client2 runs it every CHUNK_EXPORT_INTERVAL_SEC when CHUNK_DIR is set):
+#
+#   python chunk_store.py machine_data.db export [--since "2026-01-01"] [--rebuild]
+#   python chunk_store.py machine_data.db aggregate --from "2026-01-01" --to "2026-02-01" [--machine M] [--signal S]
+#   python chunk_store.py machine_data.db stats
+import os
+import re
+import json
+import mmap
+import time
+import zlib
+import sqlite3
+import struct
+import argparse
+import datetime
+
+import numpy as np
+
+from partitions import SPANS, partition_key, partition_bounds, list_partitions
+
+MAGIC = b"TSCHUNK1"
+FOOTER = struct.Struct("<QQ8s")  # index offset, chunk count, magic
+CHUNK = np.dtype([
+    ("signal_id", "<u4"), ("count", "<u4"),
+    ("first_ms", "<i8"), ("last_ms", "<i8"),
+    ("min", "<f8"), ("max", "<f8"), ("sum", "<f8"),
+    ("offset", "<u8"), ("ts_bytes", "<u4"), ("value_bytes", "<u4"),
+    ("ts_width", "u1"), ("value_width", "u1"), ("value_digits", "i1"), ("pad", "V5"),
+])
+_INT_TYPES = {1: np.int8, 2: np.int16, 4: np.int32, 8: np.int64}
+_UINT_TYPES = {4: np.uint32, 8: np.uint64}
+_FLOAT_TYPES = {4: np.float32, 8: np.float64}
+_FILE_PATTERN = re.compile(r"^chunks_(\d{8}|\d{10})\.tsc$")
+SIGNALS_FILE = "signals.json"
+MAX_DECIMALS = 6
+
+
+def _pack_ints(ints):
+    """(width, bytes) of an int64 array in the narrowest signed type holding all of it."""
+    width = next(width for width, kind in _INT_TYPES.items()
+                 if not ints.size or (ints.min() >= np.iinfo(kind).min and ints.max() <= np.iinfo(kind).max))
+    return width, ints.astype(_INT_TYPES[width]).tobytes()
+
+
+def _decimal_digits(values):
+    """Smallest number of decimal places (up to MAX_DECIMALS) that represents every value exactly, or None."""
+    if not np.isfinite(values).all():
+        return None
+    for digits in range(MAX_DECIMALS + 1):
+        scaled = np.round(values * 10.0 ** digits)
+        if np.abs(scaled).max() >= 2 ** 53:
+            return None
+        decoded = scaled.astype(np.int64) / 10.0 ** digits  # compared bitwise, so -0.0 stays a float
+        if np.array_equal(decoded.view(np.uint64), values.view(np.uint64)):
+            return digits
+    return None
+
+
+def encode_chunk(ts_ms, values):
+    """(header fields, payload bytes) for one signal's samples, ts_ms sorted ascending."""
+    ts_ms = np.asarray(ts_ms, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    count = len(ts_ms)
+
+    dod = np.diff(np.diff(ts_ms), prepend=0)  # dod[0] is the first delta itself
+    ts_width, packed = _pack_ints(dod)
+    ts_payload = zlib.compress(packed)
+
+    digits = _decimal_digits(values)
+    if digits is not None:
+        # counters, setpoints and rounded readings: integer deltas of value * 10**digits
+        ints = np.round(values * 10.0 ** digits).astype(np.int64)
+        value_width, packed = _pack_ints(np.diff(ints))
+        value_payload = zlib.compress(ints[:1].tobytes() + packed)
+    else:
+        digits = -1
+        with np.errstate(over="ignore"):
+            narrow = values.astype(np.float32)
+        value_width = 4 if np.array_equal(narrow.astype(np.float64).view(np.uint64), values.view(np.uint64)) else 8
+        bits = (narrow if value_width == 4 else values).view(_UINT_TYPES[value_width])
+        previous = np.zeros_like(bits)
+        previous[1:] = bits[:-1]
+        shuffled = (bits ^ previous).view(np.uint8).reshape(count, value_width).T  # byte planes: high bytes mostly zero
+        value_payload = zlib.compress(shuffled.tobytes())
+
+    finite = values[~np.isnan(values)]
+    header = {
+        "count": count, "first_ms": ts_ms[0], "last_ms": ts_ms[-1],
+        "min": finite.min() if finite.size else np.nan, "max": finite.max() if finite.size else np.nan,
+        "sum": finite.sum(), "ts_bytes": len(ts_payload), "value_bytes": len(value_payload),
+        "ts_width": ts_width, "value_width": value_width, "value_digits": digits,
+    }
+    return header, ts_payload + value_payload
+
+
+def decode_chunk(record, payload):
+    """(ts_ms int64, values float64) arrays of one chunk; payload is its ts + value bytes."""
+    count = int(record["count"])
+    ts_bytes = int(record["ts_bytes"])
+    dod = np.frombuffer(zlib.decompress(payload[:ts_bytes]), dtype=_INT_TYPES[int(record["ts_width"])])
+    ts_ms = np.empty(count, dtype=np.int64)
+    ts_ms[0] = record["first_ms"]
+    ts_ms[1:] = ts_ms[0] + np.cumsum(np.cumsum(dod, dtype=np.int64))
+
+    width = int(record["value_width"])
+    digits = int(record["value_digits"])
+    raw = zlib.decompress(payload[ts_bytes:])
+    if digits >= 0:
+        ints = np.empty(count, dtype=np.int64)
+        ints[0] = np.frombuffer(raw, dtype=np.int64, count=1)[0]
+        ints[1:] = ints[0] + np.cumsum(np.frombuffer(raw, dtype=_INT_TYPES[width], offset=8), dtype=np.int64)
+        return ts_ms, ints / 10.0 ** digits
+    shuffled = np.frombuffer(raw, dtype=np.uint8).reshape(width, count)
+    bits = np.bitwise_xor.accumulate(np.ascontiguousarray(shuffled.T).view(_UINT_TYPES[width]).ravel())
+    return ts_ms, bits.view(_FLOAT_TYPES[width]).astype(np.float64)
+
+
+def write_chunk_file(path, chunks):
+    """Write {signal_id: (ts_ms, values)} as one chunk file (atomically, via a temporary file)."""
+    index = np.zeros(len(chunks), dtype=CHUNK)
+    with open(path + ".tmp", "wb") as f:
+        f.write(MAGIC)
+        offset = len(MAGIC)
+        for record, signal_id in zip(index, sorted(chunks)):
+            header, payload = encode_chunk(*chunks[signal_id])
+            for name, value in header.items():
+                record[name] = value
+            record["signal_id"] = signal_id
+            record["offset"] = offset
+            f.write(payload)
+            offset += len(payload)
+        f.write(index.tobytes())
+        f.write(FOOTER.pack(offset, len(index), MAGIC))
+    os.replace(path + ".tmp", path)
+    return offset + index.nbytes + FOOTER.size
+
+
+class ChunkFile:
+    """One window's chunk file, memory-mapped; the index is a view into the mapping."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        index_offset, count, magic = FOOTER.unpack_from(self._map, len(self._map) - FOOTER.size)
+        if magic != MAGIC or self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a chunk file")
+        self.index = np.frombuffer(self._view, dtype=CHUNK, count=count, offset=index_offset)
+
+    def select(self, start_ms, end_ms, signal_ids=None):
+        """Index records of the chunks overlapping [start_ms, end_ms), optionally for some signals only."""
+        mask = (self.index["first_ms"] < end_ms) & (self.index["last_ms"] >= start_ms)
+        if signal_ids is not None:
+            mask &= np.isin(self.index["signal_id"], signal_ids)
+        return self.index[mask]
+
+    def decode(self, record):
+        start = int(record["offset"])
+        return decode_chunk(record, self._view[start:start + int(record["ts_bytes"]) + int(record["value_bytes"])])
+
+    def close(self):
+        self.index = None  # views must go before the mapping can be closed
+        self._view.release()
+        self._map.close()
+
+
+def list_chunk_files(chunk_dir):
+    """Sorted [(key, path)] of the chunk files on disk (oldest first); keys are partition keys."""
+    if not os.path.isdir(chunk_dir):
+        return []
+    found = []
+    for name in os.listdir(chunk_dir):
+        match = _FILE_PATTERN.match(name)
+        if match:
+            found.append((match.group(1), os.path.join(chunk_dir, name)))
+    return sorted(found)
+
+
+class ChunkStore:
+    """Range reads and aggregates over a chunk directory, opening only the files that overlap."""
+
+    def __init__(self, chunk_dir):
+        self.chunk_dir = chunk_dir
+        self.chunks_reused = 0   # aggregated from their header alone
+        self.chunks_decoded = 0
+
+    def signals(self):
+        """{signal_id: (machine, signal, unit)} as of the latest export."""
+        try:
+            with open(os.path.join(self.chunk_dir, SIGNALS_FILE)) as f:
+                return {int(signal_id): tuple(names) for signal_id, names in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+
+    def _files(self, start_ms, end_ms):
+        for key, path in list_chunk_files(self.chunk_dir):
+            window_start, window_end = partition_bounds(key)
+            if window_start < end_ms and window_end > start_ms:
+                chunk_file = ChunkFile(path)
+                try:
+                    yield chunk_file
+                finally:
+                    chunk_file.close()
+
+    def scan(self, start_ms, end_ms, signal_ids=None):
+        """Yield (signal_id, ts_ms, values) per chunk, trimmed to [start_ms, end_ms), in window order."""
+        for chunk_file in self._files(start_ms, end_ms):
+            for record in chunk_file.select(start_ms, end_ms, signal_ids):
+                ts_ms, values = chunk_file.decode(record)
+                self.chunks_decoded += 1
+                lo, hi = np.searchsorted(ts_ms, [start_ms, end_ms])
+                yield int(record["signal_id"]), ts_ms[lo:hi], values[lo:hi]
+
+    def aggregate(self, start_ms, end_ms, signal_ids=None):
+        """{signal_id: [count, min, max, sum]} over [start_ms, end_ms).
+
+        Chunks lying entirely inside the range contribute their header; only the chunks cut
+        by the range edges are decompressed.
+        """
+        totals = {}
+        for chunk_file in self._files(start_ms, end_ms):
+            for record in chunk_file.select(start_ms, end_ms, signal_ids):
+                if record["first_ms"] >= start_ms and record["last_ms"] < end_ms:
+                    self.chunks_reused += 1
+                    count, low, high, total = int(record["count"]), record["min"], record["max"], record["sum"]
+                else:
+                    ts_ms, values = chunk_file.decode(record)
+                    self.chunks_decoded += 1
+                    lo, hi = np.searchsorted(ts_ms, [start_ms, end_ms])
+                    values = values[lo:hi]
+                    count = len(values)
+                    if not count:
+                        continue
+                    low, high, total = np.nanmin(values), np.nanmax(values), np.nansum(values)
+                state = totals.setdefault(int(record["signal_id"]), [0, np.nan, np.nan, 0.0])
+                state[0] += count
+                state[1] = np.fmin(state[1], low)
+                state[2] = np.fmax(state[2], high)
+                state[3] += total
+        return totals
+
+
+def _open_readonly(path):
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30.0)
+
+
+def export(db_file, chunk_dir, span="hour", since_ms=None, until_ms=None, partition_dir=None, rebuild=False):
+    """Archive the closed windows of Client2's samples into chunk files; returns summary counts.
+
+    Without since_ms the export continues after the newest chunk file (or starts at the
+    oldest sample); windows that already have a file are skipped unless rebuild is set, so
+    samples stored after their window was exported (e.g. a late spool replay) need a rebuild
+    of that range. until_ms defaults to the start of the current window, i.e. only closed windows.
+    """
+    if span not in SPANS:
+        raise ValueError(f"CHUNK_SPAN must be one of {sorted(SPANS)}")
+    os.makedirs(chunk_dir, exist_ok=True)
+    width_ms = SPANS[span][1]
+    if until_ms is None:
+        until_ms = int(time.time() * 1000)
+    until_ms -= until_ms % width_ms
+
+    main = _open_readonly(db_file)
+    try:
+        signals = {row[0]: row[1:] for row in main.execute("SELECT id, machine, signal, unit FROM signals")}
+    finally:
+        main.close()
+    with open(os.path.join(chunk_dir, SIGNALS_FILE + ".tmp"), "w") as f:
+        json.dump(signals, f)
+    os.replace(os.path.join(chunk_dir, SIGNALS_FILE + ".tmp"), os.path.join(chunk_dir, SIGNALS_FILE))
+
+    # the main file holds samples in the single layout; partitions never overlap in time
+    sources = [(None, db_file)] + [(partition_bounds(key), path) for key, path in list_partitions(partition_dir or "")]
+    summary = {"windows": 0, "skipped": 0, "chunks": 0, "samples": 0, "bytes": 0}
+    connections = {}
+    try:
+        for bounds, path in sources:
+            if bounds is None or bounds[0] < until_ms:
+                connections[path] = (bounds, _open_readonly(path))
+        # separate MIN and MAX subqueries so both are one (signal_id, ts_ms) key lookup;
+        # windows outside the stored data are never visited
+        stored = [row for _, conn in connections.values() for signal_id in signals
+                  for row in conn.execute("SELECT (SELECT MIN(ts_ms) FROM samples WHERE signal_id = ?1), "
+                                          "(SELECT MAX(ts_ms) FROM samples WHERE signal_id = ?1)", (signal_id,))
+                  if row[0] is not None]
+        if not stored:
+            return summary
+        if since_ms is None:
+            exported = list_chunk_files(chunk_dir)
+            since_ms = partition_bounds(exported[-1][0])[1] if exported and not rebuild else min(first for first, _ in stored)
+        until_ms = min(until_ms, max(last for _, last in stored) + 1)
+        since_ms -= since_ms % width_ms
+
+        for window_start in range(since_ms, until_ms, width_ms):
+            window_end = window_start + width_ms
+            path = os.path.join(chunk_dir, f"chunks_{partition_key(window_start, span)}.tsc")
+            if os.path.exists(path) and not rebuild:
+                summary["skipped"] += 1
+                continue
+            overlapping = [conn for bounds, conn in connections.values()
+                           if bounds is None or (bounds[0] < window_end and bounds[1] > window_start)]
+            chunks = {}
+            for signal_id in signals:
+                rows = [row for conn in overlapping for row in conn.execute(
+                    "SELECT ts_ms, value FROM samples WHERE signal_id = ? AND ts_ms >= ? AND ts_ms < ? ORDER BY ts_ms",
+                    (signal_id, window_start, window_end))]
+                if rows:
+                    samples = np.array(rows, dtype=np.float64)  # NULL values become NaN; ts_ms is exact below 2**53
+                    chunks[signal_id] = (samples[:, 0].astype(np.int64), samples[:, 1])
+            if not chunks:
+                continue
+            summary["bytes"] += write_chunk_file(path, chunks)
+            summary["windows"] += 1
+            summary["chunks"] += len(chunks)
+            summary["samples"] += sum(len(ts_ms) for ts_ms, _ in chunks.values())
+    finally:
+        for _, conn in connections.values():
+            conn.close()
+    return summary
+
+
+def _epoch_ms(text):
+    return int(datetime.datetime.fromisoformat(text).timestamp() * 1000)
+
+
+def _signal_ids(store, machine, signal):
+    if not machine and not signal:
+        return None
+    return [signal_id for signal_id, (machine_name, signal_name, _) in store.signals().items()
+            if (not machine or machine_name == machine) and (not signal or signal_name == signal)]
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Export Client2's samples into compressed chunk files and read them back")
+    p.add_argument("db_file")
+    p.add_argument("command", choices=["export", "aggregate", "stats"])
+    p.add_argument("--chunk-dir", default=os.getenv("CHUNK_DIR") or "chunks")
+    p.add_argument("--span", default=os.getenv("CHUNK_SPAN", "hour"), choices=sorted(SPANS))
+    p.add_argument("--partition-dir", default=os.getenv("PARTITION_DIR", "partitions"))
+    p.add_argument("--since", help="export: first local date/time (default: the oldest sample)")
+    p.add_argument("--rebuild", action="store_true", help="export: rewrite windows that already have a file")
+    p.add_argument("--from", dest="start", help="aggregate: local date/time")
+    p.add_argument("--to", dest="end")
+    p.add_argument("--machine")
+    p.add_argument("--signal")
+    args = p.parse_args()
+
+    started = time.perf_counter()
+    if args.command == "export":
+        summary = export(args.db_file, args.chunk_dir, args.span, _epoch_ms(args.since) if args.since else None,
+                         partition_dir=args.partition_dir, rebuild=args.rebuild)
+        per_sample = summary["bytes"] / summary["samples"] if summary["samples"] else 0
+        print(f"Exported {summary['samples']} samples in {summary['chunks']} chunks / {summary['windows']} windows "
+              f"({summary['skipped']} already exported): {summary['bytes']} bytes, {per_sample:.2f} bytes/sample, "
+              f"{time.perf_counter() - started:.1f}s")
+    elif args.command == "aggregate":
+        if not args.start or not args.end:
+            p.error("aggregate needs --from and --to")
+        store = ChunkStore(args.chunk_dir)
+        names = store.signals()
+        totals = store.aggregate(_epoch_ms(args.start), _epoch_ms(args.end), _signal_ids(store, args.machine, args.signal))
+        for signal_id, (count, low, high, total) in sorted(totals.items()):
+            machine_name, signal_name, unit = names.get(signal_id, ("?", str(signal_id), ""))
+            print(f"{machine_name}/{signal_name}: count {count}, min {low:.3f}, max {high:.3f}, "
+                  f"mean {total / count:.3f} {unit or ''}")
+        print(f"{len(totals)} signals, {store.chunks_reused} chunks from headers, {store.chunks_decoded} decoded, "
+              f"{(time.perf_counter() - started) * 1000:.1f} ms")
+    else:
+        files = list_chunk_files(args.chunk_dir)
+        samples = chunks = size = 0
+        for _, path in files:
+            chunk_file = ChunkFile(path)
+            samples += int(chunk_file.index["count"].sum())
+            chunks += len(chunk_file.index)
+            chunk_file.close()
+            size += os.path.getsize(path)
+        sqlite_size = sum(os.path.getsize(path) for path in [args.db_file, args.db_file + "-wal"]
+                          + [path for _, path in list_partitions(args.partition_dir)] if os.path.exists(path))
+        print(f"{len(files)} files, {chunks} chunks, {samples} samples, {size} bytes "
+              f"({size / samples if samples else 0:.2f} bytes/sample); SQLite files: {sqlite_size} bytes")
@@ -0,0 +1,62 @@
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Health of one Modbus slave, deciding whether a cycle should read it at all.
+
+    After `failure_threshold` consecutive failures the breaker opens: the slave is skipped
+    for `base_backoff` seconds, then a single probe read is allowed (half-open). A good probe
+    closes the breaker; a failed one opens it again with the backoff doubled, up to
+    `max_backoff`. A dead slave therefore costs one probe per backoff period instead of a
+    full timeout every cycle.
+    """
+
+    def __init__(self, failure_threshold=3, base_backoff=1.0, max_backoff=60.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0       # consecutive
+        self.opens = 0          # consecutive opens without a success in between, drives the backoff
+        self.retry_at = 0.0
+
+    def allow(self):
+        """True if a read may be issued now; moves an expired open breaker to half-open (one probe)."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self.clock() >= self.retry_at:
+            self.state = HALF_OPEN
+            return True
+        return False
+
+    @property
+    def probing(self):
+        return self.state == HALF_OPEN
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.opens = 0
+
+    def record_failure(self):
+        """Count a failed read; returns True if this failure opened the breaker."""
+        self.failures += 1
+        if self.state == OPEN:  # a concurrent read of the same cycle, already accounted for
+            return False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            backoff = min(self.base_backoff * 2 ** self.opens, self.max_backoff)
+            self.opens += 1
+            self.state = OPEN
+            self.retry_at = self.clock() + backoff
+            return True
+        return False
+
+    @property
+    def backoff(self):
+        """Seconds the breaker stays open after its latest opening."""
+        return min(self.base_backoff * 2 ** max(self.opens - 1, 0), self.max_backoff)
@@ -0,0 +1,259 @@
+import time
+import queue
+import logging
+import threading
+
+import metrics
+
+_STOP = object()
+
+
+class WriteBehindWriter:
+    """Bounded queue between the OPC UA collector and a dedicated SQLite writer thread.
+
+    The collector only enqueues batches, so disk stalls and lock waits never delay collection.
+    The writer flushes once batch_size rows are pending or the oldest pending row has waited
+    max_latency seconds, writing everything pending in a single transaction.
+    When the queue is full, enqueue waits up to enqueue_timeout (counted as blocked) and then
+    drops the batch (counted as dropped) rather than stalling the collector indefinitely.
+
+    With a spool (see spool.py) every batch is appended to disk before it is queued and the
+    writer acks it once committed. A full queue then only leaves batches in the spool, and a
+    failed flush is not lost: the writer switches to replay, retrying with backoff and then
+    draining the spool in replay_batch_rows transactions until it has caught up again.
+
+    enqueue() may be called from several collector threads; spool order and queue order stay
+    the same, which the writer's cumulative spool acks rely on.
+
+    open_db() -> (conn, cursor) runs on the writer thread; insert(cursor, conn, rows) writes and commits;
+    the optional finalize(cursor, conn) runs once after the last flush, before the connection closes.
+    """
+
+    def __init__(self, open_db, insert, batch_size=500, max_latency=1.0, max_queued_batches=1000,
+                 enqueue_timeout=0.05, finalize=None, spool=None, replay_batch_rows=5000, max_retry_delay=30.0):
+        self.open_db = open_db
+        self.insert = insert
+        self.finalize = finalize
+        self.spool = spool
+        self.replay_batch_rows = replay_batch_rows
+        self.max_retry_delay = max_retry_delay
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.enqueue_timeout = enqueue_timeout
+        self.queue = queue.Queue(maxsize=max_queued_batches)
+
+        self.rows_queued = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.rows_failed = 0
+        self.rows_spooled = 0  # left in the spool by a full queue, written later by replay
+        self.rows_replayed = 0
+        self.blocked = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.replaying = False
+        self._gap = None  # spool position of the first batch that did not make it into the queue
+
+        self._enqueue_lock = threading.Lock()
+        self._thread = threading.Thread(target=metrics.PROFILER.wrap(self._run), name="db-writer", daemon=True)
+        self._ready = threading.Event()
+        self._error = None
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+        if self._error:
+            raise self._error
+
+    def enqueue(self, rows):
+        """Hand a batch of rows to the writer; returns False if it had to be dropped."""
+        if not rows:
+            return True
+        with self._enqueue_lock:
+            return self._enqueue(rows)
+
+    def _enqueue(self, rows):
+        item = rows
+        if self.spool:
+            start, end = self.spool.append(rows)
+            item = (rows, end)
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.blocked += 1
+            try:
+                self.queue.put(item, timeout=self.enqueue_timeout)
+            except queue.Full:
+                if self.spool:
+                    # already on disk; the writer replays it once it notices the gap
+                    if self._gap is None:
+                        self._gap = start
+                    self.rows_spooled += len(rows)
+                    return True
+                self.rows_dropped += len(rows)
+                return False
+        self.rows_queued += len(rows)
+        return True
+
+    def stats(self):
+        stats = {
+            "queue_depth": self.queue.qsize(),
+            "rows_queued": self.rows_queued,
+            "rows_written": self.rows_written,
+            "rows_dropped": self.rows_dropped,
+            "rows_failed": self.rows_failed,
+            "blocked": self.blocked,
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 1),
+        }
+        if self.spool:
+            stats.update({
+                "rows_spooled": self.rows_spooled,
+                "rows_replayed": self.rows_replayed,
+                "replaying": self.replaying,
+                "spool_batches_dropped": self.spool.records_dropped,
+            })
+        return stats
+
+    def stop(self):
+        """Flush whatever is pending and stop the writer thread."""
+        self.queue.put(_STOP)
+        self._thread.join()
+
+    def _flush(self, conn, cursor, pending):
+        started = time.monotonic()
+        try:
+            self.insert(cursor, conn, pending)
+        except Exception as e:
+            logging.error(f"DB writer failed to store {len(pending)} rows: {e}")
+            if self.spool:
+                self.replaying = True  # the rows are still in the spool
+            else:
+                self.rows_failed += len(pending)
+            return False
+        self.last_flush_ms = (time.monotonic() - started) * 1000
+        self.rows_written += len(pending)
+        self.flushes += 1
+        logging.info(f"Stored {len(pending)} signals to DB in {self.last_flush_ms:.1f} ms")
+        return True
+
+    def _flush_queued(self, conn, cursor, pending):
+        """Flush queued (rows, spool end) items in order and ack the spool up to the last one."""
+        acked = self.spool.acked
+        gap = self._gap
+        if gap is not None:
+            self._gap = None
+            self.replaying = True
+            if gap < acked:
+                gap = None  # replay already covered it
+        items = [(rows, end) for rows, end in pending
+                 if end > acked and (gap is None or end <= gap)]
+        rows = [row for batch, _ in items for row in batch]
+        if rows and self._flush(conn, cursor, rows):
+            self.spool.ack(items[-1][1])
+
+    def _replay(self, conn, cursor):
+        """Write everything not yet acked from the spool; returns False if the DB is still failing."""
+        while True:
+            rows, position = self.spool.read_unacked(self.replay_batch_rows)
+            if not rows:
+                if position > self.spool.acked:
+                    self.spool.ack(position)  # only segment padding was left
+                return True
+            if not self._flush(conn, cursor, rows):
+                return False
+            self.spool.ack(position)
+            self.rows_replayed += len(rows)
+            if not self.spool.backlog():
+                return True
+
+    def _run(self):
+        try:
+            conn, cursor = self.open_db()
+        except Exception as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        pending = []
+        oldest = None
+        stopping = False
+        retry_delay = 1.0
+        next_retry = 0.0
+        if self.spool and self.spool.backlog():
+            logging.info("Spool has unacknowledged batches from a previous run, replaying")
+            self.replaying = True
+        try:
+            while not stopping:
+                metrics.PROFILER.check()
+                if self.replaying:
+                    # queued batches are also in the spool, so replay picks them up in order
+                    try:
+                        while not stopping:
+                            stopping = self.queue.get_nowait() is _STOP
+                    except queue.Empty:
+                        pass
+                    now = time.monotonic()
+                    if now >= next_retry or stopping:
+                        self._gap = None
+                        if self._replay(conn, cursor):
+                            logging.info(f"Spool replay caught up ({self.rows_replayed} rows replayed so far)")
+                            self.replaying = False
+                            retry_delay = 1.0
+                            continue
+                        logging.warning(f"Spool replay failed, retrying in {retry_delay:.0f}s")
+                        next_retry = now + retry_delay
+                        retry_delay = min(retry_delay * 2, self.max_retry_delay)
+                    if not stopping:
+                        try:
+                            stopping = self.queue.get(timeout=max(0.0, next_retry - time.monotonic())) is _STOP
+                        except queue.Empty:
+                            pass
+                    continue
+
+                timeout = None if oldest is None else max(0.0, oldest + self.max_latency - time.monotonic())
+                if self.spool and timeout is None:
+                    timeout = self.max_latency  # wake up to notice a gap left by a full queue
+                try:
+                    item = self.queue.get(timeout=timeout)
+                    # take whatever else is already waiting without another wakeup
+                    while item is not _STOP:
+                        if oldest is None:
+                            oldest = time.monotonic()
+                        if self.spool:
+                            pending.append(item)
+                        else:
+                            pending.extend(item)
+                        if self._pending_rows(pending) >= self.batch_size:
+                            break
+                        item = self.queue.get_nowait()
+                    stopping = item is _STOP
+                except queue.Empty:
+                    pass
+
+                if self.spool and self._gap is not None and not pending:
+                    self.replaying = True
+                    continue
+                if pending and (stopping or self._pending_rows(pending) >= self.batch_size
+                                or time.monotonic() - oldest >= self.max_latency):
+                    if self.spool:
+                        self._flush_queued(conn, cursor, pending)
+                    else:
+                        self._flush(conn, cursor, pending)
+                    pending = []
+                    oldest = None
+                    if self.replaying and stopping:
+                        self._replay(conn, cursor)  # one last attempt; whatever fails stays spooled
+            if self.finalize:
+                self.finalize(cursor, conn)
+        except Exception as e:
+            logging.error(f"DB writer stopped: {e}")
+        finally:
+            conn.close()
+            if self.spool:
+                self.spool.close()
+            logging.info("Database connection closed")
+
+    def _pending_rows(self, pending):
+        return sum(len(rows) for rows, _ in pending) if self.spool else len(pending)
@@ -0,0 +1,159 @@
+import struct
+import datetime
+import threading
+
+import numpy as np
+from opcua import ua
+from opcua.server.history import HistoryStorageInterface
+
+EPOCH = datetime.datetime(1970, 1, 1)  # opcua timestamps are naive UTC
+_ONE_US = datetime.timedelta(microseconds=1)
+SAMPLE_BYTES = 8 + 8 + 1  # time, value, status
+# where a paged read resumes: microsecond timestamp of the next value, values at it already returned
+CONTINUATION = struct.Struct("<qI")
+
+
+def ring_depth(signals, depth, max_bytes):
+    """Samples kept per signal: depth, lowered so that every signal's ring fits in max_bytes."""
+    return max(1, min(depth, max_bytes // (SAMPLE_BYTES * max(signals, 1))))
+
+
+class HistoryRings(HistoryStorageInterface):
+    """The last `depth` updates (time, value, status) of every Value node, for HistoryReadRaw.
+
+    Each column is one (signals, depth) NumPy array, written in place as a ring per signal,
+    so memory is fixed at startup and a whole block or drained worker batch is recorded
+    with a few vectorised assignments. Server2 records exactly what it writes to the
+    address space, quality-only updates included; nothing goes through python-opcua's
+    subscription-based historizing.
+
+    Reads follow ReadRawModifiedDetails: StartTime <= EndTime returns oldest first,
+    StartTime > EndTime newest first, and only an EndTime the newest values up to it.
+    NumValuesPerNode limits the result; the continuation point is the timestamp of the
+    first value not returned plus how many values at that timestamp were returned already,
+    so the same request with it continues exactly where it stopped even when a page ends
+    among values sharing a timestamp (except for EndTime-only reads, which have no start
+    to continue from, so they just return the newest NumValuesPerNode values).
+    python-opcua's own continuation points are a bare DateTime, so attach() routes the
+    history manager's raw reads here instead of through the storage interface.
+    """
+
+    def __init__(self, nodeids, depth, status_codes):
+        self.index = {nodeid: index for index, nodeid in enumerate(nodeids)}
+        self.depth = depth
+        self.status_codes = status_codes  # status index -> ua.StatusCode
+        signals = len(nodeids)
+        self.times = np.zeros((signals, depth))  # POSIX seconds
+        self.values = np.zeros((signals, depth))
+        self.statuses = np.zeros((signals, depth), dtype=np.uint8)
+        self.written = np.zeros(signals, dtype=np.int64)  # updates ever recorded; the next slot is written % depth
+        self.lock = threading.Lock()  # records come from Server2's loop, reads from the OPC UA server thread
+
+    def attach(self, history_manager):
+        """Serve history_manager's HistoryReadRaw requests from the rings."""
+        history_manager.set_storage(self)
+        history_manager._read_datavalue_history = self._read_datavalue_history
+
+    def _read_datavalue_history(self, rv, details):
+        resume = None
+        if rv.ContinuationPoint:
+            if len(rv.ContinuationPoint) != CONTINUATION.size:
+                raise ua.UaStatusCodeError(ua.StatusCodes.BadContinuationPointInvalid)
+            resume = CONTINUATION.unpack(rv.ContinuationPoint)
+        return self.read_node_history(rv.NodeId, details.StartTime, details.EndTime, details.NumValuesPerNode, resume)
+
+    @property
+    def nbytes(self):
+        return self.times.nbytes + self.values.nbytes + self.statuses.nbytes
+
+    def record(self, indices, values, statuses, times):
+        """Append updates in time order; statuses and times may be scalars shared by the batch.
+
+        A signal may occur several times in one batch (a drained worker ring), so each
+        occurrence gets its own slot after the ones before it.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        if not indices.size:
+            return
+        order = np.argsort(indices, kind="stable")
+        signals, starts, counts = np.unique(indices[order], return_index=True, return_counts=True)
+        occurrence = np.empty_like(order)
+        occurrence[order] = np.arange(len(order)) - np.repeat(starts, counts)
+        with self.lock:
+            slots = (self.written[indices] + occurrence) % self.depth
+            self.times[indices, slots] = times
+            self.values[indices, slots] = values
+            self.statuses[indices, slots] = statuses
+            self.written[signals] += counts
+
+    def _snapshot(self, index):
+        """(microsecond timestamps, values, statuses) of one signal, oldest first."""
+        with self.lock:
+            count = min(int(self.written[index]), self.depth)
+            slots = (int(self.written[index]) - count + np.arange(count)) % self.depth
+            times, values, statuses = self.times[index, slots], self.values[index, slots], self.statuses[index, slots]
+        return np.round(times * 1e6).astype(np.int64), values, statuses
+
+    def read_node_history(self, node_id, start, end, nb_values, resume=None):
+        """(DataValues, packed continuation point or None); resume is an unpacked continuation point."""
+        index = self.index.get(node_id)
+        if index is None:
+            return [], None
+        us, values, statuses = self._snapshot(index)
+
+        unset = ua.get_win_epoch()
+        start_us = None if start in (None, unset) else (start - EPOCH) // _ONE_US
+        end_us = None if end in (None, unset) else (end - EPOCH) // _ONE_US
+        backwards = start_us is not None and end_us is not None and start_us > end_us
+        if backwards:
+            selected = np.flatnonzero((us >= end_us) & (us <= start_us))[::-1]
+        elif start_us is None and end_us is not None:
+            selected = np.flatnonzero(us <= end_us)[::-1]
+        else:
+            mask = np.ones(len(us), dtype=bool)
+            if start_us is not None:
+                mask &= us >= start_us
+            if end_us is not None:
+                mask &= us <= end_us
+            selected = np.flatnonzero(mask)
+
+        # equal timestamps are adjacent in read order, so earlier pages are a prefix of it:
+        # everything read before the resume timestamp, then the values at it already returned
+        first = 0
+        if resume is not None:
+            resume_us, returned = resume
+            before = us[selected] > resume_us if backwards else us[selected] < resume_us
+            first = int(np.count_nonzero(before)) + returned
+        last = len(selected)
+        cont = None
+        if nb_values and last - first > nb_values:
+            last = first + nb_values
+            if start_us is not None:
+                next_us = int(us[selected[last]])
+                cont = CONTINUATION.pack(next_us, int(np.count_nonzero(us[selected[:last]] == next_us)))
+        selected = selected[first:last]
+        results = []
+        for position in selected.tolist():
+            datavalue = ua.DataValue(ua.Variant(float(values[position]), ua.VariantType.Double),
+                                     self.status_codes[statuses[position]])
+            datavalue.SourceTimestamp = EPOCH + int(us[position]) * _ONE_US
+            results.append(datavalue)
+        return results, cont
+
+    def new_historized_node(self, node_id, period, count=0):
+        pass  # every Value node has its ring from the start
+
+    def save_node_value(self, node_id, datavalue):
+        pass  # values are recorded by Server2 with record(); subscription-based historizing adds nothing
+
+    def new_historized_event(self, source_id, evtypes, period, count=0):
+        pass  # no event history is kept
+
+    def save_event(self, event):
+        pass
+
+    def read_event_history(self, source_id, start, end, nb_values, evfilter):
+        return [], None
+
+    def stop(self):
+        pass
@@ -0,0 +1,284 @@
+# In-process metrics for Server2 and Client2, served as Prometheus text on a local port.
+#
+# Histograms use fixed bucket bounds: observe() is one bisect and a few adds under a lock,
+# cheap enough for per-request and per-batch timing on the hot path. Gauges are callables
+# sampled only when the endpoint is scraped, so existing counters (scheduler overruns,
+# writer queue depth) are exported without touching the code that maintains them.
+#
+#   curl http://127.0.0.1:9110/metrics
+#
+# Profiling: PROFILE_FILE=out.prof profiles the whole run; with PROFILE_SIGNAL=true, SIGUSR1
+# starts a cProfile and the next SIGUSR1 writes it to PROFILE_FILE (default <process>.prof).
+# Both cover every thread started through PROFILER.wrap() and the main thread (Server2's
+# event loop calls PROFILER.check() every cycle), merged into one file. Threads are named,
+# so py-spy dumps (py-spy dump --pid <pid>) show which stage each stack belongs to.
+import os
+import time
+import bisect
+import signal
+import atexit
+import logging
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# seconds; spans sub-millisecond decodes up to multi-second stalls
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Fixed-bucket histogram, optionally split by label values (observe(seconds, *label_values))."""
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(counts) for key, counts in self._series.items()}
+        for label_values, counts in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                labels = _label_text(self.labels, label_values, [f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _label_text(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {counts[-1]:.6f}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter, optionally split by label values (inc(*label_values, amount=1))."""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{_label_text(self.labels, label_values)} {value}")
+        return lines
+
+
+class Gauge:
+    """Value read from a callable at scrape time; with labels, read() returns {label values tuple: value}."""
+
+    def __init__(self, name, help_text, read, labels=()):
+        self.name = name
+        self.help = help_text
+        self.read = read
+        self.labels = tuple(labels)
+
+    def render(self):
+        try:
+            if self.labels:
+                values = {tuple(key): float(value) for key, value in self.read().items()}
+            else:
+                values = {(): float(self.read())}
+        except Exception as e:  # a broken gauge must not take the endpoint down
+            logging.debug(f"Gauge {self.name} failed: {e}")
+            return []
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{_label_text(self.labels, label_values)} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, read, labels=()):
+        return self.register(Gauge(name, help_text, read, labels))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self.metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def serve(port, host="127.0.0.1", registry=REGISTRY):
+    """Serve registry.render() at http://host:port/metrics from a daemon thread; port 0 disables it."""
+    if not port:
+        return None
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass  # scrapes are not worth a log line each
+
+    try:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    except OSError as e:
+        logging.warning(f"Metrics endpoint disabled, cannot listen on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logging.info(f"Metrics at http://{host}:{port}/metrics")
+    return server
+
+
+class ThreadProfiler:
+    """cProfile across threads, merged into one stats file.
+
+    A cProfile.Profile only sees the thread that enabled it, so every participating thread
+    owns one: threads started with wrap(target) switch theirs on and off in check(), which
+    they call once per loop iteration, and hand the stats over when profiling stops or the
+    thread ends. stop() waits (up to timeout) for the running threads to hand theirs in.
+    """
+
+    def __init__(self):
+        self.active = False
+        self._local = threading.local()
+        self._done = threading.Condition()
+        self._running = 0  # threads with an enabled profile
+        self._collected = []  # pstats.Stats handed in by their threads
+
+    def check(self):
+        """Follow the profiling state in the calling thread; cheap when nothing changed."""
+        profile = getattr(self._local, "profile", None)
+        if self.active and profile is None:
+            self._local.profile = cProfile.Profile()
+            with self._done:
+                self._running += 1
+            self._local.profile.enable()
+        elif not self.active and profile is not None:
+            self._finish()
+
+    def _finish(self):
+        profile, self._local.profile = self._local.profile, None
+        profile.disable()
+        stats = pstats.Stats(profile)
+        with self._done:
+            self._running -= 1
+            self._collected.append(stats)
+            self._done.notify_all()
+
+    def wrap(self, target):
+        """Thread target that runs target under this thread's profile."""
+        def run(*args, **kwargs):
+            self.check()
+            try:
+                return target(*args, **kwargs)
+            finally:
+                if getattr(self._local, "profile", None) is not None:
+                    self._finish()
+        return run
+
+    def start(self):
+        self.active = True
+        self.check()
+
+    def stop(self, path, timeout=10.0):
+        """Stop profiling and write the merged stats of every thread to path."""
+        self.active = False
+        self.check()
+        with self._done:
+            self._done.wait_for(lambda: self._running == 0, timeout)
+            collected, self._collected = self._collected, []
+            missing = self._running
+        if not collected:
+            return
+        stats = collected[0]
+        for other in collected[1:]:
+            stats.add(other)
+        stats.dump_stats(path)
+        logging.info(f"Profile of {len(collected)} threads written to {path}"
+                     + (f" ({missing} still running were left out)" if missing else ""))
+
+
+PROFILER = ThreadProfiler()
+
+
+def setup_profiling(process_name):
+    """Apply the PROFILE_FILE / PROFILE_SIGNAL settings (see the module comment)."""
+    path = os.getenv("PROFILE_FILE", "")
+    on_signal = os.getenv("PROFILE_SIGNAL", "false").lower() == "true"
+
+    if path and not on_signal:
+        PROFILER.start()
+        atexit.register(PROFILER.stop, path)
+        return
+
+    if on_signal and hasattr(signal, "SIGUSR1"):
+        path = path or f"{process_name}.prof"
+
+        def toggle(signum, frame):
+            # only flips the state: every thread switches its own profile in check(), and the
+            # dump, which waits for them to hand theirs in, runs on a thread of its own
+            if not PROFILER.active:
+                PROFILER.active = True
+                logging.info("Profiling started (SIGUSR1 again to stop)")
+            else:
+                threading.Thread(target=PROFILER.stop, args=(path,), name="profile-dump", daemon=True).start()
+
+        signal.signal(signal.SIGUSR1, toggle)
@@ -0,0 +1,69 @@
+# One-shot migration of a Client2 database from the row-per-sample machine_signals table
+# to the signals/samples layout in signal_store.py.
+#
+#   python migrate_db.py machine_data.db [--drop-legacy]
+#
+# The old table is renamed to machine_signals_legacy and copied in a single transaction;
+# afterwards machine_signals is a view over the new tables, so existing readers keep working.
+# Pass --drop-legacy to delete the old table (and VACUUM) once the copy succeeded.
+import time
+import argparse
+
+import signal_store
+
+
+def migrate(db_file, drop_legacy=False):
+    conn = signal_store.connect(db_file)
+    if not signal_store.has_legacy_table(conn):
+        print(f"{db_file}: machine_signals is not a legacy table, nothing to migrate")
+        signal_store.create_schema(conn)
+        conn.close()
+        return
+
+    started = time.time()
+    (legacy_rows,) = conn.execute("SELECT COUNT(*) FROM machine_signals").fetchone()
+    print(f"{db_file}: migrating {legacy_rows} rows")
+
+    # one script so the rename, new schema and copy commit (or roll back) together
+    try:
+        conn.executescript(f"""
+            BEGIN;
+            ALTER TABLE machine_signals RENAME TO machine_signals_legacy;
+            {signal_store.SCHEMA}
+            INSERT OR IGNORE INTO signals (machine, signal, unit)
+                SELECT machine, signal, MAX(unit) FROM machine_signals_legacy
+                WHERE machine IS NOT NULL AND signal IS NOT NULL
+                GROUP BY machine, signal;
+            -- old timestamps are local time text; 'utc' converts them to UTC before taking the epoch
+            INSERT OR REPLACE INTO samples (signal_id, ts_ms, value)
+                SELECT s.id, CAST(round((julianday(l.timestamp, 'utc') - 2440587.5) * 86400000) AS INTEGER), l.value
+                FROM machine_signals_legacy l
+                JOIN signals s ON s.machine = l.machine AND s.signal = l.signal
+                WHERE l.timestamp IS NOT NULL
+                ORDER BY s.id, l.timestamp;
+            COMMIT;
+        """)
+    except Exception:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+
+    (signals,) = conn.execute("SELECT COUNT(*) FROM signals").fetchone()
+    (samples,) = conn.execute("SELECT COUNT(*) FROM samples").fetchone()
+    print(f"Migrated into {signals} signals / {samples} samples in {time.time() - started:.1f}s "
+          f"({legacy_rows - samples} duplicate or invalid rows skipped)")
+
+    if drop_legacy:
+        conn.execute("DROP TABLE machine_signals_legacy")
+        conn.commit()
+        conn.execute("VACUUM")
+        print("Dropped machine_signals_legacy")
+    conn.close()
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Migrate machine_signals to the signals/samples schema")
+    p.add_argument("db_file")
+    p.add_argument("--drop-legacy", action="store_true")
+    args = p.parse_args()
+    migrate(args.db_file, args.drop_legacy)
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+from pymodbus.server.async_io import ModbusConnectedRequestHandler, StartTcpServer
+
+
+class RequestStats:
+    """Thread-safe request counters for the Modbus server.
+
+    The server's event loop records one latency per request (decode done -> response
+    written); the Flask thread reads snapshot(). Recent samples are kept in a bounded
+    window so percentiles and requests/s reflect current load, not the whole run.
+    """
+
+    def __init__(self, window_sec=5.0, max_samples=50000):
+        self.window_sec = window_sec
+        self._samples = deque(maxlen=max_samples)  # (monotonic time, latency sec)
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.connections = 0
+        self.total_connections = 0
+
+    def record(self, latency, failed=False):
+        with self._lock:
+            self.requests += 1
+            self.errors += failed
+            self._samples.append((time.monotonic(), latency))
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections += 1
+            self.total_connections += 1
+
+    def connection_closed(self):
+        with self._lock:
+            self.connections -= 1
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            recent = sorted(latency for at, latency in self._samples if now - at <= self.window_sec)
+            counters = {
+                "requests": self.requests,
+                "errors": self.errors,
+                "connections": self.connections,
+                "total_connections": self.total_connections,
+            }
+        window = min(self.window_sec, now - self.started) or self.window_sec
+
+        def percentile(p):
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))] * 1000, 3) if recent else None
+
+        counters["requests_per_sec"] = round(len(recent) / window, 1)
+        counters["latency_ms"] = {
+            "avg": round(sum(recent) / len(recent) * 1000, 3) if recent else None,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": round(recent[-1] * 1000, 3) if recent else None,
+        }
+        return counters
+
+
+class TimedRequestHandler(ModbusConnectedRequestHandler):
+    """Connected (TCP) handler that reports each request's latency to stats."""
+
+    stats = None
+
+    def connection_made(self, transport):
+        super().connection_made(transport)
+        self.stats.connection_opened()
+
+    def connection_lost(self, exc):
+        super().connection_lost(exc)
+        self.stats.connection_closed()
+
+    def execute(self, request, *addr):
+        started = time.perf_counter()
+        self._failed = True  # stays set if execute raises before a response is sent
+        try:
+            super().execute(request, *addr)
+        finally:
+            self.stats.record(time.perf_counter() - started, self._failed)
+
+    def send(self, message, *addr, **kwargs):
+        # Modbus exception responses (bad address, missing slave, ...) count as errors
+        self._failed = not kwargs.get("skip_encoding") and message.isError()
+        super().send(message, *addr, **kwargs)
+
+
+def stats_handler(stats):
+    """Handler class bound to one RequestStats (pymodbus instantiates handlers per connection)."""
+    return type("StatsRequestHandler", (TimedRequestHandler,), {"stats": stats})
+
+
+async def serve(context, identity, address, stats, backlog=512):
+    server = await StartTcpServer(
+        context, identity=identity, address=address,
+        handler=stats_handler(stats), allow_reuse_address=True, backlog=backlog,
+    )
+    await server.serve_forever()
+
+
+def start_async_modbus_server(context, identity, bind_host, bind_port, stats):
+    """Blocking: run the asyncio Modbus TCP server on its own event loop in the calling thread."""
+    print(f"Starting asyncio Modbus TCP server on {bind_host}:{bind_port}")
+    asyncio.run(serve(context, identity, (bind_host, bind_port), stats))
@@ -1,19 +1,25 @@
 # simulator_with_register_control.py
 # Updated: supports up to 247 slave unit ids (1..247).
-# Only slaves 1 and 2 are actively simulated and updated. All other unit ids return zeros
-# for their registers (Modbus reads will return zeros). Any API operations that modify
-# runtime state (base_highs, params, spikes, stop/start) are only allowed for unit 1 and 2.
+# By default only slaves 1 and 2 are actively simulated and updated (--simulate-units N simulates
+# units 1..N for load tests). All other unit ids return zeros for their registers (Modbus reads
+# will return zeros). Any API operations that modify runtime state (base_highs, params, spikes,
+# stop/start) are only allowed for simulated units.
 
+import json
 import time
-import random
-import math
 from threading import Thread
 from pymodbus.server.sync import StartTcpServer
 from pymodbus.device import ModbusDeviceIdentification
 from pymodbus.datastore import ModbusSequentialDataBlock, ModbusSlaveContext, ModbusServerContext
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 
+from sim_engine import SimEngine
+from async_server import RequestStats, start_async_modbus_server
+from register_log import RegisterLog
+from register_history import RegisterHistory
+from trace_replay import TraceReplay, load_trace
+
 # ---------- initial registers (pairs: high, 0) ----------
 initial_regs_slave1 = [2200,0, 3500,0, 6000,0, 500,0, 20,0, 1000,0, 1800,0, 250,0]
 initial_regs_slave2 = [2100,0, 1400,0, 2800,0, 490,0, 30,0, 900,0, 1600,0, 300,0]
@@ -35,6 +41,10 @@ for unit in range(1, 248):
 context = ModbusServerContext(slaves=stores, single=False)#these tells modbus that i ma running server with multiple slaves menas multiplr devices
 #ModbusServerContext ye funtin define karat hai ki kitne slavce will be manage by server
 
+# versioned copy of all registers: every change bumps a sequence number (/api/changes, /api/stream, ETags)
+register_log = RegisterLog(len(stores))
+register_log.commit([1, 2], [initial_regs_slave1, initial_regs_slave2])
+
 # ---------- Identity ----------
 identity = ModbusDeviceIdentification()#these is basically device meta data to tell clinet if he cinnetc which serve and what is the metdata
 identity.VendorName = 'modbus Simulator'
@@ -49,13 +59,15 @@ _sim_state = {
     "paused": False,
     "update_interval": 0.005,#these to generate verey fast values   
     "print_interval": 0.25,#these orint the value very fats so that they will be coming to the 
-    # map unit id -> base highs list (length 8) - only meaningful for unit 1 and 2
+    # unit ids driven by the simulation engine; every other unit stays at zeros
+    "active_units": {1, 2},
+    # map unit id -> base highs list (length 8) - only meaningful for simulated units
     "base_highs": {
         1: [initial_regs_slave1[i] for i in range(0, len(initial_regs_slave1), 2)],
         2: [initial_regs_slave2[i] for i in range(0, len(initial_regs_slave2), 2)]
     },
     # per-unit set of stopped register indexes (0..7). If stopped, that signal's high word is set to 0 and not updated.
-    # only meaningful for unit 1 and 2
+    # only meaningful for simulated units
     "stopped_indices": {
         1: set(),
         2: set()
@@ -72,119 +84,139 @@ _sim_state = {
             "periods":    [8, 6, 12, 10, 3, 9, 7, 11],
             "jitter_scale": 0.02
         }
-    },
-    # active spikes: list of dicts {unit, idx, magnitude, end_time, kind}
-    "spikes": []
+    }
 }
 
-# ---------- Simulator functions ----------
-def simulate_slave(unit_id, update_interval):
-    """Only run this for unit 1 and 2. Other units are static zeros and do not need simulation."""
-    t0 = time.time()
-    i = 0
-    while True:
-        if not _sim_state["paused"]:#if !_sim_state["paused"]
-            t = time.time() - t0
-            new_regs = []
-            base_highs = _sim_state["base_highs"].get(unit_id, [0]*8)
-            stopped = _sim_state["stopped_indices"].get(unit_id, set())
-            params = _sim_state["params"].get(unit_id, {})
-            amplitudes = params.get("amplitudes", [50]*8)
-            periods = params.get("periods", [10]*8)
-            jitter_scale = params.get("jitter_scale", 0.02)
-
-            # collect active spikes for this unit
-            now = time.time()
-            active_spikes = [s for s in _sim_state["spikes"] if s["unit"] == unit_id and s["end_time"] > now]
-
-            for idx, base in enumerate(base_highs):
-                if idx in stopped:
-                    new_high = 0
-                else:
-                    amp = amplitudes[idx % len(amplitudes)]
-                    period = periods[idx % len(periods)]
-                    phase = (idx * 0.13) + (i * 0.0001)
-                    delta = int(amp * math.sin(2 * math.pi * t / period + phase) + random.uniform(-amp*jitter_scale, amp*jitter_scale))
-                    new_high = max(0, base + delta)
-
-                    # apply spikes (additive). There can be multiple spikes; sum magnitudes or apply types.
-                    for sp in active_spikes:
-                        if sp["idx"] == idx:
-                            new_high = max(0, new_high + int(sp.get("magnitude", 0)))
-
-                new_regs.append(new_high)
-                new_regs.append(0)
-            try:
-                # set values into context for this unit
-                context[unit_id].setValues(3, 0, new_regs)
-            except Exception as ex:
-                print(f"Simulator: failed to set values for unit {unit_id}: {ex}")
-        i += 1
-        time.sleep(update_interval)
-
-
-def pretty_monitor(print_interval):
+# created in main() once the set of simulated units is known; holds the per-unit spike index
+engine = None
+# request counters; only the asyncio server (--server-mode async) records into these
+server_stats = None
+# recent register samples of the simulated units, for /api/units/<id>/history
+history = None
+history_rate = 10.0
+replay = None
+
+
+def simulate_units(count):
+    """Mark units 1..count as simulated. Units past 2 start from slave 1/2 defaults alternately."""
+    for unit_id in range(1, count + 1):
+        template = 2 - unit_id % 2
+        _sim_state["active_units"].add(unit_id)
+        _sim_state["base_highs"].setdefault(unit_id, list(_sim_state["base_highs"][template]))
+        _sim_state["stopped_indices"].setdefault(unit_id, set())
+        _sim_state["params"].setdefault(unit_id, {**_sim_state["params"][template]})
+
+
+def not_simulated(unit_id):
+    if unit_id not in _sim_state["active_units"]:
+        return jsonify({"error": "unit not active for modifications; read-only zeros"}), 400
+    return None
+
+
+def not_modified(etag):
+    """304 response if the client already holds etag, else None."""
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers={"ETag": f'"{etag}"'})
+    return None
+
+
+def with_etag(response, etag):
+    response.set_etag(etag)
+    return response
+
+# ---------- Monitor ----------
+SIGNAL_LABELS = ["V", "I", "Temp", "Hz", "Vib", "Flow", "RPM", "Torque"]
+
+def format_unit(unit_id, regs, previous):
+    """One console line per unit; signals that changed since the last render are marked with *."""
+    stopped = _sim_state["stopped_indices"].get(unit_id, set())
+    fields = []
+    for idx, label in enumerate(SIGNAL_LABELS):
+        high = int(regs[2 * idx])
+        mark = "*" if previous is not None and high != previous[2 * idx] else " "
+        value = "STOP" if idx in stopped else f"{high / 100.0:.2f}"
+        fields.append(f"{label}={value}{mark}")
+    line = f"Slave {unit_id:>3} | " + " ".join(fields)
+    spikes = engine.active_spikes(unit_id)
+    if spikes:
+        now = time.time()
+        line += " | spikes: " + ", ".join(
+            f"idx={sp['idx']} mag={sp['magnitude']} {max(0, sp['end_time'] - now):.1f}s" for sp in spikes)
+    return line
+
+
+def pretty_monitor(max_units):
+    """Every print_interval, print the units whose registers changed since the last render.
+
+    Unchanged and never-simulated units are skipped (nothing is printed while nothing changes),
+    and at most max_units lines are printed per render, so console output no longer scales
+    with the number of unit ids.
+    """
     time.sleep(0.05)
-    signal_names = [
-        "Voltage (x0.01 V)",
-        "Current (x0.01 A)",
-        "Temperature (x0.01 °C)",
-        "Frequency (x0.01 Hz)",
-        "Vibration",
-        "FlowRate (x0.01 L/min)",
-        "RPM (x0.01 rpm)",
-        "Torque"
-    ]
+    rendered_seq = 0
+    last_rendered = {}  # unit id -> registers printed last time
     while True:
+        interval = _sim_state["print_interval"]
+        if interval <= 0:
+            time.sleep(1)
+            continue
+        rendered_seq, changed = register_log.changed_units(rendered_seq)
+        if not changed:
+            time.sleep(interval)
+            continue
+        _, regs = register_log.snapshot(changed[:max_units])
         now = time.time()
-        # iterate only over created stores (1..247)
-        for unit_id in sorted(stores.keys()):
-            try:
-                regs = context[unit_id].getValues(3, 0, count=16)
-            except Exception:
-                regs = []
-            print("="*60)
-            print(f"Slave {unit_id} @ {time.strftime('%H:%M:%S', time.localtime(now))}  (paused={_sim_state['paused']})")
-            if regs:
-                for i in range(0, 16, 2):
-                    idx = i // 2
-                    raw_high = regs[i]
-                    scaled = raw_high / 100.0
-                    stopped_flag = idx in _sim_state["stopped_indices"].get(unit_id, set())
-                    stopped_text = " [STOPPED]" if stopped_flag else ""
-                    print(f"{signal_names[idx]:<18} | {scaled:8.3f}  (regs {i},{i+1} => {raw_high}){stopped_text}")
-            else:
-                print("no registers available")
-            # show active spikes for the unit
-            now = time.time()
-            unit_spikes = [s for s in _sim_state["spikes"] if s["unit"] == unit_id and s["end_time"] > now]
-            if unit_spikes:
-                print(" Active spikes:")
-                for sp in unit_spikes:
-                    remaining = max(0, sp["end_time"] - now)
-                    print(f"  - idx={sp['idx']} mag={sp['magnitude']} remaining={remaining:.2f}s kind={sp.get('kind')}")
-            print("="*60)
-        time.sleep(print_interval)
+        print(f"--- {time.strftime('%H:%M:%S', time.localtime(now))} seq={rendered_seq} paused={_sim_state['paused']} "
+              f"changed={len(changed)}/{len(_sim_state['active_units'])} units overruns={engine.overruns}")
+        for unit_id, unit_regs in zip(changed, regs.tolist()):
+            print(format_unit(unit_id, unit_regs, last_rendered.get(unit_id)))
+            last_rendered[unit_id] = unit_regs
+        if len(changed) > max_units:
+            print(f"... and {len(changed) - max_units} more changed units")
+        time.sleep(interval)
+
+
+def history_sampler(history, rate_hz):
+    """Copy the simulated units' registers into the history ring rate_hz times per second."""
+    interval = 1.0 / rate_hz
+    deadline = time.monotonic()
+    while True:
+        _, regs = register_log.snapshot(history.units)
+        history.record(time.time(), regs)
+        deadline += interval
+        time.sleep(max(0.0, deadline - time.monotonic()))
 
 # ---------- Start Modbus server (blocking) ----------
 def start_modbus_server(bind_host, bind_port):
     print(f"Starting Modbus TCP server on {bind_host}:{bind_port}")
     StartTcpServer(context, identity=identity, address=(bind_host, bind_port))
 
+def start_modbus_server_async(bind_host, bind_port):
+    start_async_modbus_server(context, identity, bind_host, bind_port, server_stats)
+
 # ---------- Flask API ----------
 app = Flask("modbus-sim-api")
 CORS(app)
 
 @app.route("/api/status", methods=["GET"])
 def api_status():
+    # seq is read before the registers, so a client resuming /api/changes from it misses nothing
+    seq = register_log.seq
+    etag = f"status-{seq}"
+    cached = not_modified(etag)
+    if cached:
+        return cached
     data = {
+        "seq": seq,
         "paused": _sim_state["paused"],
         "update_interval": _sim_state["update_interval"],
         "print_interval": _sim_state["print_interval"],
+        "active_units": sorted(_sim_state["active_units"]),
         "stopped_indices": {u: sorted(list(s)) for u,s in _sim_state["stopped_indices"].items()},
         "params": _sim_state["params"],
         # return only active spikes
-        "spikes": [s for s in _sim_state["spikes"] if s["end_time"] > time.time()]
+        "spikes": engine.active_spikes(),
+        "replay": replay.stats() if replay else None
     }
     units = {}
     for unit in sorted(stores.keys()):
@@ -194,54 +226,119 @@ def api_status():
             regs = []
         units[unit] = regs
     data["units"] = units
-    return jsonify(data)
+    return with_etag(jsonify(data), etag)
+
+@app.route("/api/changes", methods=["GET"])
+def api_changes():
+    """Registers changed after ?since=<seq> as {seq, full, config_changed, units: {unit: {reg: value}}}.
+
+    Start with since=0 (every non-zero register), then pass back the returned seq.
+    config_changed means params/pause/stopped/spikes changed too; re-read /api/status for those.
+    """
+    since = request.args.get("since", 0, type=int)
+    return jsonify(register_log.changes_since(since))
+
+@app.route("/api/stream", methods=["GET"])
+def api_stream():
+    """Server-Sent Events: one 'delta' event (same body as /api/changes) per change, at most every ?interval_ms.
+
+    Resumes from the Last-Event-ID header (sent automatically by EventSource on reconnect) or ?since.
+    """
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", 0, type=int)
+    interval = max(10, request.args.get("interval_ms", 100, type=int)) / 1000.0
+
+    def events(since):
+        while True:
+            if register_log.wait_for_change(since, timeout=15.0) == since:
+                yield ": keepalive\n\n"
+                continue
+            delta = register_log.changes_since(since)
+            since = delta["seq"]
+            yield f"id: {since}\nevent: delta\ndata: {json.dumps(delta, separators=(',', ':'))}\n\n"
+            time.sleep(interval)  # coalesce the engine's ticks into one event per interval
+
+    return Response(stream_with_context(events(since)), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route("/api/server-stats", methods=["GET"])
+def api_server_stats():
+    # per-request latency and throughput of the Modbus server (async mode only)
+    if server_stats is None:
+        return jsonify({"mode": "sync", "error": "request stats need --server-mode async"}), 404
+    return jsonify({"mode": "async", **server_stats.snapshot()})
 
 @app.route("/api/units/<int:unit_id>/regs", methods=["GET"])
 def api_get_regs(unit_id):
     # Always return registers for requested unit. For units >2 these are zeroed.
     if unit_id not in stores:
         return jsonify({"unit": unit_id, "regs": [0]*16, "stopped": []})
+    etag = "unit-{}-{}-{}".format(unit_id, *register_log.unit_version(unit_id))
+    cached = not_modified(etag)
+    if cached:
+        return cached
     try:
         regs = context[unit_id].getValues(3, 0, count=16)
     except Exception:
         regs = [0]*16
     stopped = sorted(list(_sim_state["stopped_indices"].get(unit_id, set())))
-    return jsonify({"unit": unit_id, "regs": regs, "stopped": stopped})
+    return with_etag(jsonify({"unit": unit_id, "regs": regs, "stopped": stopped}), etag)
+
+@app.route("/api/units/<int:unit_id>/history", methods=["GET"])
+def api_history(unit_id):
+    """Registers of one simulated unit over the last ?seconds=N (default 60), oldest sample first."""
+    if unit_id not in history.rows:
+        return jsonify({"error": "no history: unit not simulated (registers are static zeros)"}), 404
+    seconds = request.args.get("seconds", 60, type=float)
+    times, regs = history.unit_history(unit_id, seconds, time.time())
+    return jsonify({"unit": unit_id, "seconds": seconds, "sample_interval": 1.0 / history_rate,
+                    "times": times.tolist(), "regs": regs.tolist()})
 
 @app.route("/api/units/<int:unit_id>/stop/<int:idx>", methods=["POST"])
 def api_stop_register(unit_id, idx):
-    # Only allow stop/start for simulated units (1 and 2). For other units, respond with error.
-    if unit_id not in (1, 2):
-        return jsonify({"error": "unit not active for modifications; read-only zeros"}), 400
+    # Only allow stop/start for simulated units. For other units, respond with error.
+    rejected = not_simulated(unit_id)
+    if rejected:
+        return rejected
     if unit_id not in _sim_state["stopped_indices"]:
         _sim_state["stopped_indices"][unit_id] = set()
     _sim_state["stopped_indices"][unit_id].add(idx)
+    engine.refresh(unit_id)
     try:
         regs = context[unit_id].getValues(3, 0, count=16)
         regs[2*idx] = 0
         context[unit_id].setValues(3, 0, regs)
+        register_log.commit([unit_id], [regs])
     except Exception:
         pass
+    register_log.touch()
     return jsonify({"ok": True, "unit": unit_id, "stopped_index": idx})
 
 @app.route("/api/units/<int:unit_id>/start/<int:idx>", methods=["POST"])
 def api_start_register(unit_id, idx):
-    if unit_id not in (1, 2):
-        return jsonify({"error": "unit not active for modifications; read-only zeros"}), 400
+    rejected = not_simulated(unit_id)
+    if rejected:
+        return rejected
     if unit_id in _sim_state["stopped_indices"]:
         _sim_state["stopped_indices"][unit_id].discard(idx)
+        engine.refresh(unit_id)
+    register_log.touch()
     return jsonify({"ok": True, "unit": unit_id, "started_index": idx})
 
 @app.route("/api/units/<int:unit_id>/base", methods=["POST"])
 def api_set_base(unit_id):
-    # Only allow setting base for units 1 and 2
-    if unit_id not in (1, 2):
-        return jsonify({"error": "unit not active for modifications; read-only zeros"}), 400
+    # Only allow setting base for simulated units
+    rejected = not_simulated(unit_id)
+    if rejected:
+        return rejected
     payload = request.json or {}
     base_highs = payload.get("base_highs")
     if not isinstance(base_highs, list) or len(base_highs) != 8:
         return jsonify({"error": "base_highs must be an array of 8 integers"}), 400
     _sim_state["base_highs"][unit_id] = [int(x) for x in base_highs]
+    engine.refresh(unit_id)
+    register_log.touch()
     return jsonify({"ok": True, "unit": unit_id, "base_highs": _sim_state["base_highs"][unit_id]})
 
 @app.route("/api/pause", methods=["POST"])
@@ -251,15 +348,17 @@ def api_pause():
     if paused is None:
         return jsonify({"error": "missing 'paused' boolean in json body"}), 400
     _sim_state["paused"] = bool(paused)
+    register_log.touch()
     return jsonify({"ok": True, "paused": _sim_state["paused"]})
 
 @app.route("/api/units/<int:unit_id>/params", methods=["GET", "POST"])
 def api_params(unit_id):
     if request.method == "GET":
         return jsonify(_sim_state["params"].get(unit_id, {}))
-    # only allow changes for units 1 and 2
-    if unit_id not in (1, 2):
-        return jsonify({"error": "unit not active for modifications; read-only zeros"}), 400
+    # only allow changes for simulated units
+    rejected = not_simulated(unit_id)
+    if rejected:
+        return rejected
     payload = request.json or {}
     # optional keys: amplitudes (list of 8 ints), periods (list of 8 ints), jitter_scale (float)
     if "amplitudes" in payload:
@@ -275,6 +374,8 @@ def api_params(unit_id):
     if "jitter_scale" in payload:
         js = float(payload["jitter_scale"])
         _sim_state["params"].setdefault(unit_id, {})["jitter_scale"] = js
+    engine.refresh(unit_id)
+    register_log.touch()
     return jsonify({"ok": True, "params": _sim_state["params"].get(unit_id)})
 
 @app.route("/api/units/<int:unit_id>/spike", methods=["POST"])
@@ -288,9 +389,10 @@ def api_spike(unit_id):
       "kind": "burst"          # optional label
     }
     """
-    # only allow spikes on simulated units 1 and 2
-    if unit_id not in (1, 2):
-        return jsonify({"error": "unit not active for modifications; read-only zeros"}), 400
+    # only allow spikes on simulated units
+    rejected = not_simulated(unit_id)
+    if rejected:
+        return rejected
     payload = request.json or {}
     idx = payload.get("idx")
     magnitude = int(payload.get("magnitude", 0))
@@ -301,9 +403,10 @@ def api_spike(unit_id):
     now = time.time()
     end_time = now + (duration_ms / 1000.0)
     sp = {"unit": unit_id, "idx": int(idx), "magnitude": magnitude, "end_time": end_time, "kind": kind}
-    _sim_state["spikes"].append(sp)
+    engine.add_spike(sp)
+    register_log.touch()
     # return active spikes
-    active = [s for s in _sim_state["spikes"] if s["end_time"] > now]
+    active = engine.active_spikes(now=now)
     return jsonify({"ok": True, "spike": sp, "active_spikes": active})
 
 @app.route("/api/throw-starts", methods=["GET", "POST", "DELETE"])
@@ -335,20 +438,63 @@ def main():
     p.add_argument("--modbus-port", default=5020, type=int)
     p.add_argument("--api-host", default="127.0.0.1")
     p.add_argument("--api-port", default=8000, type=int)
+    p.add_argument("--simulate-units", default=2, type=int,
+                   help="simulate units 1..N (max 247); the rest stay at zeros")
+    p.add_argument("--update-interval", default=0.005, type=float,
+                   help="seconds between simulated register frames")
+    p.add_argument("--server-mode", choices=("sync", "async"), default="sync",
+                   help="sync: thread per connection; async: asyncio server with request stats at /api/server-stats")
+    p.add_argument("--print-interval", default=1.0, type=float,
+                   help="seconds between console renders of changed units (0 disables the monitor)")
+    p.add_argument("--monitor-max-units", default=20, type=int,
+                   help="most units printed per console render")
+    p.add_argument("--history-seconds", default=120, type=int,
+                   help="seconds of register history kept per simulated unit")
+    p.add_argument("--history-rate", default=10.0, type=float,
+                   help="register history samples per second")
+    p.add_argument("--replay", default=None,
+                   help="play recorded samples (Client2 SQLite database or CSV) into the slaves they map to")
+    p.add_argument("--replay-config", default="machines_config.json",
+                   help="machines_config.json mapping the replayed machines/signals onto units and registers")
+    p.add_argument("--replay-speed", default=1.0, type=float,
+                   help="replay speed-up over the recorded time (1 = real time)")
+    p.add_argument("--replay-loop", action="store_true",
+                   help="restart the replay after the last recorded sample")
     args = p.parse_args()
 
-    _sim_state["update_interval"] = 0.005
-    _sim_state["print_interval"] = 0.25
+    global engine, server_stats, history, history_rate, replay
+    simulate_units(max(1, min(args.simulate_units, 247)))
+    history_units = set(_sim_state["active_units"])
+    if args.replay:
+        with open(args.replay_config) as f:
+            replay = TraceReplay(context, _sim_state, json.load(f), load_trace(args.replay),
+                                 speed=args.replay_speed, loop=args.replay_loop, register_log=register_log)
+        print(replay.describe())
+        # replayed units are driven by the trace only: no sine engine, no control API edits
+        _sim_state["active_units"].difference_update(replay.units)
+        history_units.update(replay.units)
+    engine = SimEngine(context, _sim_state, _sim_state["active_units"], register_log=register_log)
+
+    _sim_state["update_interval"] = args.update_interval
+    _sim_state["print_interval"] = args.print_interval
+    history_rate = args.history_rate
+    history = RegisterHistory(history_units, max(1, int(args.history_seconds * history_rate)))
 
     # start Modbus server
-    Thread(target=start_modbus_server, args=(args.modbus_host, args.modbus_port), daemon=True).start()
+    if args.server_mode == "async":
+        server_stats = RequestStats()
+        Thread(target=start_modbus_server_async, args=(args.modbus_host, args.modbus_port), daemon=True).start()
+    else:
+        Thread(target=start_modbus_server, args=(args.modbus_host, args.modbus_port), daemon=True).start()
 
-    # start simulation only for units 1 and 2
-    Thread(target=simulate_slave, args=(1, _sim_state["update_interval"]), daemon=True).start()
-    Thread(target=simulate_slave, args=(2, _sim_state["update_interval"]), daemon=True).start()
+    # one engine thread computes every simulated unit's registers per tick
+    Thread(target=engine.run, daemon=True).start()
+    if replay:
+        Thread(target=replay.run, daemon=True).start()
 
-    # monitor (prints all units; many will show zeros)
-    Thread(target=pretty_monitor, args=(_sim_state["print_interval"],), daemon=True).start()
+    # monitor (prints only units whose registers changed) and history ring
+    Thread(target=pretty_monitor, args=(args.monitor_max_units,), daemon=True).start()
+    Thread(target=history_sampler, args=(history, history_rate), daemon=True).start()
 
     def run_flask():
         print(f"Control API: http://{args.api_host}:{args.api_port}")
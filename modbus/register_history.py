@@ -0,0 +1,41 @@
+import threading
+
+import numpy as np
+
+from sim_engine import REGS_PER_UNIT
+
+
+class RegisterHistory:
+    """Fixed-size ring of register samples for a set of units.
+
+    One (capacity,) array of sample times and one (capacity, units, 16) uint16 array of
+    register values are allocated up front; record() overwrites the oldest sample, so memory
+    stays at capacity * units * 32 bytes however long the simulator runs.
+    """
+
+    def __init__(self, unit_ids, capacity):
+        self.units = sorted(unit_ids)
+        self.rows = {unit_id: row for row, unit_id in enumerate(self.units)}
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((capacity, len(self.units), REGS_PER_UNIT), dtype=np.uint16)
+        self.count = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def record(self, t, regs):
+        """Store one sample: regs is (len(units), 16), in the order of self.units."""
+        with self._lock:
+            self.times[self._next] = t
+            self.values[self._next] = regs
+            self._next = (self._next + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+
+    def unit_history(self, unit_id, seconds, now):
+        """(times, (samples, 16) registers) of unit_id from the last seconds before now, oldest first."""
+        row = self.rows[unit_id]
+        with self._lock:
+            order = (self._next - self.count + np.arange(self.count)) % self.capacity
+            times = self.times[order]
+            recent = order[times >= now - seconds]
+            return self.times[recent], self.values[recent, row]
@@ -0,0 +1,87 @@
+import threading
+
+import numpy as np
+
+from sim_engine import REGS_PER_UNIT
+
+
+class RegisterLog:
+    """Versioned copy of every unit's holding registers.
+
+    Every commit that changes at least one register (and every touch() for control-state
+    changes: params, pause, spikes, ...) bumps one global sequence number. Each register
+    remembers the sequence of its last change, so changes_since(seq) is a single vectorised
+    comparison and no history has to be kept: a client that resumes from an old seq simply
+    gets the current value of everything that changed after it.
+    """
+
+    def __init__(self, unit_count):
+        self.values = np.zeros((unit_count, REGS_PER_UNIT), dtype=np.uint16)  # row = unit id - 1
+        self.changed_at = np.zeros((unit_count, REGS_PER_UNIT), dtype=np.int64)
+        self.seq = 0
+        self.config_seq = 0
+        self._cond = threading.Condition()
+
+    def commit(self, unit_ids, regs):
+        """Record the registers just written for unit_ids ((len(unit_ids), 16) array)."""
+        rows = np.asarray(unit_ids, dtype=np.intp) - 1
+        regs = np.asarray(regs, dtype=np.uint16)
+        with self._cond:
+            changed = self.values[rows] != regs
+            if not changed.any():
+                return self.seq
+            self.seq += 1
+            self.values[rows] = regs
+            stamps = self.changed_at[rows]
+            stamps[changed] = self.seq
+            self.changed_at[rows] = stamps
+            self._cond.notify_all()
+            return self.seq
+
+    def touch(self):
+        """Bump the sequence for a change that is not a register value (params, pause, spikes)."""
+        with self._cond:
+            self.seq += 1
+            self.config_seq = self.seq
+            self._cond.notify_all()
+            return self.seq
+
+    def unit_version(self, unit_id):
+        with self._cond:
+            return int(self.changed_at[unit_id - 1].max()), self.config_seq
+
+    def snapshot(self, unit_ids):
+        """(seq, copy of the (len(unit_ids), 16) registers) of the given units."""
+        rows = np.asarray(unit_ids, dtype=np.intp) - 1
+        with self._cond:
+            return self.seq, self.values[rows]
+
+    def changed_units(self, since):
+        """(seq, unit ids with at least one register changed after since)."""
+        with self._cond:
+            return self.seq, (np.nonzero((self.changed_at > since).any(axis=1))[0] + 1).tolist()
+
+    def changes_since(self, since):
+        """{seq, full, config_changed, units: {unit: {register: value}}} for registers changed after since.
+
+        A since from the future (the simulator restarted) is answered with the full state and
+        full=True so the client knows to drop what it has.
+        """
+        with self._cond:
+            full = since > self.seq
+            if full:
+                since = 0
+            rows, regs = np.nonzero(self.changed_at > since)
+            values = self.values[rows, regs]
+            seq, config_seq = self.seq, self.config_seq
+
+        units = {}
+        for row, reg, value in zip(rows.tolist(), regs.tolist(), values.tolist()):
+            units.setdefault(row + 1, {})[reg] = value
+        return {"seq": seq, "full": full, "config_changed": config_seq > since, "units": units}
+
+    def wait_for_change(self, since, timeout):
+        """Block until seq moves past since or timeout expires; returns the current seq."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq != since, timeout)
+            return self.seq
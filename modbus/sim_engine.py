@@ -0,0 +1,132 @@
+import threading
+import time
+
+import numpy as np
+
+SIGNALS_PER_UNIT = 8
+REGS_PER_UNIT = 2 * SIGNALS_PER_UNIT
+REGISTER_MAX = 0xFFFF
+
+
+class SimEngine:
+    """Computes the next register frame for every simulated unit in one vectorised pass.
+
+    Per-unit settings live in sim_state (base_highs, params, stopped_indices) exactly as the
+    control API edits them; after an edit the API calls refresh(unit_id) and the unit's row of
+    the base / amplitude / period / jitter / stopped arrays is rebuilt. Spikes are indexed per
+    unit and expired ones are evicted on every tick, so the index never grows past what is
+    currently active. One thread runs all units on absolute deadlines (start + n * interval),
+    so the tick rate does not drift with the time spent computing a frame. Written frames
+    (and spike expiry) are reported to register_log when one is given.
+    """
+
+    def __init__(self, context, sim_state, units, seed=None, register_log=None):
+        self.context = context
+        self.sim_state = sim_state
+        self.register_log = register_log
+        self.units = sorted(units)
+        self.rows = {unit_id: row for row, unit_id in enumerate(self.units)}
+        self.rng = np.random.default_rng(seed)
+
+        shape = (len(self.units), SIGNALS_PER_UNIT)
+        self.base = np.zeros(shape)
+        self.amplitude = np.zeros(shape)
+        self.period = np.ones(shape)
+        self.jitter = np.zeros(shape)  # amplitude * jitter_scale, the half-width of the uniform noise
+        self.stopped = np.zeros(shape, dtype=bool)
+        self.phase = np.arange(SIGNALS_PER_UNIT) * 0.13
+
+        self.spikes = {}  # unit_id -> [{unit, idx, magnitude, end_time, kind}, ...]
+        self._spike_lock = threading.Lock()
+
+        self.ticks = 0
+        self.overruns = 0
+        for unit_id in self.units:
+            self.refresh(unit_id)
+
+    def refresh(self, unit_id):
+        """Reload one unit's row from sim_state after the control API changed it."""
+        row = self.rows[unit_id]
+        params = self.sim_state["params"].get(unit_id, {})
+        amplitudes = np.resize(np.asarray(params.get("amplitudes", [50]), dtype=np.float64), SIGNALS_PER_UNIT)
+        self.base[row] = self.sim_state["base_highs"].get(unit_id, [0] * SIGNALS_PER_UNIT)
+        self.amplitude[row] = amplitudes
+        self.period[row] = np.resize(np.asarray(params.get("periods", [10]), dtype=np.float64), SIGNALS_PER_UNIT)
+        self.jitter[row] = amplitudes * float(params.get("jitter_scale", 0.02))
+        self.stopped[row] = False
+        self.stopped[row, sorted(self.sim_state["stopped_indices"].get(unit_id, ()))] = True
+
+    def add_spike(self, spike):
+        with self._spike_lock:
+            self.spikes.setdefault(spike["unit"], []).append(spike)
+
+    def active_spikes(self, unit_id=None, now=None):
+        """Spikes still running, for one unit or for all of them."""
+        now = time.time() if now is None else now
+        with self._spike_lock:
+            if unit_id is not None:
+                return [s for s in self.spikes.get(unit_id, ()) if s["end_time"] > now]
+            return [s for unit_spikes in self.spikes.values() for s in unit_spikes if s["end_time"] > now]
+
+    def _spike_offsets(self, now):
+        """Summed spike magnitudes per (unit, signal); drops expired spikes from the index."""
+        offsets = np.zeros_like(self.base)
+        expired = False
+        with self._spike_lock:
+            for unit_id in list(self.spikes):
+                live = [s for s in self.spikes[unit_id] if s["end_time"] > now]
+                expired = expired or len(live) < len(self.spikes[unit_id])
+                if not live:
+                    del self.spikes[unit_id]
+                    continue
+                self.spikes[unit_id] = live
+                row = self.rows.get(unit_id)
+                if row is None:
+                    continue
+                for spike in live:
+                    offsets[row, spike["idx"]] += int(spike.get("magnitude", 0))
+        if expired and self.register_log is not None:
+            self.register_log.touch()
+        return offsets
+
+    def frame(self, t, now=None):
+        """(units, 16) uint16 holding registers at t seconds since start: high words simulated, low words 0."""
+        now = time.time() if now is None else now
+        phase = self.phase + self.ticks * 0.0001
+        wave = self.amplitude * np.sin(2 * np.pi * t / self.period + phase)
+        noise = self.rng.uniform(-1.0, 1.0, self.base.shape) * self.jitter
+        highs = np.maximum(self.base + np.trunc(wave + noise), 0) + self._spike_offsets(now)
+        highs = np.clip(highs, 0, REGISTER_MAX)
+        highs[self.stopped] = 0
+
+        regs = np.zeros((len(self.units), REGS_PER_UNIT), dtype=np.uint16)
+        regs[:, 0::2] = highs
+        return regs
+
+    def write(self, regs):
+        for unit_id, unit_regs in zip(self.units, regs.tolist()):
+            try:
+                self.context[unit_id].setValues(3, 0, unit_regs)
+            except Exception as ex:
+                print(f"Simulator: failed to set values for unit {unit_id}: {ex}")
+        if self.register_log is not None:
+            self.register_log.commit(self.units, regs)
+
+    def run(self):
+        """Tick forever at sim_state["update_interval"]; a tick that runs late skips the ticks it missed."""
+        start = time.monotonic()
+        t0 = time.time()
+        deadline = start
+        while True:
+            if not self.sim_state["paused"]:
+                now = time.time()
+                self.write(self.frame(now - t0, now))
+            self.ticks += 1
+
+            interval = self.sim_state["update_interval"]
+            deadline += interval
+            lateness = time.monotonic() - deadline
+            if lateness > 0:
+                self.overruns += 1
+                deadline += (int(lateness // interval) + 1) * interval
+            time.sleep(max(0.0, deadline - time.monotonic()))
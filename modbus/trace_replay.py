@@ -0,0 +1,277 @@
+# Trace replay (--replay FILE): recorded samples are played back into the slaves' data blocks
+# instead of the generated sine-plus-jitter values, so tests see the plant's real value
+# patterns, change rates and deadband behaviour.
+#
+# The trace is a Client2 database (the signals/samples tables, or a legacy machine_signals
+# table) or a CSV with machine, signal, value and ts_ms (epoch ms) or timestamp columns.
+# machines_config.json maps every (machine, signal) onto its slave, register table and
+# address; values are encoded with the signal's data_type, scale/offset and word/byte order
+# (the inverse of register_decoder.py), so Server2 reads the recorded values back.
+#
+# Everything is encoded once at load time into flat arrays of register writes sorted by time,
+# plus a time index of frame boundaries (one frame per distinct timestamp). Each playback tick
+# maps the wall clock to trace time (x speed), finds the frames that became due with one
+# searchsorted and applies all their writes together, keeping only the last write per
+# register, so at high speedups many frames collapse into one tick instead of falling behind.
+import csv
+import time
+import sqlite3
+
+import numpy as np
+from pymodbus.datastore import ModbusSequentialDataBlock
+
+from sim_engine import REGS_PER_UNIT
+
+# register_type -> (function code, ModbusSlaveContext store key)
+REGISTER_TABLES = {"holding": (3, "h"), "input": (4, "i"), "coil": (1, "c"), "discrete": (2, "d")}
+BIT_TABLES = ("coil", "discrete")
+# data_type -> (registers used, numpy type of the raw value)
+DATA_TYPES = {
+    "uint16": (1, np.uint16),
+    "int16": (1, np.int16),
+    "uint32": (2, np.uint32),
+    "int32": (2, np.int32),
+    "float32": (2, np.float32),
+    "bool": (1, None),
+}
+LEGACY_SCALE = 0.01  # signals without data_type are uint16 hundredths
+
+
+def load_trace(path):
+    """(machines, signals, values, ts_ms) arrays of every sample in a SQLite database or CSV file."""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        machines = [row["machine"] for row in rows]
+        signals = [row["signal"] for row in rows]
+        values = [float(row["value"]) if row["value"] not in ("", None) else np.nan for row in rows]
+        if rows and "ts_ms" in rows[0]:
+            ts_ms = np.array([int(float(row["ts_ms"])) for row in rows], dtype=np.int64)
+        else:
+            ts_ms = np.array([row["timestamp"] for row in rows], dtype="datetime64[ms]").astype(np.int64)
+    else:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            if {"signals", "samples"} <= tables:
+                rows = conn.execute("SELECT s.machine, s.signal, sa.value, sa.ts_ms "
+                                    "FROM samples sa JOIN signals s ON s.id = sa.signal_id").fetchall()
+                ts_ms = np.array([row[3] for row in rows], dtype=np.int64)
+            else:
+                # local time text; only the spacing between samples matters for playback
+                rows = conn.execute("SELECT machine, signal, value, timestamp FROM machine_signals "
+                                    "WHERE timestamp IS NOT NULL").fetchall()
+                ts_ms = np.array([row[3] for row in rows], dtype="datetime64[ms]").astype(np.int64)
+        finally:
+            conn.close()
+        machines = [row[0] for row in rows]
+        signals = [row[1] for row in rows]
+        values = [np.nan if row[2] is None else row[2] for row in rows]
+    return np.array(machines, dtype=object), np.array(signals, dtype=object), np.array(values, dtype=np.float64), ts_ms
+
+
+def encode_values(signal_info, values):
+    """(words as an (n, width) uint16 array, number of values clipped to the raw type's range)."""
+    register_type = signal_info.get("register_type", "holding")
+    is_bits = register_type in BIT_TABLES
+    data_type = signal_info.get("data_type", "bool" if is_bits else "uint16")
+    width, raw_type = DATA_TYPES[data_type]
+    if is_bits:
+        return (values != 0).astype(np.uint16)[:, None], 0
+
+    default_scale = LEGACY_SCALE if "data_type" not in signal_info else 1.0
+    scaled = (values - float(signal_info.get("offset", 0.0))) * (1.0 / float(signal_info.get("scale", default_scale)))
+    clipped = 0
+    if raw_type is np.float32:
+        raw = scaled.astype(np.float32)
+    else:
+        limits = np.iinfo(raw_type)
+        rounded = np.round(scaled)
+        clipped = int(np.count_nonzero((rounded < limits.min) | (rounded > limits.max)))
+        raw = np.clip(rounded, limits.min, limits.max).astype(raw_type)
+
+    little_bytes = signal_info.get("byte_order", "big") == "little"
+    if width == 1:
+        words = raw.view(np.uint16)
+        return (words.byteswap() if little_bytes else words)[:, None], clipped
+    combined = raw.view(np.uint32)
+    high, low = (combined >> 16).astype(np.uint16), (combined & 0xFFFF).astype(np.uint16)
+    if little_bytes:
+        high, low = high.byteswap(), low.byteswap()
+    if signal_info.get("word_order", "big") == "little":
+        high, low = low, high
+    return np.stack([high, low], axis=1), clipped
+
+
+class TraceReplay:
+    """Plays a loaded trace into the slave contexts on its original schedule, `speed` times faster.
+
+    Runs like SimEngine: one thread on absolute deadlines of sim_state["update_interval"],
+    standing still while sim_state["paused"]. The replayed units' holding registers 0..15
+    are reported to register_log, so the monitor and the change APIs follow the replay.
+    """
+
+    def __init__(self, context, sim_state, machines_config, trace, speed=1.0, loop=False, register_log=None):
+        if speed <= 0:
+            raise ValueError("replay speed must be positive")
+        self.context = context
+        self.sim_state = sim_state
+        self.speed = speed
+        self.loop = loop
+        self.register_log = register_log
+
+        machines, signals, values, ts_ms = trace
+        keys, inverse = np.unique(np.stack([machines, signals]).astype(str), axis=1, return_inverse=True)
+        inverse = inverse.ravel()
+
+        slot_ids = {}  # (unit, register_type) -> slot
+        slot_sizes = []
+        writes = []  # per signal: (ts_ms, slot, address, word) arrays
+        self.unmapped_samples = 0
+        self.clipped_values = 0
+        self.signals = 0
+        for key_index, (machine_name, signal_name) in enumerate(keys.T):
+            members = np.flatnonzero(inverse == key_index)
+            signal_info = machines_config.get(machine_name, {}).get("signals", {}).get(signal_name)
+            if signal_info is None:
+                self.unmapped_samples += len(members)
+                continue
+            register_type = signal_info.get("register_type", "holding")
+            if register_type not in REGISTER_TABLES:
+                raise ValueError(f"{machine_name}/{signal_name}: unknown register_type '{register_type}'")
+            members = members[~np.isnan(values[members])]  # missing values keep the previous register value
+            words, clipped = encode_values(signal_info, values[members])
+            self.clipped_values += clipped
+            self.signals += 1
+
+            slot_key = (int(signal_info["slave_id"]), register_type)
+            if slot_key not in slot_ids:
+                slot_ids[slot_key] = len(slot_sizes)
+                slot_sizes.append(0)
+            slot = slot_ids[slot_key]
+            address = int(signal_info["register"])
+            # holding blocks keep at least the simulator's 16 registers for the monitor and /api/status
+            minimum = REGS_PER_UNIT if register_type == "holding" else 0
+            slot_sizes[slot] = max(slot_sizes[slot], address + words.shape[1], minimum)
+            for word in range(words.shape[1]):
+                writes.append((ts_ms[members], np.full(len(members), slot), np.full(len(members), address + word),
+                               words[:, word]))
+
+        if not writes:
+            raise ValueError("no trace sample maps onto machines_config.json")
+        times = np.concatenate([w[0] for w in writes])
+        order = np.argsort(times, kind="stable")
+        times = times[order]
+        self.write_slots = np.concatenate([w[1] for w in writes])[order]
+        self.write_addresses = np.concatenate([w[2] for w in writes])[order]
+        self.write_words = np.concatenate([w[3] for w in writes])[order]
+
+        # time index: frame i is every write at frame_times[i] (ms after the first sample),
+        # found at frame_starts[i]:frame_starts[i + 1]
+        self.frame_times, self.frame_starts = np.unique(times - times[0], return_index=True)
+        self.frame_starts = np.append(self.frame_starts, len(times))
+        gaps = np.diff(self.frame_times)
+        self.period_ms = float(self.frame_times[-1] + (np.median(gaps) if gaps.size else 1000))  # one loop
+
+        self.slots = [(unit_id, REGISTER_TABLES[register_type][0]) for unit_id, register_type in slot_ids]
+        self.slot_stores = [REGISTER_TABLES[register_type][1] for _, register_type in slot_ids]
+        self.mirrors = [np.zeros(size, dtype=np.uint16) for size in slot_sizes]
+        self.units = sorted({unit_id for unit_id, _ in slot_ids})
+        self.holding_slots = {unit_id: slot for (unit_id, register_type), slot in slot_ids.items()
+                              if register_type == "holding"}
+
+        self.frames_played = 0
+        self.loops = 0
+        self.ticks = 0
+        self.overruns = 0
+        self.max_late_ms = 0.0  # wall-clock delay between a frame's due time and its write
+        self.finished = False
+
+    def describe(self):
+        return (f"Replay: {len(self.write_words)} register writes from {self.signals} signals on units "
+                f"{self.units[0]}..{self.units[-1]} ({len(self.units)} units), {len(self.frame_times)} frames over "
+                f"{self.frame_times[-1] / 1000:.1f}s of trace at {self.speed:g}x"
+                f"{', looped' if self.loop else ''}; {self.unmapped_samples} samples not in machines_config.json, "
+                f"{self.clipped_values} values clipped to their register type")
+
+    def stats(self):
+        return {"frames_played": self.frames_played, "frames": len(self.frame_times), "loops": self.loops,
+                "speed": self.speed, "overruns": self.overruns, "max_late_ms": round(self.max_late_ms, 1),
+                "finished": self.finished}
+
+    def install(self):
+        """Give every replayed (unit, table) a zeroed data block large enough for its registers."""
+        for (unit_id, _), store, mirror in zip(self.slots, self.slot_stores, self.mirrors):
+            # setValues/getValues add 1 to protocol addresses (zero_mode off), hence the extra slot
+            self.context[unit_id].store[store] = ModbusSequentialDataBlock(0, [0] * (len(mirror) + 1))
+
+    def _apply(self, start, end):
+        slots = self.write_slots[start:end]
+        addresses = self.write_addresses[start:end]
+        words = self.write_words[start:end]
+        if end - start > 1:
+            # several frames at once: only the last write of each register matters
+            keys = (slots.astype(np.int64) << 20) | addresses
+            _, last = np.unique(keys[::-1], return_index=True)
+            keep = end - start - 1 - last
+            slots, addresses, words = slots[keep], addresses[keep], words[keep]
+
+        order = np.argsort(slots, kind="stable")
+        slots, addresses, words = slots[order], addresses[order], words[order]
+        bounds = np.flatnonzero(np.diff(slots)) + 1
+        touched = []
+        for slot_addresses, slot_words, slot in zip(np.split(addresses, bounds), np.split(words, bounds),
+                                                    slots[np.r_[0, bounds]].tolist()):
+            mirror = self.mirrors[slot]
+            mirror[slot_addresses] = slot_words
+            low, high = int(slot_addresses.min()), int(slot_addresses.max()) + 1
+            unit_id, function = self.slots[slot]
+            try:
+                self.context[unit_id].setValues(function, low, mirror[low:high].tolist())
+            except Exception as ex:
+                print(f"Replay: failed to set values for unit {unit_id}: {ex}")
+            touched.append(unit_id)
+        if self.register_log is not None:
+            units = sorted({unit_id for unit_id in touched if unit_id in self.holding_slots})
+            if units:
+                regs = np.zeros((len(units), REGS_PER_UNIT), dtype=np.uint16)
+                for row, unit_id in enumerate(units):
+                    mirror = self.mirrors[self.holding_slots[unit_id]][:REGS_PER_UNIT]
+                    regs[row, :len(mirror)] = mirror
+                self.register_log.commit(units, regs)
+
+    def run(self):
+        """Play the trace; returns after the last frame unless looping."""
+        self.install()
+        trace_ms = 0.0
+        position = 0
+        last = deadline = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if not self.sim_state["paused"]:
+                trace_ms += (now - last) * 1000 * self.speed
+            last = now
+
+            due = int(np.searchsorted(self.frame_times, trace_ms, side="right"))
+            if due > position:
+                self.max_late_ms = max(self.max_late_ms, (trace_ms - self.frame_times[position]) / self.speed)
+                self._apply(self.frame_starts[position], self.frame_starts[due])
+                self.frames_played += due - position
+                position = due
+            if position == len(self.frame_times):
+                if not self.loop:
+                    self.finished = True
+                    print(f"Replay finished: {self.stats()}")
+                    return
+                self.loops += 1
+                trace_ms -= self.period_ms
+                position = 0
+            self.ticks += 1
+
+            interval = self.sim_state["update_interval"]
+            deadline += interval
+            lateness = time.monotonic() - deadline
+            if lateness > 0:
+                self.overruns += 1
+                deadline += (int(lateness // interval) + 1) * interval
+            time.sleep(max(0.0, deadline - time.monotonic()))
@@ -0,0 +1,251 @@
+import time
+import asyncio
+import datetime
+import struct
+
+from metrics import REGISTRY
+from circuit_breaker import CircuitBreaker
+
+# pymodbus 2.5.x's asyncio client is built on @asyncio.coroutine (gone in Python 3.11)
+# and serialises requests, so the poller speaks Modbus TCP framing directly.
+# Only the read function codes used by the read planner are implemented.
+WORD_FUNCTIONS = (3, 4)
+# exception codes a gateway returns for a device behind it that is unreachable or silent;
+# any other exception response still proves the slave is alive
+GATEWAY_EXCEPTIONS = (0x0A, 0x0B)
+
+MBAP_HEADER = struct.Struct(">HHHB")  # transaction id, protocol id, length, unit id
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "modbus_request_seconds", "Modbus read round trip (including pipelining wait) per slave", ("endpoint", "slave"))
+REQUEST_ERRORS = REGISTRY.counter(
+    "modbus_request_errors_total", "Failed Modbus reads (exception response, timeout, connection loss) per slave",
+    ("endpoint", "slave"))
+BREAKER_OPENS = REGISTRY.counter(
+    "modbus_breaker_opens_total", "Times a slave's circuit breaker opened", ("endpoint", "slave"))
+READS_SKIPPED = REGISTRY.counter(
+    "modbus_reads_skipped_total", "Block reads skipped because the slave's breaker was open", ("endpoint", "slave"))
+
+
+class ModbusError(Exception):
+    """Raised when a slave answers with a Modbus exception response."""
+
+    def __init__(self, function, code):
+        super().__init__(f"Modbus exception {code} for function {function}")
+        self.function = function
+        self.code = code
+
+
+class CircuitOpenError(Exception):
+    """Passed to on_error for blocks skipped because their slave's breaker is open."""
+
+    def __init__(self, endpoint, slave_id, retry_in):
+        super().__init__(f"slave {slave_id} at {endpoint} unhealthy, next probe in {retry_in:.1f}s")
+        self.endpoint = endpoint
+        self.slave_id = slave_id
+
+
+def parse_endpoint(endpoint, default_port=502):
+    """'host:port' (or plain 'host') -> (host, port)."""
+    host, _, port = endpoint.rpartition(":")
+    if not host:
+        return endpoint, default_port
+    return host, int(port)
+
+
+class ModbusTcpConnection:
+    """One TCP connection to a Modbus gateway with up to max_in_flight pipelined requests.
+
+    A link that silently died (no FIN/RST) looks connected forever, so after
+    max_silent_timeouts request timeouts with no response of any kind in between the
+    connection is dropped and the next read reconnects.
+    """
+
+    def __init__(self, host, port, max_in_flight=4, timeout=3.0, max_silent_timeouts=3):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.max_silent_timeouts = max_silent_timeouts
+        self._silent_timeouts = 0
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._connect_lock = asyncio.Lock()
+        self._reader = None
+        self._writer = None
+        self._reader_task = None
+        self._pending = {}
+        self._next_tid = 0
+
+    @property
+    def connected(self):
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self):
+        async with self._connect_lock:
+            if self.connected:
+                return
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), timeout=self.timeout
+            )
+            self._silent_timeouts = 0
+            self._reader_task = asyncio.create_task(self._read_responses())
+
+    async def close(self):
+        self._drop(ConnectionError("Connection closed"))
+
+    def _drop(self, exc):
+        if self._reader_task:
+            self._reader_task.cancel()
+        if self._writer:
+            self._writer.close()
+        self._fail_pending(exc)
+        self._writer = None
+
+    def note_timeout(self):
+        """Count a request timeout; drops the connection once too many pass without any response."""
+        self._silent_timeouts += 1
+        if self._silent_timeouts >= self.max_silent_timeouts and self.connected:
+            self._drop(ConnectionError(f"No response from {self.host}:{self.port}, reconnecting"))
+
+    def _fail_pending(self, exc):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(exc)
+        self._pending.clear()
+
+    async def _read_responses(self):
+        try:
+            while True:
+                header = await self._reader.readexactly(MBAP_HEADER.size)
+                tid, _, length, _ = MBAP_HEADER.unpack(header)
+                pdu = await self._reader.readexactly(length - 1)
+                self._silent_timeouts = 0
+                future = self._pending.pop(tid, None)
+                if future is not None and not future.done():
+                    future.set_result(pdu)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            writer, self._writer = self._writer, None
+            if writer:
+                writer.close()
+            self._fail_pending(ConnectionError(f"Connection to {self.host}:{self.port} lost: {e}"))
+
+    async def read(self, function, unit, address, count, timeout=None):
+        """Issue one read request; returns a list of ints (registers) or bools (bits).
+
+        timeout bounds the wait for the response (default: the connection's timeout).
+        """
+        async with self._slots:
+            if not self.connected:
+                await self.connect()
+            self._next_tid = (self._next_tid + 1) & 0xFFFF
+            tid = self._next_tid
+            future = asyncio.get_running_loop().create_future()
+            self._pending[tid] = future
+
+            pdu = struct.pack(">BHH", function, address, count)
+            self._writer.write(MBAP_HEADER.pack(tid, 0, len(pdu) + 1, unit) + pdu)
+            try:
+                await self._writer.drain()
+                response = await asyncio.wait_for(future, timeout=timeout or self.timeout)
+            finally:
+                self._pending.pop(tid, None)
+
+        if response[0] & 0x80:
+            raise ModbusError(function, response[1])
+        payload = response[2:2 + response[1]]
+        if function in WORD_FUNCTIONS:
+            return list(struct.unpack(f">{len(payload) // 2}H", payload))
+        return [bool(payload[i // 8] >> (i % 8) & 1) for i in range(count)]
+
+
+class ModbusPoller:
+    """Connection pool (one connection per endpoint) that executes read plans concurrently.
+
+    Every read is bounded by its slave's timeout budget (slave_timeouts, keyed by
+    (endpoint, slave_id), default timeout) and guarded by a per-slave CircuitBreaker.
+    Blocks of an open breaker are reported to on_error as CircuitOpenError without any I/O,
+    and the half-open probe runs in the background rather than inside poll(), so a dead
+    slave never holds up the cycle of the healthy ones.
+    """
+
+    def __init__(self, max_in_flight=4, timeout=3.0, slave_timeouts=None,
+                 failure_threshold=3, base_backoff=1.0, max_backoff=60.0):
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.slave_timeouts = slave_timeouts or {}
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.connections = {}
+        self.breakers = {}
+        self._probes = set()
+
+    def connection(self, endpoint):
+        if endpoint not in self.connections:
+            host, port = parse_endpoint(endpoint)
+            self.connections[endpoint] = ModbusTcpConnection(host, port, self.max_in_flight, self.timeout)
+        return self.connections[endpoint]
+
+    def breaker(self, endpoint, slave_id):
+        key = (endpoint, slave_id)
+        if key not in self.breakers:
+            self.breakers[key] = CircuitBreaker(self.failure_threshold, self.base_backoff, self.max_backoff)
+        return self.breakers[key]
+
+    async def connect_all(self, plan):
+        """Open every connection the plan needs; returns {endpoint: error} for the ones that failed."""
+        endpoints = sorted({block.endpoint for block in plan})
+        results = await asyncio.gather(
+            *(self.connection(endpoint).connect() for endpoint in endpoints), return_exceptions=True
+        )
+        return {endpoint: result for endpoint, result in zip(endpoints, results) if isinstance(result, Exception)}
+
+    async def _read_block(self, block, on_block, on_error):
+        slave = str(block.slave_id)
+        connection = self.connection(block.endpoint)
+        breaker = self.breaker(block.endpoint, block.slave_id)
+        budget = self.slave_timeouts.get((block.endpoint, block.slave_id), self.timeout)
+        started = time.perf_counter()
+        try:
+            values = await asyncio.wait_for(
+                connection.read(block.function, block.slave_id, block.start, block.count, budget), timeout=budget
+            )
+        except (ModbusError, ConnectionError, OSError, asyncio.TimeoutError) as e:
+            REQUEST_ERRORS.inc(block.endpoint, slave)
+            if isinstance(e, asyncio.TimeoutError):
+                connection.note_timeout()
+            if isinstance(e, ModbusError) and e.code not in GATEWAY_EXCEPTIONS:
+                breaker.record_success()  # the slave answered, the request itself is wrong
+            elif breaker.record_failure():
+                BREAKER_OPENS.inc(block.endpoint, slave)
+            on_error(block, e)
+            return
+        breaker.record_success()
+        REQUEST_SECONDS.observe(time.perf_counter() - started, block.endpoint, slave)
+        on_block(block, values, datetime.datetime.now(datetime.timezone.utc))
+
+    async def poll(self, plan, on_block, on_error):
+        """Read every block of the plan concurrently; callbacks run as each response arrives.
+
+        Returns once the reads of healthy slaves are done; probes of unhealthy ones may still
+        be running and report through the same callbacks when they finish.
+        """
+        reads = []
+        for block in plan:
+            breaker = self.breaker(block.endpoint, block.slave_id)
+            if not breaker.allow():
+                READS_SKIPPED.inc(block.endpoint, str(block.slave_id))
+                on_error(block, CircuitOpenError(block.endpoint, block.slave_id,
+                                                 max(0.0, breaker.retry_at - breaker.clock())))
+            elif breaker.probing:
+                probe = asyncio.create_task(self._read_block(block, on_block, on_error))
+                self._probes.add(probe)
+                probe.add_done_callback(self._probes.discard)
+            else:
+                reads.append(self._read_block(block, on_block, on_error))
+        await asyncio.gather(*reads)
+
+    async def close(self):
+        for probe in list(self._probes):
+            probe.cancel()
+        for conn in self.connections.values():
+            await conn.close()
@@ -0,0 +1,241 @@
+# Server2's address space as a generated nodeset with deterministic string NodeIds
+# ("Machine1", "Machine1.Temperature", "Machine1.Temperature.Value", ...), so a restarted
+# server exposes the same ids and clients can keep their node caches.
+#
+# The nodeset generated from machines_config.json is kept as UANodeSet XML in the cache
+# directory, named after a hash of the config, and rewritten only when that hash changes;
+# other tools can import it to get the exact model without browsing. The hash is also
+# published as the NodesetVersion variable under Objects so clients can tell a plain restart
+# (same ids, keep the cache) from a model change (re-browse).
+#
+# Nodes are inserted straight into the address space in one pass. python-opcua's add_nodes
+# builds a dozen DataValues per node and scans the parent's references for duplicates on
+# every insert (quadratic under a large Objects folder); here the attribute values shared by
+# all Value/Unit nodes are built once and only the NodeId and Value attributes are per node.
+# The address space is always filled from the config: generating the specs takes a fraction
+# of the time parsing the cached XML back would (python-opcua's import_xml is slower still).
+import gc
+import os
+import copy
+import hashlib
+import tempfile
+import datetime
+from collections import namedtuple
+from xml.sax.saxutils import escape, quoteattr
+
+from opcua import ua
+from opcua.server.address_space import NodeData, AttributeValue
+
+NODESET_FORMAT = 1  # bump when the generated layout changes, invalidates every cache
+VERSION_NODE = "NodesetVersion"
+
+UANODESET_NS = "http://opcfoundation.org/UA/2011/03/UANodeSet.xsd"
+UATYPES_NS = "http://opcfoundation.org/UA/2008/02/Types.xsd"
+
+# parent None is the standard Objects folder; data_type None marks an object node
+NodeSpec = namedtuple("NodeSpec", "nodeid parent browse_name data_type value access_level")
+
+DATA_TYPES = {
+    "Double": (ua.ObjectIds.Double, ua.VariantType.Double),
+    "String": (ua.ObjectIds.String, ua.VariantType.String),
+}
+READ = ua.AccessLevel.CurrentRead.mask
+READ_WRITE = READ | ua.AccessLevel.CurrentWrite.mask
+HISTORY_READ = ua.AccessLevel.HistoryRead.mask  # also sets the Historizing attribute
+
+
+def config_hash(config_bytes, namespace_uri, history=False):
+    digest = hashlib.sha256(f"{NODESET_FORMAT}\n{namespace_uri}\n{'history' if history else ''}\n".encode())
+    digest.update(config_bytes)
+    return digest.hexdigest()[:16]
+
+
+def signal_nodeid(ns_idx, machine_name, signal_name, leaf="Value"):
+    return ua.NodeId(f"{machine_name}.{signal_name}.{leaf}", ns_idx)
+
+
+def generate_nodeset(machines_config, model_hash, history=False):
+    """NodeSpecs for every machine, signal, Value and Unit node plus the version variable.
+
+    With history, Value nodes advertise HistoryRead and Historizing. Names may not contain
+    ".", the NodeId separator: "A.B" + "C" and "A" + "B.C" would both be "A.B.C.Value".
+    """
+    value_access = READ_WRITE | HISTORY_READ if history else READ_WRITE
+    nodes = [NodeSpec(VERSION_NODE, None, VERSION_NODE, "String", model_hash, READ)]
+    for machine_name, machine_cfg in machines_config.items():
+        if "." in machine_name:
+            raise ValueError(f"Machine name '{machine_name}' contains '.', which separates NodeId parts")
+        nodes.append(NodeSpec(machine_name, None, machine_name, None, None, 0))
+        for signal_name, signal_info in machine_cfg["signals"].items():
+            if "." in signal_name:
+                raise ValueError(f"Signal name '{machine_name}/{signal_name}' contains '.', which separates NodeId parts")
+            signal_id = f"{machine_name}.{signal_name}"
+            nodes.append(NodeSpec(signal_id, machine_name, signal_name, None, None, 0))
+            nodes.append(NodeSpec(f"{signal_id}.Value", signal_id, "Value", "Double", 0.0, value_access))
+            nodes.append(NodeSpec(f"{signal_id}.Unit", signal_id, "Unit", "String", signal_info.get("unit", ""), READ))
+    return nodes
+
+
+def write_nodeset_xml(path, namespace_uri, model_hash, nodes):
+    """Write nodes as a UANodeSet (namespace index 1 = namespace_uri), atomically."""
+    lines = [
+        '<?xml version="1.0" encoding="utf-8"?>',
+        f'<UANodeSet xmlns="{UANODESET_NS}" xmlns:uax="{UATYPES_NS}">',
+        f"  <NamespaceUris><Uri>{escape(namespace_uri)}</Uri></NamespaceUris>",
+        f'  <Models><Model ModelUri={quoteattr(namespace_uri)} Version="{model_hash}" '
+        f'PublicationDate="{datetime.datetime.utcnow().isoformat()}Z"/></Models>',
+    ]
+    for node in nodes:
+        nodeid = quoteattr(f"ns=1;s={node.nodeid}")
+        parent = f"ns=1;s={node.parent}" if node.parent else f"i={ua.ObjectIds.ObjectsFolder}"
+        browse_name = quoteattr(f"1:{node.browse_name}")
+        if node.data_type is None:
+            lines.append(f'  <UAObject NodeId={nodeid} BrowseName={browse_name} ParentNodeId="{parent}">')
+            type_definition = ua.ObjectIds.BaseObjectType
+        else:
+            historizing = ' Historizing="true"' if node.access_level & HISTORY_READ else ""
+            lines.append(f'  <UAVariable NodeId={nodeid} BrowseName={browse_name} ParentNodeId="{parent}" '
+                         f'DataType="{node.data_type}" AccessLevel="{node.access_level}" '
+                         f'UserAccessLevel="{node.access_level}"{historizing}>')
+            type_definition = ua.ObjectIds.BaseDataVariableType
+        lines.append(f"    <DisplayName>{escape(node.browse_name)}</DisplayName>")
+        lines.append(f'    <References><Reference ReferenceType="HasTypeDefinition">i={type_definition}</Reference>'
+                     f'<Reference ReferenceType="HasComponent" IsForward="false">{parent}</Reference></References>')
+        if node.data_type is None:
+            lines.append("  </UAObject>")
+        else:
+            lines.append(f"    <Value><uax:{node.data_type}>{escape(str(node.value))}</uax:{node.data_type}></Value>")
+            lines.append("  </UAVariable>")
+    lines.append("</UANodeSet>")
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, path)
+
+
+class _SharedAttributes:
+    """DataValues that are identical across nodes, built once per distinct value.
+
+    Sharing DataValues is safe: a write replaces the AttributeValue's value, it never
+    mutates the DataValue in place.
+    """
+
+    def __init__(self):
+        self._values = {}
+
+    def get(self, value, variant_type, key=None):
+        key = (value if key is None else key, variant_type)
+        if key not in self._values:
+            self._values[key] = ua.DataValue(ua.Variant(value, variant_type))
+        return self._values[key]
+
+
+def add_nodes_bulk(server, ns_idx, nodes):
+    """Insert NodeSpecs into the server's address space in one pass; parents must precede children."""
+    aspace = server.iserver.aspace
+    shared = _SharedAttributes()
+    now = datetime.datetime.utcnow()
+    gc.disable()  # ~10 long-lived objects per node; collections during the build only cost time
+    try:
+        _insert(aspace, ns_idx, nodes, shared, now)
+    finally:
+        gc.enable()
+
+
+def _insert(aspace, ns_idx, nodes, shared, now):
+    objects_id = ua.NodeId(ua.ObjectIds.ObjectsFolder)
+    object_type = ua.NodeId(ua.ObjectIds.BaseObjectType)
+    variable_type = ua.NodeId(ua.ObjectIds.BaseDataVariableType)
+    has_component = ua.NodeId(ua.ObjectIds.HasComponent)
+    has_type_definition = ua.NodeId(ua.ObjectIds.HasTypeDefinition)
+
+    def reference(reference_type, forward, target, node_class, browse_name, display_name, type_definition=None):
+        ref = ua.ReferenceDescription()
+        ref.ReferenceTypeId = reference_type
+        ref.IsForward = forward
+        ref.NodeId = target
+        ref.NodeClass = node_class
+        ref.BrowseName = browse_name
+        ref.DisplayName = display_name
+        if type_definition is not None:
+            ref.TypeDefinition = type_definition
+        return ref
+
+    type_refs = {
+        ua.NodeClass.Object: reference(has_type_definition, True, object_type, ua.NodeClass.ObjectType,
+                                       ua.QualifiedName("BaseObjectType", 0), ua.LocalizedText("BaseObjectType")),
+        ua.NodeClass.Variable: reference(has_type_definition, True, variable_type, ua.NodeClass.VariableType,
+                                         ua.QualifiedName("BaseDataVariableType", 0),
+                                         ua.LocalizedText("BaseDataVariableType")),
+    }
+    objects = aspace[objects_id]
+    parents = {None: (objects_id, objects, ua.NodeClass.Object,
+                      ua.QualifiedName("Objects", 0), ua.LocalizedText("Objects"))}
+
+    for node in nodes:
+        nodeid = ua.NodeId(node.nodeid, ns_idx)
+        browse_name = ua.QualifiedName(node.browse_name, ns_idx)
+        display_name = ua.LocalizedText(node.browse_name)
+        node_class = ua.NodeClass.Object if node.data_type is None else ua.NodeClass.Variable
+        data = NodeData(nodeid)
+        attrs = data.attributes
+        attrs[ua.AttributeIds.NodeId] = AttributeValue(ua.DataValue(ua.Variant(nodeid, ua.VariantType.NodeId)))
+        attrs[ua.AttributeIds.NodeClass] = AttributeValue(shared.get(node_class, ua.VariantType.Int32))
+        attrs[ua.AttributeIds.BrowseName] = AttributeValue(
+            shared.get(browse_name, ua.VariantType.QualifiedName, node.browse_name))
+        text = shared.get(display_name, ua.VariantType.LocalizedText, node.browse_name)
+        attrs[ua.AttributeIds.DisplayName] = AttributeValue(text)
+        attrs[ua.AttributeIds.Description] = AttributeValue(text)
+        attrs[ua.AttributeIds.WriteMask] = AttributeValue(shared.get(0, ua.VariantType.UInt32))
+        attrs[ua.AttributeIds.UserWriteMask] = AttributeValue(shared.get(0, ua.VariantType.UInt32))
+        if node.data_type is None:
+            attrs[ua.AttributeIds.EventNotifier] = AttributeValue(shared.get(0, ua.VariantType.Byte))
+            type_definition = object_type
+        else:
+            type_id, variant_type = DATA_TYPES[node.data_type]
+            value = ua.DataValue(ua.Variant(node.value, variant_type))
+            value.SourceTimestamp = now
+            attrs[ua.AttributeIds.Value] = AttributeValue(value)
+            attrs[ua.AttributeIds.DataType] = AttributeValue(
+                shared.get(ua.NodeId(type_id), ua.VariantType.NodeId))
+            attrs[ua.AttributeIds.ValueRank] = AttributeValue(shared.get(ua.ValueRank.Scalar, ua.VariantType.Int32))
+            attrs[ua.AttributeIds.ArrayDimensions] = AttributeValue(shared.get([], ua.VariantType.UInt32, ()))
+            attrs[ua.AttributeIds.AccessLevel] = AttributeValue(shared.get(node.access_level, ua.VariantType.Byte))
+            attrs[ua.AttributeIds.UserAccessLevel] = AttributeValue(
+                shared.get(node.access_level, ua.VariantType.Byte))
+            attrs[ua.AttributeIds.Historizing] = AttributeValue(
+                shared.get(bool(node.access_level & HISTORY_READ), ua.VariantType.Boolean))
+            attrs[ua.AttributeIds.MinimumSamplingInterval] = AttributeValue(
+                shared.get(0.0, ua.VariantType.Double))
+            type_definition = variable_type
+
+        parent_id, parent_data, parent_class, parent_name, parent_display = parents[node.parent]
+        data.references.append(reference(has_component, False, parent_id, parent_class, parent_name, parent_display))
+        data.references.append(copy.copy(type_refs[node_class]))
+        parent_data.references.append(reference(has_component, True, nodeid, node_class, browse_name,
+                                                display_name, type_definition))
+        aspace[nodeid] = data
+        if node_class == ua.NodeClass.Object:
+            parents[node.nodeid] = (nodeid, data, node_class, browse_name, display_name)
+
+
+def load_nodeset(server, ns_idx, namespace_uri, machines_config, config_bytes, cache_dir, history=False):
+    """Build the address space; (re)writes the cached nodeset XML if the config hash changed.
+
+    Returns (model hash, whether the cached nodeset was still current).
+    """
+    model_hash = config_hash(config_bytes, namespace_uri, history)
+    path = os.path.join(cache_dir, f"nodeset-{model_hash}.xml")
+    nodes = generate_nodeset(machines_config, model_hash, history)
+    cached = os.path.exists(path)
+    if not cached:
+        write_nodeset_xml(path, namespace_uri, model_hash, nodes)
+        for name in os.listdir(cache_dir):  # nodesets of earlier configs
+            if name.startswith("nodeset-") and name.endswith(".xml") and name != os.path.basename(path):
+                os.remove(os.path.join(cache_dir, name))
+    add_nodes_bulk(server, ns_idx, nodes)
+    return model_hash, cached
@@ -0,0 +1,93 @@
+# Time-range reads over Client2's sample storage.
+#
+# Only the partition files whose time span overlaps the requested range are opened
+# (read-only), so query cost follows the range rather than the total history. The main
+# database's own samples table is always included: it holds every sample in the single-file
+# layout, and in the partitioned layout the rows inserted through the machine_signals view
+# (e.g. the API's backfill).
+#
+#   python partition_query.py machine_data.db --from "2026-01-17 08:00" --to "2026-01-17 09:00" \
+#       [--machine Machine_1] [--signal Voltage] [--partition-dir partitions]
+import os
+import heapq
+import sqlite3
+import argparse
+import datetime
+
+from partitions import list_partitions, partition_bounds
+
+SAMPLE_QUERY = """
+SELECT signal_id, ts_ms, value FROM samples
+WHERE ts_ms >= ? AND ts_ms < ? {signal_filter}
+ORDER BY ts_ms, signal_id
+"""
+
+
+def _open_readonly(path):
+    return sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30.0)
+
+
+def overlapping_partitions(partition_dir, start_ms, end_ms):
+    return [path for key, path in list_partitions(partition_dir)
+            if partition_bounds(key)[0] < end_ms and partition_bounds(key)[1] > start_ms]
+
+
+def query_range(db_file, start_ms, end_ms, machine=None, signal=None, partition_dir="partitions"):
+    """Yield (machine, signal, ts_ms, value, unit) in time order for samples in [start_ms, end_ms)."""
+    main = _open_readonly(db_file)
+    try:
+        where, params = [], []
+        if machine:
+            where.append("machine = ?")
+            params.append(machine)
+        if signal:
+            where.append("signal = ?")
+            params.append(signal)
+        sql = "SELECT id, machine, signal, unit FROM signals" + (" WHERE " + " AND ".join(where) if where else "")
+        signals = {row[0]: row[1:] for row in main.execute(sql, params)}
+    finally:
+        main.close()
+    if not signals:
+        return
+
+    signal_filter = ""
+    if machine or signal:
+        signal_filter = f"AND signal_id IN ({','.join(str(signal_id) for signal_id in signals)})"
+    sql = SAMPLE_QUERY.format(signal_filter=signal_filter)
+
+    # partitions never overlap in time, but the main file's rows can fall anywhere in the range,
+    # so every source is read in time order and the streams are merged
+    paths = [db_file] + overlapping_partitions(partition_dir, start_ms, end_ms)
+    conns = [_open_readonly(path) for path in paths if os.path.exists(path)]
+    try:
+        cursors = [conn.execute(sql, (start_ms, end_ms)) for conn in conns]
+        for signal_id, ts_ms, value in heapq.merge(*cursors, key=lambda row: (row[1], row[0])):
+            if signal_id in signals:
+                machine_name, signal_name, unit = signals[signal_id]
+                yield machine_name, signal_name, ts_ms, value, unit
+    finally:
+        for conn in conns:
+            conn.close()
+
+
+def _epoch_ms(text):
+    return int(datetime.datetime.fromisoformat(text).timestamp() * 1000)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Read samples for a time range from only the partitions that overlap it")
+    p.add_argument("db_file")
+    p.add_argument("--from", dest="start", required=True, help="local time, e.g. '2026-01-17 08:00'")
+    p.add_argument("--to", dest="end", required=True)
+    p.add_argument("--machine")
+    p.add_argument("--signal")
+    p.add_argument("--partition-dir", default=os.getenv("PARTITION_DIR", "partitions"))
+    args = p.parse_args()
+
+    count = 0
+    for machine_name, signal_name, ts_ms, value, unit in query_range(
+            args.db_file, _epoch_ms(args.start), _epoch_ms(args.end), args.machine, args.signal, args.partition_dir):
+        ts = datetime.datetime.fromtimestamp(ts_ms / 1000).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        print(f"{ts} {machine_name}/{signal_name} = {value} {unit}")
+        count += 1
+    print(f"{count} samples")
@@ -0,0 +1,169 @@
+# Time-partitioned sample storage.
+#
+# With STORAGE_LAYOUT=partitioned, Client2 keeps the signals dictionary and rollups in
+# DB_FILE but writes samples into one SQLite file per UTC day (or hour) under PARTITION_DIR,
+# e.g. partitions/samples_20260117.db. Retention drops whole partition files, so deleting
+# old data never runs a large DELETE against the live database.
+# partition_query.py reads a time range back by opening only the overlapping files.
+import os
+import re
+import logging
+import datetime
+
+import signal_store
+
+SPANS = {
+    "day": ("%Y%m%d", 24 * 60 * 60 * 1000),
+    "hour": ("%Y%m%d%H", 60 * 60 * 1000),
+}
+_FILE_PATTERN = re.compile(r"^samples_(\d{8}|\d{10})\.db$")
+
+PARTITION_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {alias}.samples (
+    signal_id INTEGER NOT NULL,
+    ts_ms INTEGER NOT NULL,
+    value REAL,
+    PRIMARY KEY (signal_id, ts_ms)
+) WITHOUT ROWID
+"""
+
+
+def partition_key(ts_ms, span):
+    fmt, _ = SPANS[span]
+    return datetime.datetime.fromtimestamp(ts_ms / 1000, datetime.timezone.utc).strftime(fmt)
+
+
+def partition_bounds(key):
+    """[start_ms, end_ms) of a partition key (span follows from its length)."""
+    span = "day" if len(key) == 8 else "hour"
+    fmt, width_ms = SPANS[span]
+    start = datetime.datetime.strptime(key, fmt).replace(tzinfo=datetime.timezone.utc)
+    start_ms = int(start.timestamp() * 1000)
+    return start_ms, start_ms + width_ms
+
+
+def list_partitions(partition_dir):
+    """Sorted [(key, path)] of the partition files on disk (oldest first)."""
+    if not os.path.isdir(partition_dir):
+        return []
+    found = []
+    for name in os.listdir(partition_dir):
+        match = _FILE_PATTERN.match(name)
+        if match:
+            found.append((match.group(1), os.path.join(partition_dir, name)))
+    # by time, not by name: after a PARTITION_SPAN change daily and hourly keys are mixed
+    return sorted(found, key=lambda item: partition_bounds(item[0]))
+
+
+def attach_view(conn, partition_dir, since_ms=0, max_attached=10):
+    """Shadow machine_signals on this connection with a TEMP view that includes the partitions.
+
+    In the partitioned layout the main database's samples table only holds rows inserted
+    through the view (e.g. the API's backfill), so the persistent view misses everything
+    Client2 wrote. SQLite views cannot reference attached files, hence the TEMP view (and
+    a TEMP insert trigger, still writing to the main database) on a connection that has
+    the newest max_attached partitions ending after since_ms attached (10 is SQLite's
+    default limit). It can be called again to pick up new partition files. Returns the
+    attached partition keys.
+    """
+    keys = [(key, path) for key, path in list_partitions(partition_dir)
+            if partition_bounds(key)[1] > since_ms][-max_attached:]
+    wanted = {f"v_{key}": path for key, path in keys}
+    conn.execute("DROP VIEW IF EXISTS temp.machine_signals")
+    attached = {row[1] for row in conn.execute("PRAGMA database_list")}
+    for alias in sorted(attached):
+        if alias.startswith("v_") and alias not in wanted:  # dropped by retention since the last call
+            conn.execute(f"DETACH DATABASE {alias}")
+    sources = ["SELECT signal_id, ts_ms, value FROM main.samples"]
+    for alias, path in wanted.items():
+        if alias not in attached:
+            conn.execute("ATTACH DATABASE ? AS " + alias, (path,))
+        sources.append(f"SELECT signal_id, ts_ms, value FROM {alias}.samples")
+    conn.execute("CREATE TEMP VIEW machine_signals AS"
+                 + signal_store.VIEW_SELECT.format(samples="(" + " UNION ALL ".join(sources) + ")"))
+    conn.execute(signal_store.VIEW_INSERT_TRIGGER.format(temp="TEMP "))
+    return [key for key, _ in keys]
+
+
+class PartitionedStore:
+    """Routes samples to per-day/hour partition files ATTACHed to the writer's connection.
+
+    Signal ids are still resolved against the main database's signals table, so a batch
+    spanning several partitions is written with the same SQL as the single-file layout.
+    Only the partitions written recently stay attached (SQLite allows 10 by default).
+    """
+
+    MAX_ATTACHED = 4
+
+    def __init__(self, partition_dir, span="day", retention_partitions=0):
+        if span not in SPANS:
+            raise ValueError(f"PARTITION_SPAN must be one of {sorted(SPANS)}")
+        self.partition_dir = partition_dir
+        self.span = span
+        self.retention_partitions = retention_partitions
+        self.attached = {}  # partition key -> alias, in least recently used order
+        os.makedirs(partition_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.partition_dir, f"samples_{key}.db")
+
+    def _attach(self, conn, key):
+        if key in self.attached:
+            self.attached[key] = self.attached.pop(key)  # mark as recently used
+            return self.attached[key]
+        while len(self.attached) >= self.MAX_ATTACHED:
+            oldest = next(iter(self.attached))
+            conn.execute(f"DETACH DATABASE {self.attached.pop(oldest)}")
+        alias = f"p_{key}"
+        conn.execute("ATTACH DATABASE ? AS " + alias, (self._path(key),))
+        conn.execute(f"PRAGMA {alias}.journal_mode=WAL")
+        conn.execute(PARTITION_SCHEMA.format(alias=alias))
+        self.attached[key] = alias
+        return alias
+
+    def insert_samples(self, cursor, rows):
+        """Same contract as signal_store.insert_samples, but samples land in their partition."""
+        by_partition = {}
+        for row in rows:
+            by_partition.setdefault(partition_key(row[4], self.span), []).append(row)
+
+        # ATTACH is not allowed inside a transaction, so attach before the first write
+        if cursor.connection.in_transaction:
+            cursor.connection.commit()
+        aliases = {key: self._attach(cursor.connection, key) for key in by_partition}
+
+        cursor.executemany(
+            "INSERT OR IGNORE INTO signals (machine, signal, unit) VALUES (?, ?, ?)",
+            {(machine, signal, unit) for machine, signal, _, unit, _ in rows},
+        )
+        for key, partition_rows in by_partition.items():
+            cursor.executemany(
+                f"""
+                INSERT OR REPLACE INTO {aliases[key]}.samples (signal_id, ts_ms, value)
+                SELECT id, ?, ? FROM main.signals WHERE machine = ? AND signal = ?
+                """,
+                ((ts_ms, value, machine, signal) for machine, signal, value, _, ts_ms in partition_rows),
+            )
+
+    def enforce_retention(self, conn):
+        """Drop the oldest partition files beyond retention_partitions (0 keeps everything)."""
+        if not self.retention_partitions:
+            return []
+        partitions = list_partitions(self.partition_dir)
+        expired = partitions[:max(0, len(partitions) - self.retention_partitions)]
+        dropped = []
+        for key, path in expired:
+            if key in self.attached:
+                if conn.in_transaction:
+                    conn.commit()
+                conn.execute(f"DETACH DATABASE {self.attached.pop(key)}")
+            try:
+                for suffix in ("", "-wal", "-shm"):
+                    if os.path.exists(path + suffix):
+                        os.remove(path + suffix)
+            except OSError as e:  # e.g. a reader still has it open on Windows; retried next flush
+                logging.warning(f"Could not drop partition {path}: {e}")
+                continue
+            dropped.append(key)
+            logging.info(f"Retention: dropped partition {key}")
+        return dropped
@@ -0,0 +1,153 @@
+# Sharded polling for Server2 (POLL_WORKERS > 0): the config is split by slave or by gateway
+# across worker processes, each running its own scan scheduler, Modbus poller and block
+# publisher (decode, deadband, quality) and pushing the resulting updates into a SampleRing.
+# Server2's process only drains the rings and writes the address space, so Modbus I/O and
+# decoding scale with cores while there is still a single OPC UA server.
+import os
+import asyncio
+import datetime
+import multiprocessing
+
+from read_planner import signal_endpoint, slave_timeouts
+from modbus_async import ModbusPoller
+from scan_scheduler import ScanScheduler
+from block_publisher import BlockPublisher
+from sample_ring import SampleRing
+
+SHARD_BY = ("slave", "endpoint")
+
+
+def shard_config(machines_config, workers, shard_by, default_endpoint):
+    """Split machines_config into `workers` configs; a slave (or a whole gateway) stays in one shard.
+
+    Groups are assigned largest first to the least loaded shard, balancing signal counts.
+    """
+    if shard_by not in SHARD_BY:
+        raise ValueError(f"shard_by must be one of {SHARD_BY}, got '{shard_by}'")
+
+    groups = {}  # shard key -> [(machine_name, signal_name)]
+    for machine_name, machine_cfg in machines_config.items():
+        for signal_name, signal_info in machine_cfg["signals"].items():
+            endpoint = signal_endpoint(machine_cfg, signal_info, default_endpoint)
+            key = (endpoint, signal_info["slave_id"]) if shard_by == "slave" else (endpoint,)
+            groups.setdefault(key, []).append((machine_name, signal_name))
+
+    loads = [0] * workers
+    shards = [{} for _ in range(workers)]
+    for key in sorted(groups, key=lambda k: (-len(groups[k]), str(k))):
+        shard = loads.index(min(loads))
+        loads[shard] += len(groups[key])
+        for machine_name, signal_name in groups[key]:
+            machine_cfg = machines_config[machine_name]
+            entry = shards[shard].setdefault(machine_name, {**machine_cfg, "signals": {}})
+            entry["signals"][signal_name] = machine_cfg["signals"][signal_name]
+    return [shard for shard in shards if shard]
+
+
+async def _poll(shard, machines_config, signal_index, settings, ring, stop):
+    default_endpoint = settings["default_endpoint"]
+    scheduler = ScanScheduler(machines_config, settings["default_rate_ms"], default_endpoint)
+    poller = ModbusPoller(max_in_flight=settings["max_in_flight"], timeout=settings["timeout"],
+                          slave_timeouts=slave_timeouts(machines_config, default_endpoint),
+                          failure_threshold=settings["failure_threshold"], base_backoff=settings["base_backoff"],
+                          max_backoff=settings["max_backoff"])
+    publisher = BlockPublisher(machines_config, signal_index, poller, ring.push)
+
+    failed = await poller.connect_all(scheduler.plan_for(frozenset(scheduler.classes)))
+    for endpoint, error in sorted(failed.items()):
+        print(f"[worker {shard}] Failed to connect to Modbus server at {endpoint}: {error}")
+
+    async def watch():
+        parent = os.getppid()
+        while not stop.is_set() and os.getppid() == parent:  # also stop if Server2 died without telling us
+            await asyncio.sleep(0.5)
+
+    async def print_stats():
+        while True:
+            await asyncio.sleep(settings["stats_interval"])
+            now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            print(f"{now} [worker {shard}] scheduler: {scheduler.cycles} cycles, {scheduler.overruns} overruns, "
+                  f"{scheduler.missed_ticks} missed ticks, max late {scheduler.max_lateness_ms:.1f} ms, "
+                  f"ring {ring.stats()}")
+
+    polling = asyncio.create_task(scheduler.run(
+        lambda plan: poller.poll(plan, publisher.on_block, publisher.on_error)))
+    stats_task = asyncio.create_task(print_stats())
+    try:
+        await asyncio.wait([polling, asyncio.create_task(watch())], return_when=asyncio.FIRST_COMPLETED)
+        if polling.done():
+            polling.result()  # surface the error that ended polling
+    finally:
+        polling.cancel()
+        stats_task.cancel()
+        await poller.close()
+
+
+def worker_main(shard, machines_config, signal_index, settings, ring_name, ring_capacity, lock, stop):
+    ring = SampleRing(ring_capacity, lock, ring_name)
+    try:
+        asyncio.run(_poll(shard, machines_config, signal_index, settings, ring, stop))
+    except KeyboardInterrupt:
+        pass  # Ctrl+C reaches the whole process group; Server2 reports the shutdown
+    finally:
+        ring.close()
+
+
+class PollWorkerPool:
+    """One worker process and SampleRing per shard.
+
+    Workers are forked, so start() must run before Server2 starts any thread (OPC UA server,
+    metrics endpoint): Server2 is a script, and the spawn start method would re-run all of
+    it in every worker.
+    """
+
+    def __init__(self, shards, signal_index, settings, ring_capacity):
+        self.shards = shards
+        self.signal_index = signal_index
+        self.settings = settings
+        self.ring_capacity = ring_capacity
+        self.context = multiprocessing.get_context("fork")
+        self.stop_event = self.context.Event()
+        self.rings = []
+        self.processes = []
+
+    def start(self):
+        for shard, machines_config in enumerate(self.shards):
+            lock = self.context.Lock()
+            ring = SampleRing(self.ring_capacity, lock)
+            shard_index = {key: index for key, index in self.signal_index.items()
+                           if key[0] in machines_config and key[1] in machines_config[key[0]]["signals"]}
+            process = self.context.Process(
+                target=worker_main, name=f"poll-worker-{shard}", daemon=True,
+                args=(shard, machines_config, shard_index, self.settings, ring.name, self.ring_capacity,
+                      lock, self.stop_event))
+            process.start()
+            self.rings.append(ring)
+            self.processes.append(process)
+
+    def drain(self):
+        """Every non-empty batch waiting in the rings."""
+        for ring in self.rings:
+            batch = ring.drain()
+            if len(batch):
+                yield batch
+
+    def dead(self):
+        return [(shard, process.exitcode) for shard, process in enumerate(self.processes)
+                if not process.is_alive()]
+
+    def stats(self):
+        totals = {"pushed": 0, "pending": 0, "dropped": 0}
+        for ring in self.rings:
+            for name, value in ring.stats().items():
+                totals[name] += value
+        return totals
+
+    def stop(self):
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for ring in self.rings:
+            ring.close()
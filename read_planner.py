@@ -0,0 +1,130 @@
+import os
+from collections import defaultdict, namedtuple
+
+from register_decoder import BlockDecoder, register_width
+
+# Modbus register tables: function code used to read them and the max quantity
+# one request may ask for (125 registers / 2000 bits per the Modbus spec PDU limit)
+REGISTER_TABLES = {
+    "holding":  {"function": 3, "max_count": 125,  "bit": False},
+    "input":    {"function": 4, "max_count": 125,  "bit": False},
+    "coil":     {"function": 1, "max_count": 2000, "bit": True},
+    "discrete": {"function": 2, "max_count": 2000, "bit": True},
+}
+DEFAULT_REGISTER_TYPE = "holding"
+
+# Largest hole we are willing to read through instead of paying an extra round trip.
+# One extra request costs ~20 bytes of framing plus a full RTT, so reading a few
+# dozen unused registers (2 bytes each) or a few hundred unused bits is cheaper.
+MAX_GAP_REGISTERS = int(os.getenv("READ_PLAN_MAX_GAP_REGISTERS", 32))
+MAX_GAP_BITS = int(os.getenv("READ_PLAN_MAX_GAP_BITS", 256))
+
+# one contiguous read request; signals is a list of (machine_name, signal_name, register)
+# and decoder turns the block's raw registers into their engineering values in that order
+ReadBlock = namedtuple("ReadBlock", "endpoint slave_id register_type function start count signals decoder")
+
+
+def signal_register_type(signal_info):
+    register_type = signal_info.get("register_type", DEFAULT_REGISTER_TYPE)
+    if register_type not in REGISTER_TABLES:
+        raise ValueError(f"Unknown register_type '{register_type}', expected one of {sorted(REGISTER_TABLES)}")
+    return register_type
+
+
+def signal_endpoint(machine_cfg, signal_info, default_endpoint):
+    """Modbus endpoint ("host:port") a signal is read from; signal overrides machine overrides default."""
+    return signal_info.get("endpoint") or machine_cfg.get("endpoint") or default_endpoint
+
+
+def _make_block(endpoint, slave_id, register_type, start, end, members):
+    table = REGISTER_TABLES[register_type]
+    decoder = BlockDecoder([(signal_info, register - start) for _, _, register, signal_info in members], table["bit"])
+    signals = [(machine_name, signal_name, register) for machine_name, signal_name, register, _ in members]
+    return ReadBlock(endpoint, slave_id, register_type, table["function"], start, end - start + 1, signals, decoder)
+
+
+def _split_into_blocks(endpoint, slave_id, register_type, signals_list, max_gap):
+    """Greedily merge sorted addresses into blocks that respect the gap and PDU limits."""
+    table = REGISTER_TABLES[register_type]
+    max_count = table["max_count"]
+    signals_list = sorted(signals_list, key=lambda s: s[2])
+
+    blocks = []
+    start = end = None
+    members = []
+    for machine_name, signal_name, register, signal_info in signals_list:
+        last = register + register_width(signal_info, table["bit"]) - 1  # multi-register types span a pair
+        if start is not None and register - end - 1 <= max_gap and last - start + 1 <= max_count:
+            end = max(end, last)
+            members.append((machine_name, signal_name, register, signal_info))
+            continue
+        if start is not None:
+            blocks.append(_make_block(endpoint, slave_id, register_type, start, end, members))
+        start, end = register, last
+        members = [(machine_name, signal_name, register, signal_info)]
+
+    if start is not None:
+        blocks.append(_make_block(endpoint, slave_id, register_type, start, end, members))
+    return blocks
+
+
+def compile_read_plan(machines_config, default_endpoint=None,
+                      max_gap_registers=MAX_GAP_REGISTERS, max_gap_bits=MAX_GAP_BITS):
+    """Turn machines_config into the minimal list of ReadBlocks issued each cycle."""
+    grouped = defaultdict(list)
+    for machine_name, machine_cfg in machines_config.items():
+        for signal_name, signal_info in machine_cfg["signals"].items():
+            endpoint = signal_endpoint(machine_cfg, signal_info, default_endpoint)
+            if not endpoint:
+                raise ValueError(f"No Modbus endpoint for {machine_name}/{signal_name} and no default set")
+            key = (endpoint, signal_info["slave_id"], signal_register_type(signal_info))
+            grouped[key].append((machine_name, signal_name, signal_info["register"], signal_info))
+
+    plan = []
+    for (endpoint, slave_id, register_type), signals_list in sorted(grouped.items()):
+        max_gap = max_gap_bits if REGISTER_TABLES[register_type]["bit"] else max_gap_registers
+        plan.extend(_split_into_blocks(endpoint, slave_id, register_type, signals_list, max_gap))
+    return plan
+
+
+def slave_timeouts(machines_config, default_endpoint=None):
+    """{(endpoint, slave_id): seconds} for slaves with a "timeout_ms" on the machine or any of its signals.
+
+    A slave shared by several machines/signals gets the largest budget asked for; slaves
+    without one use the poller's default timeout.
+    """
+    budgets = {}
+    for machine_cfg in machines_config.values():
+        for signal_info in machine_cfg["signals"].values():
+            timeout_ms = signal_info.get("timeout_ms", machine_cfg.get("timeout_ms"))
+            if timeout_ms is None:
+                continue
+            key = (signal_endpoint(machine_cfg, signal_info, default_endpoint), signal_info["slave_id"])
+            budgets[key] = max(budgets.get(key, 0.0), float(timeout_ms) / 1000)
+    return budgets
+
+
+def describe_plan(plan):
+    """Human readable summary of a read plan, one line per request."""
+    endpoints = {block.endpoint for block in plan}
+    slaves = {(block.endpoint, block.slave_id) for block in plan}
+    words = sum(block.count for block in plan if not REGISTER_TABLES[block.register_type]["bit"])
+    lines = [f"Read plan: {len(plan)} requests/cycle across {len(slaves)} slaves "
+             f"on {len(endpoints)} endpoints ({words} registers)"]
+    for block in plan:
+        lines.append(
+            f"  {block.endpoint} slave {block.slave_id:>3} {block.register_type:<8} FC{block.function} "
+            f"start={block.start:<5} count={block.count:<4} signals={len(block.signals)}"
+        )
+    return lines
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    config_file = sys.argv[1] if len(sys.argv) > 1 else "machines_config.json"
+    default_endpoint = f"{os.getenv('MODBUS_IP', '127.0.0.1')}:{os.getenv('MODBUS_PORT', 502)}"
+    with open(config_file, "r") as f:
+        for line in describe_plan(compile_read_plan(json.load(f), default_endpoint)):
+            print(line)
@@ -0,0 +1,256 @@
+# Per-signal min/max/sum/count/last rollups over 1 minute and 1 hour buckets.
+#
+# Client2's DB writer keeps the currently open bucket of every signal in memory and
+# writes it when a sample for a later bucket arrives (or the writer stops), so the
+# rollup tables are maintained at ingest time without re-aggregating raw samples.
+# Rows that bypass Client2 (e.g. the API's backfill inserting through the
+# machine_signals view) are only covered after a rebuild:
+#
+#   python rollups.py machine_data.db rebuild [--since 2026-01-01] [--partition-dir partitions]
+import os
+import sqlite3
+import argparse
+import datetime
+
+import partitions
+import signal_store
+
+RESOLUTIONS = {
+    "rollup_1m": 60 * 1000,
+    "rollup_1h": 60 * 60 * 1000,
+}
+
+SCHEMA = "".join(f"""
+CREATE TABLE IF NOT EXISTS {table} (
+    signal_id INTEGER NOT NULL,
+    bucket_ms INTEGER NOT NULL,
+    min_value REAL,
+    max_value REAL,
+    sum_value REAL,
+    count INTEGER,
+    last_value REAL,
+    last_ts_ms INTEGER,
+    PRIMARY KEY (signal_id, bucket_ms)
+) WITHOUT ROWID;
+""" for table in RESOLUTIONS)
+
+# a bucket's complete state; the accumulator has already folded in what was stored for it
+UPSERT = """
+INSERT OR REPLACE INTO {table} (signal_id, bucket_ms, min_value, max_value, sum_value, count, last_value, last_ts_ms)
+SELECT id, ?, ?, ?, ?, ?, ?, ? FROM signals WHERE machine = ? AND signal = ?
+"""
+
+LOAD = """
+SELECT r.bucket_ms, r.min_value, r.max_value, r.sum_value, r.count, r.last_value, r.last_ts_ms
+FROM {table} r JOIN signals s ON s.id = r.signal_id
+WHERE s.machine = ? AND s.signal = ? AND r.bucket_ms {condition}
+ORDER BY r.bucket_ms DESC LIMIT 1
+"""
+
+
+def create_schema(conn):
+    conn.executescript(SCHEMA)
+    conn.commit()
+
+
+class RollupAccumulator:
+    """Open rollup buckets per (machine, signal) and resolution, written when they close.
+
+    A bucket that may already be stored (written before a restart, or re-sent by a spool
+    replay) is loaded first and the samples are folded into it, so every write is the
+    bucket's complete state. Per signal, a sample at or before the last one counted in
+    its bucket is taken as already counted: re-reading an unchanged value after a restart
+    or replaying committed rows never counts a sample twice (out-of-order samples need a
+    rebuild).
+    """
+
+    def __init__(self):
+        # table -> (machine, signal) -> [bucket_ms, min, max, sum, count, last, last_ts_ms]
+        self.open = {table: {} for table in RESOLUTIONS}
+        # table -> (machine, signal) -> newest bucket_ms stored when the signal was first seen (None: none)
+        self.stored_until = {table: {} for table in RESOLUTIONS}
+        self._undo = {table: {} for table in RESOLUTIONS}  # state before the last add, per touched key
+
+    def add(self, rows, cursor=None):
+        """Fold (machine, signal, value, unit, ts_ms) rows in; returns {table: [upsert params]} for closed buckets.
+
+        cursor reads the stored buckets; without one nothing is assumed to be stored yet.
+        """
+        try:
+            return self._add(rows, cursor)
+        except Exception:
+            self.rollback()
+            raise
+
+    def _add(self, rows, cursor):
+        closed = {}
+        self._undo = {table: {} for table in RESOLUTIONS}
+        for table, width in RESOLUTIONS.items():
+            buckets = self.open[table]
+            stored_until = self.stored_until[table]
+            undo = self._undo[table]
+            out = closed[table] = {}  # (key, bucket_ms) -> state
+            for machine, signal, value, _, ts_ms in rows:
+                bucket_ms = ts_ms - ts_ms % width
+                key = (machine, signal)
+                state = buckets.get(key)
+                if key not in undo:
+                    undo[key] = None if state is None else list(state)
+                if key not in stored_until:
+                    latest = self._load(cursor, table, key, ">= ?", 0) if cursor else None
+                    stored_until[key] = None if latest is None else latest[0]
+                if state is not None and state[0] == bucket_ms:
+                    self._fold(state, value, ts_ms)
+                elif state is None or bucket_ms > state[0]:
+                    if state is not None:
+                        out[(key, state[0])] = state
+                    stored = stored_until[key]
+                    state = None
+                    if stored is not None and bucket_ms <= stored:
+                        state = self._load(cursor, table, key, "= ?", bucket_ms)
+                    if state is None:
+                        state = [bucket_ms, value, value, value, 1, value, ts_ms]
+                    else:
+                        self._fold(state, value, ts_ms)
+                    buckets[key] = state
+                else:
+                    # late sample for an already closed bucket: merged into what is stored for it
+                    late = out.get((key, bucket_ms))
+                    if late is None and cursor:
+                        late = self._load(cursor, table, key, "= ?", bucket_ms)
+                    if late is None:
+                        late = [bucket_ms, value, value, value, 1, value, ts_ms]
+                    else:
+                        self._fold(late, value, ts_ms)
+                    out[(key, bucket_ms)] = late
+        return {table: [self._params(key, state) for (key, _), state in out.items()]
+                for table, out in closed.items()}
+
+    @staticmethod
+    def _load(cursor, table, key, condition, bucket_ms):
+        row = cursor.execute(LOAD.format(table=table, condition=condition), (key[0], key[1], bucket_ms)).fetchone()
+        return None if row is None else list(row)
+
+    @staticmethod
+    def _fold(state, value, ts_ms):
+        if ts_ms <= state[6]:
+            return  # counted already (re-read or replayed sample)
+        if value < state[1]:
+            state[1] = value
+        if value > state[2]:
+            state[2] = value
+        state[3] += value
+        state[4] += 1
+        state[5], state[6] = value, ts_ms
+
+    def rollback(self):
+        """Undo the last add (its batch was not committed and will be added again later)."""
+        for table, undo in self._undo.items():
+            buckets = self.open[table]
+            for key, state in undo.items():
+                if state is None:
+                    buckets.pop(key, None)
+                else:
+                    buckets[key] = state
+        self._undo = {table: {} for table in RESOLUTIONS}
+
+    def drain(self):
+        """Upsert params for every open bucket (used when the writer stops)."""
+        closed = {table: [self._params(key, state) for key, state in buckets.items()]
+                  for table, buckets in self.open.items()}
+        self.open = {table: {} for table in RESOLUTIONS}
+        self.stored_until = {table: {} for table in RESOLUTIONS}
+        return closed
+
+    @staticmethod
+    def _params(key, state):
+        bucket_ms, min_value, max_value, sum_value, count, last_value, last_ts_ms = state
+        return (bucket_ms, min_value, max_value, sum_value, count, last_value, last_ts_ms, key[0], key[1])
+
+
+def write_closed(cursor, closed):
+    for table, params in closed.items():
+        if params:
+            cursor.executemany(UPSERT.format(table=table), params)
+
+
+# 1 minute buckets of one sample source; last_value comes from the same source
+MINUTE_BUCKETS = """
+SELECT g.signal_id, g.bucket_ms, g.min_value, g.max_value, g.sum_value, g.count,
+       (SELECT value FROM samples s WHERE s.signal_id = g.signal_id AND s.ts_ms = g.last_ts_ms),
+       g.last_ts_ms
+FROM (
+    SELECT signal_id, ts_ms - ts_ms % 60000 AS bucket_ms, MIN(value) AS min_value, MAX(value) AS max_value,
+           SUM(value) AS sum_value, COUNT(*) AS count, MAX(ts_ms) AS last_ts_ms
+    FROM samples WHERE ts_ms >= ?
+    GROUP BY signal_id, bucket_ms
+) g
+"""
+
+# sources never share a sample, so buckets they both contribute to are summed
+MERGE_MINUTE = """
+INSERT INTO rollup_1m (signal_id, bucket_ms, min_value, max_value, sum_value, count, last_value, last_ts_ms)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (signal_id, bucket_ms) DO UPDATE SET
+    min_value = min(min_value, excluded.min_value),
+    max_value = max(max_value, excluded.max_value),
+    sum_value = sum_value + excluded.sum_value,
+    count = count + excluded.count,
+    last_value = CASE WHEN excluded.last_ts_ms >= last_ts_ms THEN excluded.last_value ELSE last_value END,
+    last_ts_ms = max(last_ts_ms, excluded.last_ts_ms)
+"""
+
+
+def rebuild(conn, since_ms=0, partition_dir=None):
+    """Recompute both rollup tables from raw samples (from since_ms onwards, aligned to the hour).
+
+    Samples are read from the main database and, with partition_dir, from every partition
+    file that reaches past since_ms (each opened read-only), all in one transaction.
+    """
+    since_ms -= since_ms % RESOLUTIONS["rollup_1h"]
+    sources = []
+    if partition_dir:
+        sources = [path for key, path in partitions.list_partitions(partition_dir)
+                   if partitions.partition_bounds(key)[1] > since_ms]
+    with conn:
+        for table in RESOLUTIONS:
+            conn.execute(f"DELETE FROM {table} WHERE bucket_ms >= ?", (since_ms,))
+        conn.executemany(MERGE_MINUTE, conn.execute(MINUTE_BUCKETS, (since_ms,)).fetchall())
+        for path in sources:
+            source = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30.0)
+            try:
+                conn.executemany(MERGE_MINUTE, source.execute(MINUTE_BUCKETS, (since_ms,)))
+            finally:
+                source.close()
+        conn.execute("""
+            INSERT INTO rollup_1h (signal_id, bucket_ms, min_value, max_value, sum_value, count, last_value, last_ts_ms)
+            SELECT g.signal_id, g.bucket_ms, g.min_value, g.max_value, g.sum_value, g.count,
+                   (SELECT last_value FROM rollup_1m m WHERE m.signal_id = g.signal_id AND m.bucket_ms = g.last_bucket_ms),
+                   g.last_ts_ms
+            FROM (
+                SELECT signal_id, bucket_ms - bucket_ms % 3600000 AS bucket_ms, MIN(min_value) AS min_value,
+                       MAX(max_value) AS max_value, SUM(sum_value) AS sum_value, SUM(count) AS count,
+                       MAX(bucket_ms) AS last_bucket_ms, MAX(last_ts_ms) AS last_ts_ms
+                FROM rollup_1m WHERE bucket_ms >= ?
+                GROUP BY signal_id, bucket_ms - bucket_ms % 3600000
+            ) g
+        """, (since_ms,))
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in RESOLUTIONS}
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Maintain signal rollup tables")
+    p.add_argument("db_file")
+    p.add_argument("command", choices=["rebuild"])
+    p.add_argument("--since", help="only rebuild buckets from this local date/time (YYYY-MM-DD[ HH:MM])")
+    p.add_argument("--partition-dir", default=os.getenv("PARTITION_DIR", "partitions"),
+                   help="also read the partition files of STORAGE_LAYOUT=partitioned")
+    args = p.parse_args()
+
+    conn = signal_store.connect(args.db_file)
+    signal_store.create_schema(conn)
+    create_schema(conn)
+    since_ms = int(datetime.datetime.fromisoformat(args.since).timestamp() * 1000) if args.since else 0
+    counts = rebuild(conn, since_ms, args.partition_dir)
+    print(", ".join(f"{table}: {count} buckets" for table, count in counts.items()))
+    conn.close()
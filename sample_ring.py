@@ -0,0 +1,88 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# one published value: signal index, GOOD/UNCERTAIN/BAD, value and POSIX source timestamp
+RECORD = np.dtype([("index", "<u4"), ("status", "<u4"), ("value", "<f8"), ("time", "<f8")])
+_HEADER_BYTES = 64  # write position, read position, dropped records (uint64), padded to a cache line
+
+
+class SampleRing:
+    """Single-producer / single-consumer ring of samples in shared memory.
+
+    A poll worker pushes one block's samples as a few vectorised slice writes and the parent
+    drains everything written since its last drain as one structured array; nothing is
+    pickled, both processes map the same buffer. Positions only grow (slot = position %
+    capacity) and are published under `lock`, whose acquire/release orders the record writes
+    before the position update on any CPU. A push that does not fit is dropped and counted
+    rather than blocking the worker.
+
+    Pass name=None to create the ring, or the creator's name to attach to it.
+    """
+
+    def __init__(self, capacity, lock, name=None):
+        self.capacity = capacity
+        self.lock = lock
+        self.owner = name is None
+        size = _HEADER_BYTES + capacity * RECORD.itemsize
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self._header = np.ndarray(3, dtype=np.uint64, buffer=self.shm.buf)
+        self._records = np.ndarray(capacity, dtype=RECORD, buffer=self.shm.buf, offset=_HEADER_BYTES)
+        if self.owner:
+            self._header[:] = 0
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def _positions(self):
+        with self.lock:
+            return int(self._header[0]), int(self._header[1])
+
+    def _spans(self, position, count):
+        """Slots of count records from position on: up to the end of the buffer, then from its start."""
+        start = position % self.capacity
+        first = min(count, self.capacity - start)
+        return slice(start, start + first), slice(0, count - first)
+
+    def push(self, indices, values, status, source_time):
+        """Append samples sharing one status and timestamp; False (and counted) if the ring is full."""
+        count = len(indices)
+        write_pos, read_pos = self._positions()
+        if count > self.capacity - (write_pos - read_pos):
+            with self.lock:
+                self._header[2] += count
+            return False
+        head, tail = self._spans(write_pos, count)
+        split = head.stop - head.start
+        indices, values = np.asarray(indices), np.asarray(values)
+        for slots, part in ((head, slice(0, split)), (tail, slice(split, count))):
+            records = self._records[slots]
+            records["index"] = indices[part]
+            records["status"] = status
+            records["value"] = values[part]
+            records["time"] = source_time
+        with self.lock:
+            self._header[0] = write_pos + count
+        return True
+
+    def drain(self):
+        """Copy of every record pushed since the previous drain (possibly empty)."""
+        write_pos, read_pos = self._positions()
+        head, tail = self._spans(read_pos, write_pos - read_pos)
+        batch = np.concatenate((self._records[head], self._records[tail]))
+        with self.lock:
+            self._header[1] = write_pos
+        return batch
+
+    def stats(self):
+        write_pos, read_pos = self._positions()
+        with self.lock:
+            dropped = int(self._header[2])
+        return {"pushed": write_pos, "pending": write_pos - read_pos, "dropped": dropped}
+
+    def close(self):
+        self._header = self._records = None  # views must go before the mapping can be closed
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
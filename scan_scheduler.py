@@ -0,0 +1,100 @@
+import asyncio
+import math
+from functools import reduce
+
+from read_planner import compile_read_plan
+
+MIN_TICK_MS = 10  # co-prime rates (333 ms and 1000 ms) would otherwise tick every millisecond
+
+
+def signal_scan_rate_ms(signal_info, default_rate_ms):
+    rate_ms = int(signal_info.get("scan_rate_ms", default_rate_ms))
+    if rate_ms <= 0:
+        raise ValueError(f"scan_rate_ms must be positive, got {rate_ms}")
+    return rate_ms
+
+
+class ScanScheduler:
+    """Polls each scan class (signals sharing a scan_rate_ms) at its own rate on a monotonic clock.
+
+    The scheduler ticks at the gcd of all scan rates, but no faster than MIN_TICK_MS; a class
+    is due on the first tick at or after each of its deadlines (n * rate_ms), so with a
+    floored tick it is polled up to one tick late but never skipped. On every tick the
+    signals of all classes that are due are compiled into one read plan, so signals sharing
+    a slave and a tick are read together. Plans are cached per combination of due classes.
+    Deadlines are absolute (start + n * tick) so the period never drifts; a cycle that runs
+    past the next deadline is counted as an overrun and the missed ticks are folded into the
+    next one instead of being replayed back to back.
+    """
+
+    def __init__(self, machines_config, default_rate_ms, default_endpoint=None):
+        self.machines_config = machines_config
+        self.default_endpoint = default_endpoint
+
+        self.classes = {}  # rate_ms -> {machine_name: [signal_name, ...]}
+        for machine_name, machine_cfg in machines_config.items():
+            for signal_name, signal_info in machine_cfg["signals"].items():
+                rate_ms = signal_scan_rate_ms(signal_info, default_rate_ms)
+                self.classes.setdefault(rate_ms, {}).setdefault(machine_name, []).append(signal_name)
+
+        self.tick_ms = max(reduce(math.gcd, self.classes) if self.classes else int(default_rate_ms), MIN_TICK_MS)
+        self._plans = {}
+
+        self.cycles = 0
+        self.overruns = 0
+        self.missed_ticks = 0
+        self.max_lateness_ms = 0.0
+
+    def due_rates(self, previous_tick, tick):
+        """Scan classes with a deadline in (previous_tick, tick]."""
+        due = []
+        for rate_ms in self.classes:
+            if tick * self.tick_ms // rate_ms > previous_tick * self.tick_ms // rate_ms:
+                due.append(rate_ms)
+        return frozenset(due)
+
+    def plan_for(self, rates):
+        if rates not in self._plans:
+            config = {}
+            for rate_ms in rates:
+                for machine_name, signal_names in self.classes[rate_ms].items():
+                    machine_cfg = self.machines_config[machine_name]
+                    entry = config.setdefault(machine_name, {**machine_cfg, "signals": {}})
+                    for signal_name in signal_names:
+                        entry["signals"][signal_name] = machine_cfg["signals"][signal_name]
+            self._plans[rates] = compile_read_plan(config, self.default_endpoint)
+        return self._plans[rates]
+
+    def describe(self):
+        lines = [f"Scan classes (tick {self.tick_ms} ms):"]
+        for rate_ms in sorted(self.classes):
+            count = sum(len(signals) for signals in self.classes[rate_ms].values())
+            lines.append(f"  every {rate_ms:>6} ms: {count} signals, {len(self.plan_for(frozenset([rate_ms])))} requests")
+        return lines
+
+    async def run(self, poll):
+        """Run forever, awaiting poll(plan) once per tick that has something due."""
+        loop = asyncio.get_running_loop()
+        tick_sec = self.tick_ms / 1000
+        start = loop.time()
+        previous_tick, tick = -1, 0
+
+        while True:
+            rates = self.due_rates(previous_tick, tick)
+            if rates:
+                await poll(self.plan_for(rates))
+                self.cycles += 1
+            previous_tick = tick
+
+            tick += 1
+            now = loop.time()
+            lateness = now - (start + tick * tick_sec)
+            if lateness > 0:
+                missed = int(lateness // tick_sec) + 1
+                self.overruns += 1
+                self.missed_ticks += missed - 1
+                self.max_lateness_ms = max(self.max_lateness_ms, lateness * 1000)
+                print(f"Scan overrun: cycle ran {lateness * 1000:.1f} ms past its deadline, "
+                      f"folding {missed - 1} missed ticks into the next one")
+                tick += missed - 1
+            await asyncio.sleep(max(0.0, start + tick * tick_sec - loop.time()))
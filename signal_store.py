@@ -0,0 +1,98 @@
+import sqlite3
+
+# Compact time-series layout:
+#   signals  - dictionary of (machine, signal, unit) -> small integer id
+#   samples  - (signal_id, ts_ms) clustered primary key, REAL value, no rowid
+#   machine_signals - view with the old table's columns (and an INSTEAD OF INSERT trigger)
+#                     so the API and the backfill service keep working unchanged
+# ts_ms is UTC epoch milliseconds; the view renders it as local time like the old rows, and
+# also exposes ts_ms itself: range filters on the rendered timestamp cannot use the index.
+# With STORAGE_LAYOUT=partitioned the samples are in other files; partitions.attach_view()
+# gives a connection a machine_signals that includes them.
+
+# machine_signals' columns over a samples source (the samples table, or a UNION of partitions)
+VIEW_SELECT = """
+    SELECT (sa.signal_id << 42) | sa.ts_ms AS id,
+           s.machine AS machine,
+           s.signal AS signal,
+           sa.value AS value,
+           s.unit AS unit,
+           strftime('%Y-%m-%d %H:%M:%S', sa.ts_ms / 1000, 'unixepoch', 'localtime') AS timestamp,
+           sa.ts_ms AS ts_ms
+    FROM {samples} sa
+    JOIN signals s ON s.id = sa.signal_id"""
+
+# inserts through the view always land in the main database's samples table
+VIEW_INSERT_TRIGGER = """
+CREATE {temp}TRIGGER IF NOT EXISTS machine_signals_insert
+INSTEAD OF INSERT ON machine_signals
+BEGIN
+    INSERT OR IGNORE INTO signals (machine, signal, unit) VALUES (NEW.machine, NEW.signal, NEW.unit);
+    INSERT OR REPLACE INTO samples (signal_id, ts_ms, value)
+        SELECT id, CAST(round((julianday(NEW.timestamp, 'utc') - 2440587.5) * 86400000) AS INTEGER), NEW.value
+        FROM signals WHERE machine = NEW.machine AND signal = NEW.signal;
+END;
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signals (
+    id INTEGER PRIMARY KEY,
+    machine TEXT NOT NULL,
+    signal TEXT NOT NULL,
+    unit TEXT,
+    UNIQUE (machine, signal)
+);
+
+CREATE TABLE IF NOT EXISTS samples (
+    signal_id INTEGER NOT NULL,
+    ts_ms INTEGER NOT NULL,
+    value REAL,
+    PRIMARY KEY (signal_id, ts_ms)
+) WITHOUT ROWID;
+
+CREATE VIEW IF NOT EXISTS machine_signals AS""" + VIEW_SELECT.format(samples="samples") + """;
+""" + VIEW_INSERT_TRIGGER.format(temp="")
+
+
+def has_legacy_table(conn):
+    """True if machine_signals is still the old row-per-sample table rather than the view."""
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = 'machine_signals'").fetchone()
+    return row is not None and row[0] == "table"
+
+
+def create_schema(conn):
+    if has_legacy_table(conn):
+        raise RuntimeError("machine_signals is still the legacy table; run 'python migrate_db.py <db file>' first")
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(machine_signals)")]
+    if columns and "ts_ms" not in columns:
+        # view from before ts_ms was exposed; dropping it drops its trigger too
+        conn.execute("DROP VIEW machine_signals")
+    conn.executescript(SCHEMA)
+    conn.commit()
+
+
+def insert_samples(cursor, rows):
+    """Insert (machine, signal, value, unit, ts_ms) rows; the caller commits.
+
+    Signal ids are resolved inside SQLite via the (machine, signal) unique index, so a
+    batch costs one dictionary upsert per distinct signal plus one insert per sample.
+    A second sample for the same signal and millisecond replaces the first.
+    """
+    cursor.executemany(
+        "INSERT OR IGNORE INTO signals (machine, signal, unit) VALUES (?, ?, ?)",
+        {(machine, signal, unit) for machine, signal, _, unit, _ in rows},
+    )
+    cursor.executemany(
+        """
+        INSERT OR REPLACE INTO samples (signal_id, ts_ms, value)
+        SELECT id, ?, ? FROM signals WHERE machine = ? AND signal = ?
+        """,
+        ((ts_ms, value, machine, signal) for machine, signal, value, _, ts_ms in rows),
+    )
+
+
+def connect(db_file):
+    conn = sqlite3.connect(db_file, timeout=30.0)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA busy_timeout=30000")  # 30 seconds in milliseconds
+    return conn
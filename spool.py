@@ -0,0 +1,186 @@
+import os
+import re
+import json
+import mmap
+import zlib
+import struct
+import logging
+import threading
+
+# record: payload length, crc32(payload), payload (JSON list of rows); a zero length ends a segment
+RECORD_HEADER = struct.Struct("<II")
+_SEGMENT_PATTERN = re.compile(r"^segment_(\d{8})\.spool$")
+_ACK_FILE = "spool.ack"
+
+
+class Spool:
+    """Append-only, memory-mapped local spool of collected batches (store and forward).
+
+    The collector appends every batch before handing it to the DB writer; the writer acks a
+    position once everything before it is committed. Whatever is not acked - because SQLite
+    failed, the queue was full or the process died - is replayed from disk later.
+
+    Segments are preallocated files of segment_bytes mapped into memory, so an append is a
+    memcpy into the page cache (flushed to disk on segment roll, or per append with fsync=True).
+    On open, the last segment is scanned and its write position recovered from the last
+    record with a valid CRC. At most max_bytes are kept: when full, the oldest segment is
+    dropped even if it was never replayed, and its records are counted as dropped.
+
+    Positions are (segment number, offset) tuples and compare in append order.
+    """
+
+    def __init__(self, spool_dir, segment_bytes=16 * 1024 * 1024, max_bytes=1024 * 1024 * 1024, fsync=False):
+        self.spool_dir = spool_dir
+        self.segment_bytes = segment_bytes
+        self.max_segments = max(2, max_bytes // segment_bytes)
+        self.fsync = fsync
+        self.records_dropped = 0
+        self._lock = threading.Lock()
+        os.makedirs(spool_dir, exist_ok=True)
+
+        self.segments = sorted(
+            int(m.group(1)) for m in map(_SEGMENT_PATTERN.match, os.listdir(spool_dir)) if m
+        )
+        self.acked = self._load_ack()
+        if not self.segments:
+            self.segments = [self.acked[0] + 1]
+        self._open_for_append(self.segments[-1])
+        if self.acked < (self.segments[0], 0):
+            self.acked = (self.segments[0], 0)
+
+    # ---------- paths / ack ----------
+    def _path(self, segment):
+        return os.path.join(self.spool_dir, f"segment_{segment:08d}.spool")
+
+    def _load_ack(self):
+        try:
+            with open(os.path.join(self.spool_dir, _ACK_FILE)) as f:
+                segment, offset = f.read().split()
+                return int(segment), int(offset)
+        except (OSError, ValueError):
+            return (0, 0)
+
+    def _store_ack(self):
+        path = os.path.join(self.spool_dir, _ACK_FILE)
+        with open(path + ".tmp", "w") as f:
+            f.write(f"{self.acked[0]} {self.acked[1]}")
+        os.replace(path + ".tmp", path)
+
+    # ---------- append side ----------
+    def _open_for_append(self, segment):
+        path = self._path(segment)
+        exists = os.path.exists(path)
+        self._file = open(path, "r+b" if exists else "w+b")
+        if not exists:
+            self._file.truncate(self.segment_bytes)
+        self._map = mmap.mmap(self._file.fileno(), self.segment_bytes)
+        self._segment = segment
+        # crash recovery: the write position is right after the last intact record
+        self._offset = 0
+        for _, next_offset in self._scan(self._map, 0):
+            self._offset = next_offset
+
+    @staticmethod
+    def _scan(buffer, offset):
+        """Yield (payload, next offset) for intact records starting at offset."""
+        size = len(buffer)
+        while offset + RECORD_HEADER.size <= size:
+            length, crc = RECORD_HEADER.unpack_from(buffer, offset)
+            start = offset + RECORD_HEADER.size
+            if length == 0 or start + length > size:
+                return
+            payload = bytes(buffer[start:start + length])
+            if zlib.crc32(payload) != crc:
+                return
+            offset = start + length
+            yield payload, offset
+
+    def _roll(self):
+        self._map.flush()
+        self._map.close()
+        self._file.close()
+        next_segment = self._segment + 1
+        self.segments.append(next_segment)
+        while len(self.segments) > self.max_segments:
+            self._drop_oldest()
+        self._open_for_append(next_segment)
+
+    def _drop_oldest(self):
+        oldest = self.segments.pop(0)
+        if self.acked < (oldest + 1, 0):
+            with open(self._path(oldest), "rb") as f:
+                data = f.read()
+            start = self.acked[1] if self.acked[0] == oldest else 0
+            lost = sum(1 for _ in self._scan(data, start))
+            self.records_dropped += lost
+            logging.warning(f"Spool full: dropped segment {oldest} with {lost} unreplayed batches")
+            self.acked = (self.segments[0], 0)
+            self._store_ack()
+        os.remove(self._path(oldest))
+
+    def append(self, rows):
+        """Durably append one batch; returns (start, end) positions of the record."""
+        payload = json.dumps(rows, separators=(",", ":")).encode("utf-8")
+        record = RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+        if len(record) + RECORD_HEADER.size > self.segment_bytes:
+            raise ValueError(f"Batch of {len(record)} bytes does not fit a {self.segment_bytes} byte spool segment")
+        with self._lock:
+            if self._offset + len(record) + RECORD_HEADER.size > self.segment_bytes:
+                self._roll()
+            start = (self._segment, self._offset)
+            self._map[self._offset:self._offset + len(record)] = record
+            self._offset += len(record)
+            if self.fsync:
+                self._map.flush()
+            return start, (self._segment, self._offset)
+
+    # ---------- replay side ----------
+    def end(self):
+        with self._lock:
+            return (self._segment, self._offset)
+
+    def backlog(self):
+        """True if there are appended batches that were never acked."""
+        return self.acked < self.end()
+
+    def read_unacked(self, max_rows):
+        """Read batches from the ack position on, up to about max_rows rows; returns (rows, end position)."""
+        rows = []
+        position = self.acked
+        with self._lock:
+            segments = [s for s in self.segments if s >= position[0]]
+            current = self._segment
+            # snapshot of the live segment past the ack point, taken before an append can roll it
+            base = position[1] if current == position[0] else 0
+            live = self._map[base:self._offset]
+        for segment in segments:
+            offset = position[1] if segment == position[0] else 0
+            if segment == current:
+                buffer, skip = live, base
+            else:
+                with open(self._path(segment), "rb") as f:
+                    buffer, skip = f.read(), 0
+            for payload, next_offset in self._scan(buffer, offset - skip):
+                rows.extend(tuple(row) for row in json.loads(payload))
+                position = (segment, next_offset + skip)
+                if len(rows) >= max_rows:
+                    return rows, position
+            if segment != current:
+                position = (segment + 1, 0)  # rest of a closed segment is padding (or a torn record)
+        return rows, position
+
+    def ack(self, position):
+        """Everything before position is committed; closed segments before it are deleted."""
+        with self._lock:
+            if position <= self.acked:
+                return
+            self.acked = position
+            self._store_ack()
+            while self.segments[0] < position[0]:
+                os.remove(self._path(self.segments.pop(0)))
+
+    def close(self):
+        with self._lock:
+            self._map.flush()
+            self._map.close()
+            self._file.close()
@@ -0,0 +1,101 @@
+import math
+import os
+
+import numpy as np
+import pytest
+
+from chunk_store import ChunkFile, ChunkStore, _decimal_digits, decode_chunk, encode_chunk, write_chunk_file
+
+T0 = 1768608000000  # 2026-01-17 00:00 UTC
+
+
+def round_trip(ts_ms, values):
+    header, payload = encode_chunk(ts_ms, values)
+    decoded_ts, decoded = decode_chunk(header, payload)
+    assert decoded_ts.tolist() == list(ts_ms)
+    # bitwise, so -0.0 and NaN count as well
+    assert decoded.view(np.uint64).tolist() == np.asarray(values, dtype=np.float64).view(np.uint64).tolist()
+    return header
+
+
+def timestamps(count, step=1000):
+    return [T0 + i * step for i in range(count)]
+
+
+def test_decimal_values_use_the_integer_path():
+    values = [20.5, 20.25, 21.0, -3.75, 1e6]
+    header = round_trip(timestamps(5), values)
+    assert header["value_digits"] == 2
+    assert (header["min"], header["max"], header["sum"]) == (-3.75, 1e6, sum(values))
+
+
+def test_negative_zero_survives_the_decimal_path():
+    assert _decimal_digits(np.array([-0.0, 1.0])) is None
+    header = round_trip(timestamps(3), [1.0, -0.0, 2.0])
+    assert header["value_digits"] == -1
+    assert _decimal_digits(np.array([0.0, 1.0])) == 0
+
+
+@pytest.mark.parametrize("values, width", [
+    ([0.1, 0.2, 1 / 3], 8),
+    ([0.1 + 2 ** -30, 1 / 3, math.pi], 8),
+    ([np.float32(0.1), np.float32(1 / 3)], 4),
+    ([1.5, float("nan"), float("inf")], 4),
+])
+def test_float_values_use_the_xor_path(values, width):
+    header = round_trip(timestamps(len(values)), values)
+    assert (header["value_digits"], header["value_width"]) == (-1, width)
+
+
+def test_nan_is_left_out_of_the_header_statistics():
+    header = round_trip(timestamps(3), [0.5, float("nan"), 0.123456789])
+    assert (header["min"], header["max"]) == (0.123456789, 0.5)
+    assert header["sum"] == pytest.approx(0.623456789)
+
+
+def test_irregular_timestamps_and_a_single_sample():
+    round_trip([T0, T0 + 1, T0 + 100000, T0 + 100500, T0 + 2 ** 40], [1.0, 2.0, 3.0, 4.0, 5.0])
+    header = round_trip([T0], [42.0])
+    assert header["ts_width"] == 1
+
+
+def test_regular_timestamps_pack_into_one_byte():
+    header = round_trip(timestamps(1000, step=100), np.arange(1000) / 10)
+    assert header["ts_width"] == 1
+
+
+def test_file_select_and_aggregate(tmp_path):
+    chunk_dir = str(tmp_path)
+    ts = np.array(timestamps(3600, step=1000))
+    write_chunk_file(os.path.join(chunk_dir, "chunks_2026011700.tsc"), {
+        1: (ts, np.arange(3600, dtype=np.float64)),
+        2: (ts[::60], np.full(60, 0.1)),
+    })
+
+    chunk_file = ChunkFile(os.path.join(chunk_dir, "chunks_2026011700.tsc"))
+    assert chunk_file.index["signal_id"].tolist() == [1, 2]
+    assert chunk_file.select(T0 + 3600000, T0 + 7200000).size == 0
+    record, = chunk_file.select(T0, T0 + 1000, signal_ids=[2])
+    assert chunk_file.decode(record)[1].tolist() == [0.1] * 60
+    chunk_file.close()
+
+    store = ChunkStore(chunk_dir)
+    whole = store.aggregate(T0, T0 + 3600000)
+    assert whole[1] == [3600, 0.0, 3599.0, float(sum(range(3600)))]
+    assert whole[2][0] == 60
+    assert (store.chunks_reused, store.chunks_decoded) == (2, 0)
+
+    part = store.aggregate(T0 + 10000, T0 + 20000, signal_ids=[1])
+    assert part == {1: [10, 10.0, 19.0, float(sum(range(10, 20)))]}
+    assert store.chunks_decoded == 1
+
+    (signal_id, ts_ms, values), = store.scan(T0 + 10000, T0 + 12000, signal_ids=[1])
+    assert (signal_id, ts_ms.tolist(), values.tolist()) == (1, [T0 + 10000, T0 + 11000], [10.0, 11.0])
+
+
+def test_not_a_chunk_file(tmp_path):
+    path = str(tmp_path / "chunks_2026011700.tsc")
+    with open(path, "wb") as f:
+        f.write(b"\0" * 64)
+    with pytest.raises(ValueError):
+        ChunkFile(path)
@@ -0,0 +1,54 @@
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, clock=Clock())
+    assert not breaker.record_failure()
+    breaker.record_success()
+    assert [breaker.record_failure() for _ in range(3)] == [False, False, True]
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_probe_after_backoff_closes_on_success():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, base_backoff=2.0, clock=clock)
+    breaker.record_failure()
+    clock.now = 1.9
+    assert not breaker.allow()
+    clock.now = 2.0
+    assert breaker.allow() and breaker.probing
+    assert not breaker.allow()  # a single probe
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_failed_probes_double_the_backoff_up_to_the_cap():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, base_backoff=1.0, max_backoff=5.0, clock=clock)
+    backoffs = []
+    breaker.record_failure()
+    for _ in range(5):
+        backoffs.append(breaker.backoff)
+        clock.now = breaker.retry_at
+        assert breaker.allow() and breaker.state == HALF_OPEN
+        assert breaker.record_failure()
+    assert backoffs == [1.0, 2.0, 4.0, 5.0, 5.0]
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.backoff == 1.0
+
+
+def test_concurrent_failures_open_once():
+    breaker = CircuitBreaker(failure_threshold=1, clock=Clock())
+    assert breaker.record_failure()
+    assert not breaker.record_failure()
+    assert breaker.opens == 1
@@ -0,0 +1,56 @@
+import datetime
+
+import pytest
+
+ua = pytest.importorskip("opcua.ua")
+
+from opcua.server.history import HistoryManager  # noqa: E402
+
+from history_rings import HistoryRings  # noqa: E402
+
+NODE = ua.NodeId("M.temp.Value", 2)
+STATUS_CODES = [ua.StatusCode(ua.StatusCodes.Good)]
+T0 = 1768608000.0  # 2026-01-17 00:00 UTC
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+@pytest.fixture
+def manager():
+    rings = HistoryRings([NODE], 16, STATUS_CODES)
+    # three values share each timestamp, as when a worker ring is drained in one batch
+    for step in range(4):
+        rings.record([0, 0, 0], [step * 10.0, step * 10.0 + 1, step * 10.0 + 2], 0, T0 + step)
+    manager = HistoryManager(None)
+    rings.attach(manager)
+    return manager
+
+
+def read_pages(manager, start, end, per_page):
+    """Values of a raw read paged with per_page values, following the continuation points."""
+    details = ua.ReadRawModifiedDetails()
+    details.StartTime, details.EndTime, details.NumValuesPerNode = start, end, per_page
+    values, cont = [], None
+    while True:
+        rv = ua.HistoryReadValueId()
+        rv.NodeId, rv.ContinuationPoint = NODE, cont
+        params = ua.HistoryReadParameters()
+        params.HistoryReadDetails, params.NodesToRead = details, [rv]
+        result, = manager.read_history(params)
+        values += [datavalue.Value.Value for datavalue in result.HistoryData.DataValues]
+        cont = result.ContinuationPoint
+        if not cont:
+            return values
+
+
+@pytest.mark.parametrize("per_page", [1, 2, 4, 5, 100])
+def test_pages_ending_among_equal_timestamps_continue_exactly(manager, per_page):
+    start = EPOCH + datetime.timedelta(seconds=T0)
+    end = start + datetime.timedelta(seconds=10)
+    expected = [step * 10.0 + offset for step in range(4) for offset in range(3)]
+    assert read_pages(manager, start, end, per_page) == expected
+    assert read_pages(manager, end, start, per_page) == expected[::-1]
+
+
+def test_end_time_only_returns_the_newest(manager):
+    end = EPOCH + datetime.timedelta(seconds=T0 + 10)
+    assert read_pages(manager, None, end, 4) == [32.0, 31.0, 30.0, 22.0]
@@ -0,0 +1,53 @@
+import pstats
+import threading
+import time
+
+from metrics import ThreadProfiler
+
+
+def busy_main():
+    return sum(range(10000))
+
+
+def busy_worker():
+    return sum(range(10000))
+
+
+def profiled_functions(path):
+    return {function for _, _, function in pstats.Stats(path).stats}
+
+
+def test_profiles_of_all_threads_are_merged(tmp_path):
+    profiler = ThreadProfiler()
+    stop = threading.Event()
+
+    def worker():
+        while not stop.is_set():
+            profiler.check()
+            busy_worker()
+            time.sleep(0.01)
+
+    profiler.start()
+    thread = threading.Thread(target=profiler.wrap(worker))
+    thread.start()
+    busy_main()
+    time.sleep(0.05)
+    path = str(tmp_path / "out.prof")
+    profiler.stop(path)
+    stop.set()
+    thread.join()
+    assert {"busy_main", "busy_worker"} <= profiled_functions(path)
+
+
+def test_stop_on_another_thread_waits_for_the_running_profiles(tmp_path):
+    profiler = ThreadProfiler()
+    profiler.start()
+    busy_main()
+    path = str(tmp_path / "out.prof")
+    dump = threading.Thread(target=profiler.stop, args=(path,))
+    dump.start()
+    while dump.is_alive():  # what a loop calling check() once per iteration does
+        profiler.check()
+        time.sleep(0.01)
+    assert "busy_main" in profiled_functions(path)
+    assert not profiler.active
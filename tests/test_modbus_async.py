@@ -0,0 +1,49 @@
+import asyncio
+import struct
+
+from modbus_async import MBAP_HEADER, ModbusPoller
+from read_planner import compile_read_plan
+
+
+async def start_slave(delay):
+    """Modbus TCP server answering register reads with their addresses, after delay seconds."""
+    async def handle(reader, writer):
+        try:
+            while True:
+                tid, _, length, unit = MBAP_HEADER.unpack(await reader.readexactly(MBAP_HEADER.size))
+                function, address, count = struct.unpack(">BHH", await reader.readexactly(length - 1))
+                await asyncio.sleep(delay)
+                pdu = struct.pack(f">BB{count}H", function, 2 * count, *range(address, address + count))
+                writer.write(MBAP_HEADER.pack(tid, 0, len(pdu) + 1, unit) + pdu)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+def poll_once(delay, budget=None):
+    """(values read, errors) of one poll of registers 0-1 of slave 1 on a slave answering after delay."""
+    async def run():
+        server = await start_slave(delay)
+        endpoint = "127.0.0.1:%d" % server.sockets[0].getsockname()[1]
+        config = {"M": {"signals": {"a": {"register": 0, "slave_id": 1}, "b": {"register": 1, "slave_id": 1}}}}
+        poller = ModbusPoller(timeout=0.1, slave_timeouts={(endpoint, 1): budget} if budget else None)
+        read, errors = [], []
+        try:
+            await poller.poll(compile_read_plan(config, endpoint),
+                              lambda block, values, _: read.append(values),
+                              lambda block, error: errors.append(error))
+        finally:
+            await poller.close()
+            server.close()
+        return read, errors
+    return asyncio.run(run())
+
+
+def test_slow_slave_times_out_at_the_default():
+    read, errors = poll_once(0.3)
+    assert read == [] and isinstance(errors[0], asyncio.TimeoutError)
+
+
+def test_slave_budget_covers_the_response_wait():
+    assert poll_once(0.3, 1.0) == ([[0, 1]], [])
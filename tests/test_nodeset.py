@@ -0,0 +1,20 @@
+import pytest
+
+pytest.importorskip("opcua")
+
+from nodeset import generate_nodeset  # noqa: E402
+
+
+def test_nodes_per_signal():
+    nodes = generate_nodeset({"M": {"signals": {"temp": {"unit": "C"}}}}, "hash")
+    assert [node.nodeid for node in nodes][1:] == ["M", "M.temp", "M.temp.Value", "M.temp.Unit"]
+    assert nodes[-1].value == "C"
+
+
+@pytest.mark.parametrize("config", [
+    {"A.B": {"signals": {"C": {}}}},
+    {"A": {"signals": {"B.C": {}}}},
+])
+def test_dotted_names_are_rejected(config):
+    with pytest.raises(ValueError, match="separates NodeId parts"):
+        generate_nodeset(config, "hash")
@@ -0,0 +1,26 @@
+import signal_store
+from partition_query import query_range
+from partitions import PartitionedStore
+
+T0 = 1768608000000  # 2026-01-17 00:00 UTC
+HOUR = 3600 * 1000
+
+
+def test_main_file_and_partitions_merge_in_time_order(tmp_path):
+    db_file = str(tmp_path / "machine_data.db")
+    conn = signal_store.connect(db_file)
+    signal_store.create_schema(conn)
+    store = PartitionedStore(str(tmp_path / "partitions"), span="hour")
+    cursor = conn.cursor()
+    store.insert_samples(cursor, [("M", "a", float(hour), "V", T0 + hour * HOUR) for hour in range(3)])
+    # a backfilled row lands in the main file, older than the partitioned ones
+    signal_store.insert_samples(cursor, [("M", "a", -1.0, "V", T0 - HOUR), ("M", "b", 1.5, "V", T0 + HOUR + 1)])
+    conn.commit()
+    conn.close()
+
+    rows = list(query_range(db_file, T0 - HOUR, T0 + 3 * HOUR, partition_dir=store.partition_dir))
+    assert [(signal, ts_ms, value) for _, signal, ts_ms, value, _ in rows] == [
+        ("a", T0 - HOUR, -1.0), ("a", T0, 0.0), ("a", T0 + HOUR, 1.0),
+        ("b", T0 + HOUR + 1, 1.5), ("a", T0 + 2 * HOUR, 2.0),
+    ]
+    assert [row[2] for row in query_range(db_file, T0, T0 + HOUR, signal="a", partition_dir=store.partition_dir)] == [T0]
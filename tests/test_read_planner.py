@@ -0,0 +1,75 @@
+import pytest
+
+from read_planner import compile_read_plan, slave_timeouts
+
+ENDPOINT = "127.0.0.1:502"
+
+
+def machine(*signals, **machine_cfg):
+    """Machine config with signals given as (name, register, extra signal settings)."""
+    return {**machine_cfg, "signals": {name: {"register": register, "slave_id": 1, **extra}
+                                       for name, register, extra in signals}}
+
+
+def plan(config, **limits):
+    return compile_read_plan(config, ENDPOINT, **limits)
+
+
+def test_adjacent_registers_share_one_request():
+    blocks = plan({"M": machine(("a", 0, {}), ("b", 1, {}), ("c", 2, {}))})
+    assert [(block.start, block.count) for block in blocks] == [(0, 3)]
+    assert [name for _, name, _ in blocks[0].signals] == ["a", "b", "c"]
+
+
+def test_gap_up_to_the_limit_is_read_through():
+    blocks = plan({"M": machine(("a", 0, {}), ("b", 33, {}))}, max_gap_registers=32)
+    assert [(block.start, block.count) for block in blocks] == [(0, 34)]
+
+
+def test_gap_past_the_limit_splits():
+    blocks = plan({"M": machine(("a", 0, {}), ("b", 34, {}))}, max_gap_registers=32)
+    assert [(block.start, block.count) for block in blocks] == [(0, 1), (34, 1)]
+
+
+def test_requests_are_capped_at_the_pdu_limit():
+    signals = [(f"s{register}", register, {}) for register in range(0, 300, 2)]
+    blocks = plan({"M": machine(*signals)})
+    assert all(block.count <= 125 for block in blocks)
+    assert sum(len(block.signals) for block in blocks) == len(signals)
+    assert [block.start for block in blocks] == [0, 126, 252]
+
+
+def test_a_two_register_value_is_never_split_across_requests():
+    blocks = plan({"M": machine(("a", 0, {}), ("b", 123, {"data_type": "float32"}))})
+    assert [(block.start, block.count) for block in blocks] == [(0, 1), (123, 2)]
+
+
+def test_tables_slaves_and_endpoints_are_read_separately():
+    config = {
+        "M1": machine(("h", 0, {}), ("c", 1, {"register_type": "coil"}), ("i", 2, {"register_type": "input"})),
+        "M2": machine(("other", 0, {"slave_id": 2}), ("remote", 1, {"endpoint": "10.0.0.2:502"})),
+    }
+    keys = sorted((block.endpoint, block.slave_id, block.register_type, block.function) for block in plan(config))
+    assert keys == [("10.0.0.2:502", 1, "holding", 3), (ENDPOINT, 1, "coil", 1), (ENDPOINT, 1, "holding", 3),
+                    (ENDPOINT, 1, "input", 4), (ENDPOINT, 2, "holding", 3)]
+
+
+def test_bit_tables_use_the_bit_gap_limit():
+    config = {"M": machine(("a", 0, {"register_type": "coil"}), ("b", 200, {"register_type": "coil"}))}
+    blocks = plan(config, max_gap_registers=32, max_gap_bits=256)
+    assert [(block.start, block.count) for block in blocks] == [(0, 201)]
+
+
+def test_unknown_register_type_is_rejected():
+    with pytest.raises(ValueError):
+        plan({"M": machine(("a", 0, {"register_type": "memory"}))})
+
+
+def test_missing_endpoint_is_rejected():
+    with pytest.raises(ValueError):
+        compile_read_plan({"M": machine(("a", 0, {}))})
+
+
+def test_slave_timeouts_take_the_largest_budget():
+    config = {"M": machine(("a", 0, {"timeout_ms": 500}), ("b", 1, {"timeout_ms": 2000}), timeout_ms=100)}
+    assert slave_timeouts(config, ENDPOINT) == {(ENDPOINT, 1): 2.0}
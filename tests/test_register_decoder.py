@@ -0,0 +1,68 @@
+import struct
+
+import numpy as np
+import pytest
+
+from register_decoder import BlockDecoder
+
+
+def words(fmt, value):
+    """Big-endian registers of value packed with struct format fmt."""
+    data = struct.pack(">" + fmt, value)
+    return list(struct.unpack(f">{len(data) // 2}H", data))
+
+
+def test_legacy_signals_are_hundredths():
+    assert BlockDecoder([({}, 0)]).decode([22050]).tolist() == [220.5]
+
+
+def test_scale_and_offset():
+    decoder = BlockDecoder([({"data_type": "int16", "scale": 0.1, "offset": -40}, 0)])
+    assert decoder.decode(words("h", -123)).tolist() == pytest.approx([-52.3])
+
+
+@pytest.mark.parametrize("data_type, fmt, value", [
+    ("uint16", "H", 65535), ("int16", "h", -2), ("uint32", "I", 4000000000),
+    ("int32", "i", -100000), ("float32", "f", 1.5),
+])
+def test_data_types_big_endian(data_type, fmt, value):
+    decoder = BlockDecoder([({"data_type": data_type}, 0)])
+    assert decoder.decode(words(fmt, value)).tolist() == [value]
+
+
+def test_little_word_order_swaps_the_registers():
+    high, low = words("i", -100000)
+    decoder = BlockDecoder([({"data_type": "int32", "word_order": "little"}, 0)])
+    assert decoder.decode([low, high]).tolist() == [-100000]
+
+
+def test_little_byte_order_swaps_within_each_register():
+    swapped = [((word & 0xFF) << 8) | (word >> 8) for word in words("f", 1.5)]
+    decoder = BlockDecoder([({"data_type": "float32", "byte_order": "little"}, 0)])
+    assert decoder.decode(swapped).tolist() == [1.5]
+
+
+def test_signals_decode_at_their_offsets_in_input_order():
+    decoder = BlockDecoder([
+        ({"data_type": "float32"}, 3),
+        ({"data_type": "uint16", "scale": 2}, 0),
+        ({}, 1),
+    ])
+    registers = [7, 1234, 0] + words("f", -0.25)
+    assert decoder.decode(registers).tolist() == [-0.25, 14.0, 12.34]
+
+
+def test_bits():
+    decoder = BlockDecoder([({}, 2), ({}, 0)], is_bits=True)
+    assert decoder.decode([True, False, False]).tolist() == [0.0, 1.0]
+
+
+def test_mismatched_table_and_type_is_rejected():
+    with pytest.raises(ValueError):
+        BlockDecoder([({"data_type": "bool"}, 0)])
+    with pytest.raises(ValueError):
+        BlockDecoder([({"data_type": "float32"}, 0)], is_bits=True)
+
+
+def test_decoded_values_are_float64():
+    assert BlockDecoder([({"data_type": "uint16"}, 0)]).decode(np.array([1], dtype=np.uint16)).dtype == np.float64
@@ -0,0 +1,111 @@
+import pytest
+
+import rollups
+import signal_store
+from partitions import PartitionedStore
+
+T0 = 1768608000000  # 2026-01-17 00:00 UTC
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = signal_store.connect(str(tmp_path / "machine_data.db"))
+    signal_store.create_schema(conn)
+    rollups.create_schema(conn)
+    yield conn
+    conn.close()
+
+
+def sample(ts_ms, value, signal="temp"):
+    return ("M", signal, value, "C", ts_ms)
+
+
+def ingest(conn, accumulator, rows, store=signal_store):
+    """What Client2's DB writer does per batch."""
+    cursor = conn.cursor()
+    store.insert_samples(cursor, rows)
+    rollups.write_closed(cursor, accumulator.add(rows, cursor))
+    conn.commit()
+
+
+def stop(conn, accumulator):
+    rollups.write_closed(conn.cursor(), accumulator.drain())
+    conn.commit()
+
+
+def buckets(conn, table="rollup_1m"):
+    return conn.execute(f"SELECT bucket_ms, min_value, max_value, sum_value, count, last_value, last_ts_ms "
+                        f"FROM {table} ORDER BY signal_id, bucket_ms").fetchall()
+
+
+def test_buckets_close_when_a_later_sample_arrives(conn):
+    accumulator = rollups.RollupAccumulator()
+    ingest(conn, accumulator, [sample(T0, 1.0), sample(T0 + 30000, 3.0)])
+    assert buckets(conn) == []
+    ingest(conn, accumulator, [sample(T0 + 60000, 5.0)])
+    assert buckets(conn) == [(T0, 1.0, 3.0, 4.0, 2, 3.0, T0 + 30000)]
+    stop(conn, accumulator)
+    assert buckets(conn)[-1] == (T0 + 60000, 5.0, 5.0, 5.0, 1, 5.0, T0 + 60000)
+    assert buckets(conn, "rollup_1h") == [(T0, 1.0, 5.0, 9.0, 3, 5.0, T0 + 60000)]
+
+
+def test_restart_does_not_count_a_sample_twice(conn):
+    accumulator = rollups.RollupAccumulator()
+    ingest(conn, accumulator, [sample(T0, 1.0), sample(T0 + 1000, 2.0)])
+    stop(conn, accumulator)
+
+    # the restarted collector reads the unchanged value again, then a new one
+    accumulator = rollups.RollupAccumulator()
+    ingest(conn, accumulator, [sample(T0 + 1000, 2.0), sample(T0 + 2000, 4.0)])
+    stop(conn, accumulator)
+
+    assert buckets(conn) == [(T0, 1.0, 4.0, 7.0, 3, 4.0, T0 + 2000)]
+    assert buckets(conn, "rollup_1h") == [(T0, 1.0, 4.0, 7.0, 3, 4.0, T0 + 2000)]
+
+
+def test_replayed_batch_is_idempotent(conn):
+    accumulator = rollups.RollupAccumulator()
+    batch = [sample(T0, 1.0), sample(T0 + 1000, 2.0)]
+    ingest(conn, accumulator, batch)
+    ingest(conn, accumulator, batch)  # spool replay of a committed batch
+    stop(conn, accumulator)
+    ingest(conn, rollups.RollupAccumulator(), batch)  # and again after a restart
+    assert buckets(conn) == [(T0, 1.0, 2.0, 3.0, 2, 2.0, T0 + 1000)]
+
+
+def test_failed_batch_is_rolled_back(conn):
+    accumulator = rollups.RollupAccumulator()
+    ingest(conn, accumulator, [sample(T0, 1.0)])
+    accumulator.add([sample(T0 + 1000, 2.0)], conn.cursor())
+    accumulator.rollback()  # the writer's commit failed; the batch comes back from the spool
+    conn.rollback()
+    ingest(conn, accumulator, [sample(T0 + 1000, 2.0)])
+    stop(conn, accumulator)
+    assert buckets(conn) == [(T0, 1.0, 2.0, 3.0, 2, 2.0, T0 + 1000)]
+
+
+def test_rebuild_matches_the_live_rollups(conn):
+    accumulator = rollups.RollupAccumulator()
+    rows = [sample(T0 + i * 7000, float(i % 5), signal) for i in range(40) for signal in ("temp", "speed")]
+    for start in range(0, len(rows), 16):
+        ingest(conn, accumulator, rows[start:start + 16])
+    stop(conn, accumulator)
+    live = {table: buckets(conn, table) for table in rollups.RESOLUTIONS}
+
+    rollups.rebuild(conn)
+    assert {table: buckets(conn, table) for table in rollups.RESOLUTIONS} == live
+
+
+def test_rebuild_reads_the_partitions(conn, tmp_path):
+    store = PartitionedStore(str(tmp_path / "partitions"), span="hour")
+    accumulator = rollups.RollupAccumulator()
+    # spans two hourly partitions and leaves one sample in the main database
+    rows = [sample(T0 + 3000000 + i * 60000, float(i)) for i in range(20)]
+    ingest(conn, accumulator, rows, store)
+    ingest(conn, accumulator, [sample(T0 + 3000000 + 20 * 60000, 20.0)])
+    stop(conn, accumulator)
+    live = {table: buckets(conn, table) for table in rollups.RESOLUTIONS}
+    assert [row[4] for row in live["rollup_1h"]] == [10, 11]
+
+    rollups.rebuild(conn, partition_dir=store.partition_dir)
+    assert {table: buckets(conn, table) for table in rollups.RESOLUTIONS} == live
@@ -0,0 +1,47 @@
+import threading
+
+import numpy as np
+import pytest
+
+from sample_ring import SampleRing
+
+
+@pytest.fixture
+def ring():
+    ring = SampleRing(8, threading.Lock())
+    yield ring
+    ring.close()
+
+
+def test_push_and_drain(ring):
+    assert ring.push([0, 1, 2], np.array([1.0, 2.0, 3.0]), 0, 100.0)
+    assert ring.push([3], [4.0], 2, 101.0)
+    batch = ring.drain()
+    assert batch["index"].tolist() == [0, 1, 2, 3]
+    assert batch["value"].tolist() == [1.0, 2.0, 3.0, 4.0]
+    assert batch["status"].tolist() == [0, 0, 0, 2]
+    assert batch["time"].tolist() == [100.0, 100.0, 100.0, 101.0]
+    assert ring.drain().size == 0
+
+
+def test_wraps_around(ring):
+    for start in range(0, 30, 5):
+        assert ring.push(list(range(start, start + 5)), np.arange(start, start + 5, dtype=np.float64), 0, 0.0)
+        assert ring.drain()["index"].tolist() == list(range(start, start + 5))
+    assert ring.stats() == {"pushed": 30, "pending": 0, "dropped": 0}
+
+
+def test_full_ring_drops_and_counts(ring):
+    assert ring.push(list(range(6)), np.zeros(6), 0, 0.0)
+    assert not ring.push(list(range(3)), np.zeros(3), 0, 0.0)
+    assert ring.stats() == {"pushed": 6, "pending": 6, "dropped": 3}
+    assert len(ring.drain()) == 6
+
+
+def test_attach_by_name(ring):
+    other = SampleRing(8, ring.lock, name=ring.name)
+    try:
+        other.push([7], [7.5], 1, 5.0)
+        assert ring.drain()["value"].tolist() == [7.5]
+    finally:
+        other.close()
@@ -0,0 +1,44 @@
+import pytest
+
+from scan_scheduler import MIN_TICK_MS, ScanScheduler
+
+
+def config(*rates):
+    return {"M": {"signals": {f"s{i}": {"register": i, "slave_id": 1, "scan_rate_ms": rate}
+                              for i, rate in enumerate(rates)}}}
+
+
+def fired(scheduler, duration_ms):
+    """{rate_ms: times due} over duration_ms of ticks, starting at tick 0."""
+    counts = dict.fromkeys(scheduler.classes, 0)
+    previous_tick = -1
+    for tick in range(duration_ms // scheduler.tick_ms):
+        for rate_ms in scheduler.due_rates(previous_tick, tick):
+            counts[rate_ms] += 1
+        previous_tick = tick
+    return counts
+
+
+def test_tick_is_the_gcd_of_the_rates():
+    scheduler = ScanScheduler(config(100, 250), 1000, "127.0.0.1:502")
+    assert scheduler.tick_ms == 50
+    assert fired(scheduler, 1000) == {100: 10, 250: 4}
+
+
+def test_co_prime_rates_are_floored_and_never_skipped():
+    scheduler = ScanScheduler(config(333, 1000), 1000, "127.0.0.1:502")
+    assert scheduler.tick_ms == MIN_TICK_MS
+    assert fired(scheduler, 10000) == {333: 31, 1000: 10}
+
+
+def test_due_classes_are_read_in_one_plan():
+    scheduler = ScanScheduler(config(100, 200), 1000, "127.0.0.1:502")
+    plan, = scheduler.plan_for(scheduler.due_rates(-1, 0))
+    assert (plan.start, plan.count) == (0, 2)
+    plan, = scheduler.plan_for(scheduler.due_rates(0, 1))
+    assert (plan.start, plan.count) == (0, 1)
+
+
+def test_rate_must_be_positive():
+    with pytest.raises(ValueError):
+        ScanScheduler(config(0), 1000, "127.0.0.1:502")
@@ -0,0 +1,36 @@
+import signal_store
+
+T0 = 1768608000000  # 2026-01-17 00:00 UTC
+
+OLD_VIEW = """
+CREATE VIEW machine_signals AS
+    SELECT (sa.signal_id << 42) | sa.ts_ms AS id, s.machine AS machine, s.signal AS signal,
+           sa.value AS value, s.unit AS unit,
+           strftime('%Y-%m-%d %H:%M:%S', sa.ts_ms / 1000, 'unixepoch', 'localtime') AS timestamp
+    FROM samples sa
+    JOIN signals s ON s.id = sa.signal_id;
+"""
+
+
+def test_view_range_filter_on_ts_ms_uses_the_key(tmp_path):
+    conn = signal_store.connect(str(tmp_path / "machine_data.db"))
+    signal_store.create_schema(conn)
+    signal_store.insert_samples(conn.cursor(), [("M", "a", 1.0, "V", T0), ("M", "a", 2.0, "V", T0 + 1500)])
+    conn.commit()
+
+    sql = "SELECT id, ts_ms, value FROM machine_signals WHERE machine = 'M' AND signal = 'a' AND ts_ms >= ? AND ts_ms < ?"
+    assert conn.execute(sql, (T0 + 1, T0 + 2000)).fetchall() == [((1 << 42) | (T0 + 1500), T0 + 1500, 2.0)]
+    plan = " ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, (T0, T0 + 2000)))
+    assert "SEARCH sa USING PRIMARY KEY (signal_id=? AND ts_ms>? AND ts_ms<?)" in plan
+
+
+def test_create_schema_replaces_a_view_without_ts_ms(tmp_path):
+    conn = signal_store.connect(str(tmp_path / "machine_data.db"))
+    conn.executescript(signal_store.SCHEMA.split("CREATE VIEW")[0] + OLD_VIEW)
+    signal_store.create_schema(conn)
+
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(machine_signals)")]
+    assert columns == ["id", "machine", "signal", "value", "unit", "timestamp", "ts_ms"]
+    conn.execute("INSERT INTO machine_signals (machine, signal, value, unit, timestamp) "
+                 "VALUES ('M', 'a', 3.0, 'V', '2026-01-17 08:00:00')")
+    assert conn.execute("SELECT value FROM samples").fetchall() == [(3.0,)]
@@ -0,0 +1,93 @@
+import os
+
+from spool import Spool, RECORD_HEADER
+
+
+def test_append_read_ack(tmp_path):
+    spool = Spool(str(tmp_path))
+    spool.append([["M", "a", 1.0, 1000]])
+    spool.append([["M", "b", 2.0, 1000], ["M", "c", 3.0, 1000]])
+    assert spool.backlog()
+
+    rows, position = spool.read_unacked(100)
+    assert rows == [("M", "a", 1.0, 1000), ("M", "b", 2.0, 1000), ("M", "c", 3.0, 1000)]
+    assert position == spool.end()
+
+    spool.ack(position)
+    assert not spool.backlog()
+    assert spool.read_unacked(100) == ([], position)
+    spool.close()
+
+
+def test_read_stops_after_max_rows(tmp_path):
+    spool = Spool(str(tmp_path))
+    for value in range(3):
+        spool.append([["M", "a", value, value]])
+    rows, position = spool.read_unacked(2)
+    assert [row[2] for row in rows] == [0, 1]
+    spool.ack(position)
+    assert [row[2] for row in spool.read_unacked(100)[0]] == [2]
+    spool.close()
+
+
+def test_unacked_batches_are_replayed_after_reopen(tmp_path):
+    spool = Spool(str(tmp_path))
+    first, _ = spool.append([["M", "a", 1.0, 1000]])
+    _, end = spool.append([["M", "a", 2.0, 2000]])
+    spool.ack(spool.read_unacked(1)[1])
+    spool.close()
+
+    spool = Spool(str(tmp_path))
+    assert spool.end() == end
+    assert spool.read_unacked(100)[0] == [("M", "a", 2.0, 2000)]
+    # appends continue after the recovered write position
+    spool.append([["M", "a", 3.0, 3000]])
+    assert [row[2] for row in spool.read_unacked(100)[0]] == [2.0, 3.0]
+    spool.close()
+
+
+def test_torn_record_is_ignored_on_reopen(tmp_path):
+    spool = Spool(str(tmp_path))
+    _, good_end = spool.append([["M", "a", 1.0, 1000]])
+    _, torn_end = spool.append([["M", "a", 2.0, 2000]])
+    spool.close()
+
+    # corrupt one byte of the second payload, as a crash mid-write would leave it
+    path = os.path.join(str(tmp_path), f"segment_{good_end[0]:08d}.spool")
+    with open(path, "r+b") as f:
+        f.seek(torn_end[1] - 1)
+        byte = f.read(1)
+        f.seek(torn_end[1] - 1)
+        f.write(bytes([byte[0] ^ 0xFF]))
+
+    spool = Spool(str(tmp_path))
+    assert spool.end() == good_end
+    assert spool.read_unacked(100)[0] == [("M", "a", 1.0, 1000)]
+    spool.append([["M", "a", 3.0, 3000]])
+    assert [row[2] for row in spool.read_unacked(100)[0]] == [1.0, 3.0]
+    spool.close()
+
+
+def test_segments_roll_and_acked_ones_are_deleted(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=256, max_bytes=1024 * 1024)
+    for value in range(20):
+        spool.append([["M", "a", value, value]])
+    assert len(spool.segments) > 1
+
+    rows, position = spool.read_unacked(1000)
+    assert [row[2] for row in rows] == list(range(20))
+    spool.ack(position)
+    assert spool.segments == [position[0]]
+    assert len([name for name in os.listdir(str(tmp_path)) if name.endswith(".spool")]) == 1
+    spool.close()
+
+
+def test_oldest_segment_is_dropped_when_full(tmp_path):
+    record_bytes = RECORD_HEADER.size + len(b'[["M","a",0,0]]')
+    spool = Spool(str(tmp_path), segment_bytes=record_bytes * 2 + RECORD_HEADER.size, max_bytes=1)
+    for value in range(7):
+        spool.append([["M", "a", value, value]])
+    assert len(spool.segments) == 2
+    assert spool.records_dropped == 4
+    assert [row[2] for row in spool.read_unacked(100)[0]] == [4, 5, 6]
+    spool.close()